@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile
+from .models import Profile, TokenRevocation
 
 
 @admin.register(Profile)
@@ -9,5 +9,8 @@ class ProfileAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
 
 
-
+@admin.register(TokenRevocation)
+class TokenRevocationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'jti', 'revoked_at', 'expires_at']
+    search_fields = ['user__username', 'jti']
 
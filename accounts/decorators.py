@@ -1,23 +1,81 @@
+import asyncio
 from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .tokens import TokenError, token_user, verify_token
+
+
+def _admin_denied(request):
+    """Return a redirect if the user is not an active admin, otherwise None."""
+    if not request.user.is_authenticated:
+        messages.error(request, 'You must be logged in to access this page.')
+        return redirect('accounts:login')
+    
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin():
+        messages.error(request, 'You do not have permission to access this page. Admin access required.')
+        return redirect('finance:dashboard')
+    
+    return None
 
 
 def admin_required(view_func):
     """Decorator to ensure user is authenticated and has ADMIN role."""
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async_view(request, *args, **kwargs):
+            # Loading the user and profile hits the database.
+            denied = await sync_to_async(_admin_denied)(request)
+            if denied:
+                return denied
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_async_view
+    
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            messages.error(request, 'You must be logged in to access this page.')
-            return redirect('accounts:login')
-        
-        if not hasattr(request.user, 'profile') or not request.user.profile.is_admin():
-            messages.error(request, 'You do not have permission to access this page. Admin access required.')
-            return redirect('finance:dashboard')
-        
+        denied = _admin_denied(request)
+        if denied:
+            return denied
         return view_func(request, *args, **kwargs)
     return _wrapped_view
 
 
+def async_login_required(view_func):
+    """login_required for async views; Django 4.2's decorator is sync-only."""
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return _wrapped_view
 
 
+def api_login_required(view_func):
+    """
+    Authenticate a JSON endpoint by bearer token or session, answering 401
+    instead of redirecting. Token requests never load the session, user or
+    profile, and skip CSRF checks, which only protect cookie authentication.
+    """
+    session_view = csrf_protect(view_func)
+    
+    @csrf_exempt
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            try:
+                claims = verify_token(authorization[len('Bearer '):].strip())
+            except TokenError as e:
+                return JsonResponse({'error': str(e)}, status=401)
+            request.user = token_user(claims)
+            request.auth = claims
+            return view_func(request, *args, **kwargs)
+        
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        return session_view(request, *args, **kwargs)
+    return _wrapped_view
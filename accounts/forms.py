@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
@@ -16,6 +17,12 @@ class UserRegistrationForm(UserCreationForm):
         'class': 'form-control',
         'placeholder': 'Last name (optional)'
     }))
+    base_currency = forms.ChoiceField(
+        choices=[(code, code) for code in settings.CURRENCIES],
+        initial=settings.DEFAULT_CURRENCY,
+        help_text='Balances and budgets are shown in this currency.',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
     
     class Meta:
         model = User
@@ -43,7 +50,11 @@ class UserRegistrationForm(UserCreationForm):
         if User.objects.filter(email=email).exists():
             raise forms.ValidationError('A user with this email already exists.')
         return email
-
-
-
-
+    
+    def save(self, commit=True):
+        user = super().save(commit=commit)
+        if commit:
+            # The profile is created by the post_save signal.
+            user.profile.base_currency = self.cleaned_data['base_currency']
+            user.profile.save(update_fields=['base_currency'])
+        return user
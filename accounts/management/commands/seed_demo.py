@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from accounts.models import Profile
-from finance.models import Category, Transaction
+from finance.models import Category, RecurringRule, Transaction
+from finance.recurring import materialize_due
+from fintech_health.sharding import shard_for_user, use_shard
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
@@ -77,80 +79,106 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f'Created global category: {category.name}')
         
-        # Create user-specific categories
-        user_categories = [
-            {'name': 'Side Hustle', 'type': 'INCOME'},
-            {'name': 'Dining Out', 'type': 'EXPENSE'},
-        ]
-        
-        for cat_data in user_categories:
-            category, created = Category.objects.get_or_create(
-                name=cat_data['name'],
-                owner=regular_user,
-                defaults={'type': cat_data['type']}
-            )
-            if created:
-                self.stdout.write(f'Created user category: {category.name}')
-        
-        # Create sample transactions for regular user
-        now = timezone.now().date()
-        
-        # Get categories
-        salary_cat = Category.objects.filter(name='Salary', owner__isnull=True).first()
-        freelance_cat = Category.objects.filter(name='Freelance', owner__isnull=True).first()
-        groceries_cat = Category.objects.filter(name='Groceries', owner__isnull=True).first()
-        utilities_cat = Category.objects.filter(name='Utilities', owner__isnull=True).first()
-        entertainment_cat = Category.objects.filter(name='Entertainment', owner__isnull=True).first()
-        dining_cat = Category.objects.filter(name='Dining Out', owner=regular_user).first()
-        
-        # Income transactions (last 30 days)
-        income_transactions = [
-            {'date': now - timedelta(days=0), 'amount': Decimal('5000.00'), 'category': salary_cat, 'note': 'Monthly salary'},
-            {'date': now - timedelta(days=15), 'amount': Decimal('5000.00'), 'category': salary_cat, 'note': 'Monthly salary'},
-            {'date': now - timedelta(days=7), 'amount': Decimal('500.00'), 'category': freelance_cat, 'note': 'Freelance project'},
-            {'date': now - timedelta(days=3), 'amount': Decimal('200.00'), 'category': freelance_cat, 'note': 'Small gig'},
-        ]
-        
-        # Expense transactions (last 30 days)
-        expense_transactions = [
-            {'date': now - timedelta(days=1), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
-            {'date': now - timedelta(days=5), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
-            {'date': now - timedelta(days=10), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
-            {'date': now - timedelta(days=14), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
-            {'date': now - timedelta(days=2), 'amount': Decimal('120.00'), 'category': utilities_cat, 'note': 'Electricity bill'},
-            {'date': now - timedelta(days=8), 'amount': Decimal('80.00'), 'category': utilities_cat, 'note': 'Water bill'},
-            {'date': now - timedelta(days=4), 'amount': Decimal('50.00'), 'category': entertainment_cat, 'note': 'Movie tickets'},
-            {'date': now - timedelta(days=6), 'amount': Decimal('75.00'), 'category': dining_cat, 'note': 'Restaurant dinner'},
-            {'date': now - timedelta(days=12), 'amount': Decimal('60.00'), 'category': dining_cat, 'note': 'Lunch with friends'},
-        ]
-        
-        # Create income transactions
-        for trans_data in income_transactions:
-            Transaction.objects.get_or_create(
+        # The user's own rows live on their shard.
+        with use_shard(shard_for_user(regular_user.id)):
+            # Create user-specific categories
+            user_categories = [
+                {'name': 'Side Hustle', 'type': 'INCOME'},
+                {'name': 'Dining Out', 'type': 'EXPENSE'},
+            ]
+        
+            for cat_data in user_categories:
+                category, created = Category.objects.get_or_create(
+                    name=cat_data['name'],
+                    owner=regular_user,
+                    defaults={'type': cat_data['type']}
+                )
+                if created:
+                    self.stdout.write(f'Created user category: {category.name}')
+        
+            # Create sample transactions for regular user
+            now = timezone.now().date()
+        
+            # Get categories
+            salary_cat = Category.objects.filter(name='Salary', owner__isnull=True).first()
+            freelance_cat = Category.objects.filter(name='Freelance', owner__isnull=True).first()
+            groceries_cat = Category.objects.filter(name='Groceries', owner__isnull=True).first()
+            utilities_cat = Category.objects.filter(name='Utilities', owner__isnull=True).first()
+            entertainment_cat = Category.objects.filter(name='Entertainment', owner__isnull=True).first()
+            dining_cat = Category.objects.filter(name='Dining Out', owner=regular_user).first()
+        
+            # Income transactions (last 30 days)
+            income_transactions = [
+                {'date': now - timedelta(days=7), 'amount': Decimal('500.00'), 'category': freelance_cat, 'note': 'Freelance project'},
+                {'date': now - timedelta(days=3), 'amount': Decimal('200.00'), 'category': freelance_cat, 'note': 'Small gig'},
+            ]
+        
+            # Expense transactions (last 30 days)
+            expense_transactions = [
+                {'date': now - timedelta(days=1), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
+                {'date': now - timedelta(days=5), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
+                {'date': now - timedelta(days=10), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
+                {'date': now - timedelta(days=14), 'amount': Decimal('150.00'), 'category': groceries_cat, 'note': 'Weekly groceries'},
+                {'date': now - timedelta(days=2), 'amount': Decimal('120.00'), 'category': utilities_cat, 'note': 'Electricity bill'},
+                {'date': now - timedelta(days=8), 'amount': Decimal('80.00'), 'category': utilities_cat, 'note': 'Water bill'},
+                {'date': now - timedelta(days=4), 'amount': Decimal('50.00'), 'category': entertainment_cat, 'note': 'Movie tickets'},
+                {'date': now - timedelta(days=6), 'amount': Decimal('75.00'), 'category': dining_cat, 'note': 'Restaurant dinner'},
+                {'date': now - timedelta(days=12), 'amount': Decimal('60.00'), 'category': dining_cat, 'note': 'Lunch with friends'},
+            ]
+        
+            # Create income transactions
+            for trans_data in income_transactions:
+                Transaction.objects.get_or_create(
+                    owner=regular_user,
+                    type='INCOME',
+                    date=trans_data['date'],
+                    amount=trans_data['amount'],
+                    defaults={
+                        'category': trans_data['category'],
+                        'note': trans_data['note'],
+                    }
+                )
+        
+            # Create expense transactions
+            for trans_data in expense_transactions:
+                Transaction.objects.get_or_create(
+                    owner=regular_user,
+                    type='EXPENSE',
+                    date=trans_data['date'],
+                    amount=trans_data['amount'],
+                    defaults={
+                        'category': trans_data['category'],
+                        'note': trans_data['note'],
+                    }
+                )
+        
+            self.stdout.write(self.style.SUCCESS(f'Created {len(income_transactions)} income and {len(expense_transactions)} expense transactions'))
+        
+            # Salary is paid by a recurring rule rather than one-off rows
+            salary_rule, created = RecurringRule.objects.get_or_create(
                 owner=regular_user,
                 type='INCOME',
-                date=trans_data['date'],
-                amount=trans_data['amount'],
+                note='Monthly salary',
                 defaults={
-                    'category': trans_data['category'],
-                    'note': trans_data['note'],
+                    'category': salary_cat,
+                    'amount': Decimal('5000.00'),
+                    'frequency': 'CUSTOM',
+                    'interval_days': 15,
+                    'start_date': now - timedelta(days=15),
+                    'next_date': now - timedelta(days=15),
                 }
             )
-        
-        # Create expense transactions
-        for trans_data in expense_transactions:
-            Transaction.objects.get_or_create(
-                owner=regular_user,
-                type='EXPENSE',
-                date=trans_data['date'],
-                amount=trans_data['amount'],
-                defaults={
-                    'category': trans_data['category'],
-                    'note': trans_data['note'],
-                }
-            )
-        
-        self.stdout.write(self.style.SUCCESS(f'Created {len(income_transactions)} income and {len(expense_transactions)} expense transactions'))
+            if created:
+                # Adopt salary rows from earlier seeds so they are not paid twice
+                Transaction.objects.filter(
+                    owner=regular_user,
+                    type='INCOME',
+                    note='Monthly salary',
+                    date__gte=salary_rule.start_date,
+                    recurring_rule__isnull=True,
+                ).update(recurring_rule=salary_rule)
+            _, materialized = materialize_due(rules=RecurringRule.objects.filter(pk=salary_rule.pk))
+            self.stdout.write(self.style.SUCCESS(f'Created {materialized} recurring salary transactions'))
         
         self.stdout.write(self.style.SUCCESS('\nDemo data created successfully!'))
         self.stdout.write('\nDemo Credentials:')
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='base_currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+    ]
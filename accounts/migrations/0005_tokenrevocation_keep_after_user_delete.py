@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0004_tokenrevocation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tokenrevocation',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='token_revocations', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
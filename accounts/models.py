@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 
@@ -15,6 +16,11 @@ class Profile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Bumped on every change to the user's financial data; used as the
+    # cache key version for per-user dashboard fragments.
+    data_version = models.PositiveIntegerField(default=0)
+    # Currency that balances, rollups and budgets are kept in
+    base_currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY)
     
     def __str__(self):
         return f"{self.user.username} ({self.role})"
@@ -29,5 +35,40 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
+class TokenRevocation(models.Model):
+    """
+    A revoked API token (jti set), or every token issued to the user before
+    revoked_at (jti blank). Kept until the tokens it covers have expired,
+    even when the user is deleted, so a deleted user's tokens stay revoked.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='token_revocations',
+    )
+    jti = models.CharField(max_length=32, blank=True)
+    revoked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.user_id} {self.jti or 'all'} at {self.revoked_at}"
+
+
+@receiver(pre_save, sender=Profile)
+def revoke_tokens_on_claim_change(sender, instance, raw=False, **kwargs):
+    # Tokens carry the role, active flag and base currency; changing any of
+    # them invalidates the user's outstanding tokens.
+    if raw or not instance.pk:
+        return
+    stored = Profile.objects.filter(pk=instance.pk).values('role', 'is_active', 'base_currency').first()
+    if stored and stored != {
+        'role': instance.role, 'is_active': instance.is_active, 'base_currency': instance.base_currency,
+    }:
+        from .tokens import revoke_user_tokens
+        revoke_user_tokens(instance.user_id)
 
 
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_user_delete(sender, instance, using, **kwargs):
+    # Shard copies of the user are deleted along with it; revoke once.
+    if using == 'default':
+        from .tokens import revoke_user_tokens
+        revoke_user_tokens(instance.pk)
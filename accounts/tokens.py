@@ -0,0 +1,132 @@
+"""
+Stateless API access tokens.
+
+A token is a signed, timestamped set of claims: the user's id and username,
+their profile's role, active flag and base currency, the issue time and a
+random token id. Verifying one is an HMAC check and a lookup in an
+in-process revocation snapshot, so token-authenticated requests read neither
+the session nor the user or profile tables.
+
+Revocations are rows in TokenRevocation: one token by id, or every token
+issued to a user before a point in time (written whenever a claim embedded
+in the tokens changes). Each process reloads the unexpired revocations every
+API_TOKEN_REVOCATION_REFRESH seconds, so a revocation reaches every process
+within that interval.
+"""
+import secrets
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Profile, TokenRevocation
+
+SALT = 'accounts.api-token'
+
+
+class TokenError(Exception):
+    """The token is malformed, expired, revoked or belongs to an inactive user."""
+
+
+# (loaded at, revoked token ids, user id -> revoke-everything-before timestamp),
+# replaced as a whole so threads never see a mix.
+_revocations = (float('-inf'), frozenset(), {})
+
+
+def _load_revocations():
+    global _revocations
+    jtis = set()
+    users = {}
+    for user_id, jti, revoked_at in TokenRevocation.objects.filter(
+        expires_at__gt=timezone.now()
+    ).values_list('user_id', 'jti', 'revoked_at'):
+        if jti:
+            jtis.add(jti)
+        else:
+            users[user_id] = max(users.get(user_id, 0), revoked_at.timestamp())
+    _revocations = (time.monotonic(), frozenset(jtis), users)
+    return _revocations
+
+
+def _current_revocations():
+    revocations = _revocations
+    if time.monotonic() - revocations[0] > settings.API_TOKEN_REVOCATION_REFRESH:
+        revocations = _load_revocations()
+    return revocations
+
+
+def _expire_snapshot():
+    global _revocations
+    _revocations = (float('-inf'),) + _revocations[1:]
+
+
+def issue_token(user):
+    """A new token for user, valid for API_TOKEN_TTL seconds."""
+    profile = user.profile
+    return signing.dumps({
+        'uid': user.pk,
+        'name': user.get_username(),
+        'role': profile.role,
+        'active': profile.is_active,
+        'cur': profile.base_currency,
+        'iat': time.time(),
+        'jti': secrets.token_hex(16),
+    }, salt=SALT)
+
+
+def verify_token(token):
+    """The token's claims, or TokenError."""
+    try:
+        claims = signing.loads(token, salt=SALT, max_age=settings.API_TOKEN_TTL)
+    except signing.SignatureExpired:
+        raise TokenError('Token has expired.')
+    except signing.BadSignature:
+        raise TokenError('Invalid token.')
+    if not claims.get('active'):
+        raise TokenError('Account is deactivated.')
+    _, jtis, users = _current_revocations()
+    if claims['jti'] in jtis or claims['iat'] <= users.get(claims['uid'], float('-inf')):
+        raise TokenError('Token has been revoked.')
+    return claims
+
+
+def token_user(claims):
+    """An unsaved User (with its Profile) built from claims, for request.user."""
+    user = User(pk=claims['uid'], username=claims['name'])
+    user.profile = Profile(
+        user_id=claims['uid'],
+        role=claims['role'],
+        is_active=claims['active'],
+        base_currency=claims['cur'],
+    )
+    return user
+
+
+def _expires_at(issued_at):
+    return datetime.fromtimestamp(issued_at, dt_timezone.utc) + timedelta(seconds=settings.API_TOKEN_TTL)
+
+
+def revoke_token(claims):
+    TokenRevocation.objects.create(
+        user_id=claims['uid'],
+        jti=claims['jti'],
+        revoked_at=timezone.now(),
+        expires_at=_expires_at(claims['iat']),
+    )
+    transaction.on_commit(_expire_snapshot)
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to the user so far."""
+    now = timezone.now()
+    TokenRevocation.objects.filter(expires_at__lte=now).delete()
+    TokenRevocation.objects.create(
+        user_id=user_id,
+        revoked_at=now,
+        expires_at=now + timedelta(seconds=settings.API_TOKEN_TTL),
+    )
+    transaction.on_commit(_expire_snapshot)
@@ -10,5 +10,7 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('about/', views.about_view, name='about'),
+    path('api/token/', views.api_token_view, name='api_token'),
+    path('api/token/revoke/', views.api_token_revoke_view, name='api_token_revoke'),
 ]
 
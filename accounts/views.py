@@ -1,8 +1,15 @@
+import json
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .decorators import api_login_required
 from .forms import UserRegistrationForm
+from .tokens import issue_token, revoke_token, revoke_user_tokens
 
 
 def landing_view(request):
@@ -70,3 +77,40 @@ def about_view(request):
     """About page explaining the app."""
     return render(request, 'accounts/about.html')
 
+
+@csrf_exempt
+@require_POST
+def api_token_view(request):
+    """Exchange {"username": ..., "password": ...} for an API access token."""
+    try:
+        credentials = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(credentials, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+    
+    user = authenticate(request, username=credentials.get('username'), password=credentials.get('password'))
+    if user is None:
+        return JsonResponse({'error': 'Invalid username or password.'}, status=401)
+    if not user.profile.is_active:
+        return JsonResponse({'error': 'Account is deactivated.'}, status=403)
+    
+    return JsonResponse({'token': issue_token(user), 'expires_in': settings.API_TOKEN_TTL})
+
+
+@require_POST
+@api_login_required
+def api_token_revoke_view(request):
+    """Revoke the bearer token used, or with {"all": true} (or a session) every token of the user."""
+    try:
+        revoke_all = bool(json.loads(request.body or b'{}').get('all'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+    
+    claims = getattr(request, 'auth', None)
+    if claims is None or revoke_all:
+        revoke_user_tokens(request.user.pk)
+    else:
+        revoke_token(claims)
+    return JsonResponse({'revoked': 'all' if claims is None or revoke_all else 'token'})
+
@@ -0,0 +1,164 @@
+"""
+Daily, weekly and monthly active users.
+
+A user is active on a day when they log in or write a transaction
+themselves; occurrences created by the recurring scheduler don't count.
+Each shard keeps one HyperLogLog sketch per day of its active users, so a
+window's count is the estimate of the union of its days' sketches on every
+shard: a few small rows read and merged in well under a millisecond, with
+a standard error of about 1.6%.
+
+A user changes a day's sketch at most once, so record_activity() remembers
+in the cache who was already added and only writes for the first activity
+of each user per day. The write runs after the user's own transaction
+commits, in a transaction of its own, and a failure is logged rather than
+failing the login or write that caused it.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from fintech_health.sharding import current_shard, fan_out, shard_for_user, use_shard
+from finance.models import Transaction
+from .hyperloglog import HyperLogLog
+from .models import ActiveUserSketch
+
+logger = logging.getLogger(__name__)
+
+# Window name -> days, ending today
+ACTIVITY_WINDOWS = {'daily': 1, 'weekly': 7, 'monthly': 30}
+
+# Seconds the cache remembers that a user was added to a day's sketch
+ACTIVITY_MARKER_TIMEOUT = 2 * 24 * 60 * 60
+
+
+def _marker(day, user_id):
+    return f'active-user:{day}:{user_id}'
+
+
+def _add_to_sketch(alias, day, user_ids):
+    try:
+        with transaction.atomic(using=alias):
+            # Insert the day's row first: the write takes the lock before
+            # the read, so concurrent first activities of a day neither
+            # collide on the date nor overwrite each other's registers.
+            sketches = ActiveUserSketch.objects.using(alias)
+            sketches.bulk_create(
+                [ActiveUserSketch(date=day, registers=HyperLogLog().to_bytes())], ignore_conflicts=True,
+            )
+            row = sketches.get(date=day)
+            sketch = HyperLogLog.from_bytes(row.registers)
+            if any([sketch.add(user_id) for user_id in user_ids]):
+                row.registers = sketch.to_bytes()
+                row.save(update_fields=['registers', 'updated_at'])
+    except Exception:
+        logger.exception('Could not record active users on %s', day)
+        return
+    cache.set_many({_marker(day, user_id): True for user_id in user_ids}, ACTIVITY_MARKER_TIMEOUT)
+
+
+def record_activity(user_ids, day=None):
+    """Add users to the day's sketch on the current shard, once the current transaction commits."""
+    day = day or timezone.localdate()
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    added = cache.get_many([_marker(day, user_id) for user_id in user_ids])
+    new = [user_id for user_id in user_ids if _marker(day, user_id) not in added]
+    if new:
+        alias = current_shard()
+        transaction.on_commit(lambda: _add_to_sketch(alias, day, new), using=alias)
+
+
+def _sketches(start, end):
+    return [
+        (day, HyperLogLog.from_bytes(registers))
+        for day, registers in ActiveUserSketch.objects.filter(date__range=(start, end)).values_list('date', 'registers')
+    ]
+
+
+def active_user_counts(today=None):
+    """Estimated active users in each of ACTIVITY_WINDOWS, from the sketches on every shard."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=max(ACTIVITY_WINDOWS.values()) - 1)
+    sketches = [row for rows in fan_out(_sketches, start, today) for row in rows]
+    return {
+        name: HyperLogLog.union(
+            sketch for day, sketch in sketches if day > today - timedelta(days=days)
+        ).count()
+        for name, days in ACTIVITY_WINDOWS.items()
+    }
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _transaction_writers(since):
+    # updated_at is at least created_at, so it covers creates and edits.
+    return set(
+        Transaction.objects.filter(updated_at__gte=since, recurring_rule__isnull=True)
+        .values_list('owner_id', flat=True).distinct()
+    )
+
+
+def exact_active_user_counts(today=None):
+    """
+    Exact active users in each of ACTIVITY_WINDOWS, from transaction
+    timestamps and last logins. Scans every recent transaction; for
+    checking the estimates, not for pages.
+    """
+    today = today or timezone.localdate()
+    counts = {}
+    for name, days in ACTIVITY_WINDOWS.items():
+        since = _start_of(today - timedelta(days=days - 1))
+        user_ids = set().union(*fan_out(_transaction_writers, since))
+        user_ids.update(User.objects.filter(last_login__gte=since).values_list('pk', flat=True))
+        counts[name] = len(user_ids)
+    return counts
+
+
+def _activity_by_day(since):
+    days = defaultdict(set)
+    for field in ('created_at', 'updated_at'):
+        rows = (
+            Transaction.objects.filter(**{f'{field}__gte': since}, recurring_rule__isnull=True)
+            .annotate(day=TruncDate(field)).values_list('day', 'owner_id').distinct()
+        )
+        for day, owner_id in rows:
+            days[day].add(owner_id)
+    return days
+
+
+def rebuild_sketches(days, today=None):
+    """
+    Replace the last `days` days' sketches with ones built from transaction
+    timestamps and last logins. Logins before a user's last one are not
+    stored anywhere, so those days may come out lower than the originals.
+    Returns the number of sketches written.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    by_shard = dict(zip(settings.SHARD_DATABASES, fan_out(_activity_by_day, _start_of(start))))
+    for user_id, last_login in User.objects.filter(last_login__gte=_start_of(start)).values_list('pk', 'last_login'):
+        by_shard[shard_for_user(user_id)][timezone.localdate(last_login)].add(user_id)
+
+    written = 0
+    for alias, activity in by_shard.items():
+        sketches = []
+        for day, user_ids in sorted(activity.items()):
+            sketch = HyperLogLog()
+            for user_id in user_ids:
+                sketch.add(user_id)
+            sketches.append(ActiveUserSketch(date=day, registers=sketch.to_bytes()))
+        with use_shard(alias), transaction.atomic(using=alias):
+            ActiveUserSketch.objects.filter(date__gte=start).delete()
+            ActiveUserSketch.objects.bulk_create(sketches)
+        written += len(sketches)
+    return written
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AuditLog
+from .models import ActiveUserSketch, Anomaly, AuditLog, DuplicateCluster, Job, SpendingStats
 
 
 @admin.register(AuditLog)
@@ -11,5 +11,39 @@ class AuditLogAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
 
 
+@admin.register(SpendingStats)
+class SpendingStatsAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'category', 'type', 'count', 'mean', 'updated_at']
+    list_filter = ['type']
+    search_fields = ['owner__username', 'category__name']
+    readonly_fields = ['count', 'mean', 'm2', 'updated_at']
 
 
+@admin.register(Anomaly)
+class AnomalyAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'amount', 'mean', 'z_score', 'status', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['owner__username']
+    raw_id_fields = ['transaction']
+
+
+@admin.register(ActiveUserSketch)
+class ActiveUserSketchAdmin(admin.ModelAdmin):
+    list_display = ['date', 'updated_at']
+    date_hierarchy = 'date'
+    readonly_fields = ['date', 'registers', 'updated_at']
+
+
+@admin.register(DuplicateCluster)
+class DuplicateClusterAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'date', 'amount', 'currency', 'size', 'scanned_at']
+    list_filter = ['type']
+    search_fields = ['owner__username', 'note']
+    date_hierarchy = 'date'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'progress_done', 'progress_total', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['worker', 'heartbeat_at', 'result', 'error', 'created_at', 'started_at', 'finished_at']
@@ -0,0 +1,184 @@
+"""
+Incremental anomaly detection over transactions.
+
+SpendingStats keeps a running count, mean and M2 (sum of squared deviations)
+of amounts, in the owner's base currency, per (owner, category, type),
+updated as transactions are inserted. A transaction is flagged for review
+when its owner already has MIN_SAMPLES amounts for that category and type
+and it lies at least Z_THRESHOLD standard deviations above their mean.
+
+A batch of transactions is folded into each stored row with one UPDATE that
+combines the two sets of statistics (the parallel form of Welford's update),
+so concurrent writers never lose an update.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Value
+from django.utils import timezone
+from fintech_health.sharding import current_shard, each_shard, shard_for_user, use_shard
+
+from finance.currency import base_amounts
+from finance.models import Transaction
+from .models import Anomaly, SpendingStats
+
+MIN_SAMPLES = 10
+Z_THRESHOLD = 3.0
+
+
+class RunningStats:
+    """Welford accumulator for count, mean and M2."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def stddev(self):
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+
+def _merge_stats(owner_id, category_id, type, batch):
+    """Combine batch into the stored statistics for a key."""
+    lookup = {'owner_id': owner_id, 'category_id': category_id, 'type': type}
+    count = F('count') + batch.count
+    delta = Value(batch.mean) - F('mean')
+    # SQL evaluates every right-hand side against the row's old values.
+    updated = SpendingStats.objects.filter(**lookup).update(
+        count=count,
+        mean=F('mean') + delta * batch.count / count,
+        m2=F('m2') + batch.m2 + delta * delta * F('count') * batch.count / count,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        try:
+            with transaction.atomic(using=current_shard()):
+                SpendingStats.objects.create(
+                    count=batch.count, mean=batch.mean, m2=batch.m2, **lookup
+                )
+        except IntegrityError:
+            # Another writer created the row first.
+            _merge_stats(owner_id, category_id, type, batch)
+
+
+def observe_transactions(transactions, flag=True):
+    """
+    Fold newly inserted transactions into the running statistics, flagging
+    outliers. Returns the number of new anomalies.
+    """
+    groups = defaultdict(list)
+    for txn, amount in zip(transactions, base_amounts(transactions)):
+        groups[(txn.owner_id, txn.category_id, txn.type)].append((txn, amount))
+    if not groups:
+        return 0
+
+    stored = {
+        (stats.owner_id, stats.category_id, stats.type): stats
+        for stats in SpendingStats.objects.filter(owner_id__in={key[0] for key in groups})
+    }
+
+    batches = {}
+    anomalies = []
+    for key, group in groups.items():
+        previous = stored.get(key)
+        if previous:
+            running = RunningStats(previous.count, previous.mean, previous.m2)
+        else:
+            running = RunningStats()
+        batch = RunningStats()
+        for txn, base_amount in group:
+            amount = float(base_amount)
+            stddev = running.stddev
+            if flag and txn.pk and running.count >= MIN_SAMPLES and stddev:
+                z_score = (amount - running.mean) / stddev
+                if z_score >= Z_THRESHOLD:
+                    anomalies.append(Anomaly(
+                        transaction_id=txn.pk,
+                        owner_id=txn.owner_id,
+                        amount=base_amount,
+                        mean=running.mean,
+                        stddev=stddev,
+                        z_score=z_score,
+                    ))
+            running.add(amount)
+            batch.add(amount)
+        batches[key] = batch
+
+    with transaction.atomic(using=current_shard()):
+        for (owner_id, category_id, type), batch in batches.items():
+            _merge_stats(owner_id, category_id, type, batch)
+        if anomalies:
+            flagged = set(
+                Anomaly.objects.filter(
+                    transaction_id__in=[anomaly.transaction_id for anomaly in anomalies]
+                ).values_list('transaction_id', flat=True)
+            )
+            anomalies = [anomaly for anomaly in anomalies if anomaly.transaction_id not in flagged]
+            Anomaly.objects.bulk_create(anomalies, ignore_conflicts=True)
+    return len(anomalies)
+
+
+def move_category_stats(from_category_id, to_category_id=None):
+    """Fold one category's statistics into another (or into uncategorized)."""
+    with transaction.atomic(using=current_shard()):
+        rows = SpendingStats.objects.filter(category_id=from_category_id)
+        for stats in rows.iterator():
+            _merge_stats(
+                stats.owner_id, to_category_id, stats.type,
+                RunningStats(stats.count, stats.mean, stats.m2),
+            )
+        rows.delete()
+
+
+def backfill_stats(chunk_size=2000, flag=True, progress=None, owner_id=None):
+    """
+    Recompute all statistics (or one owner's) by replaying existing
+    transactions in insert order, in chunks of chunk_size, flagging
+    historical outliers on the way. Transactions inserted while it runs are
+    counted by the live detector. Returns (transactions replayed, anomalies flagged).
+    """
+    if owner_id is not None:
+        with use_shard(shard_for_user(owner_id)):
+            return _backfill_shard_stats(chunk_size, flag, progress, owner_id)
+    processed = flagged = 0
+    for _ in each_shard():
+        shard_processed, shard_flagged = _backfill_shard_stats(chunk_size, flag, progress, None)
+        processed += shard_processed
+        flagged += shard_flagged
+    return processed, flagged
+
+
+def _backfill_shard_stats(chunk_size, flag, progress, owner_id):
+    transactions = Transaction.objects.all()
+    stats = SpendingStats.objects.all()
+    if owner_id is not None:
+        transactions = transactions.filter(owner_id=owner_id)
+        stats = stats.filter(owner_id=owner_id)
+    last_pk = transactions.aggregate(last=Max('pk'))['last'] or 0
+    stats.delete()
+
+    processed = flagged = 0
+    after = 0
+    while True:
+        chunk = list(
+            transactions.filter(pk__gt=after, pk__lte=last_pk).order_by('pk').only(
+                'pk', 'owner_id', 'category_id', 'type', 'amount', 'currency', 'date'
+            )[:chunk_size]
+        )
+        if not chunk:
+            break
+        flagged += observe_transactions(chunk, flag)
+        processed += len(chunk)
+        after = chunk[-1].pk
+        if progress:
+            progress(processed, flagged)
+    return processed, flagged
@@ -5,6 +5,5 @@ class BackofficeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backoffice'
 
-
-
-
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,377 @@
+"""
+Columnar snapshot of the Transaction table for backoffice analytics.
+
+export_columnar() writes one NumPy .npy file per column (transaction id,
+owner, date and creation day as ordinals, type, category and the amount in
+DEFAULT_CURRENCY cents) into COLUMNAR_DIR. Reports memory-map the files and
+aggregate whole columns at once, so a system-wide group-by reads only the
+columns it needs and never builds a Python object per row.
+
+The snapshot is a list of segments, each covering a range of transaction
+ids, listed in meta.json with the id high-water mark. A refresh appends the
+rows above the mark as a new segment, rewrites in place the rows saved since
+the last refresh, and rebuilds everything when rows below the mark have been
+deleted. Changes that bypass Model.save() (category merges, rates loaded for
+past dates) are only picked up by a full rebuild (`--full`). Segments are
+compacted into one once there are more than MAX_SEGMENTS.
+
+NumPy is optional: without it export_columnar() and load_snapshot() raise
+ColumnarUnavailable.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.utils import timezone
+from fintech_health.sharding import sharding_enabled
+
+from finance.currency import converted_cents
+from finance.models import Transaction
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+COLUMNS = {
+    'id': 'int64',
+    'owner_id': 'int32',
+    'date': 'int32',        # date.toordinal()
+    'created': 'int32',     # local date of created_at, as an ordinal
+    'type': 'int8',         # TYPES index
+    'category_id': 'int64',  # -1 for uncategorized
+    'cents': 'int64',       # amount in DEFAULT_CURRENCY cents
+}
+TYPES = ['INCOME', 'EXPENSE']
+EXPORT_CHUNK = 100_000
+MAX_SEGMENTS = 16
+# date.toordinal() of 1970-01-01, to turn ordinals into datetime64 days
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Rows per block in reports
+BLOCK_ROWS = 2_000_000
+# Group-bys on keys spanning fewer values than this count with bincount; wider ones sort.
+BINCOUNT_SPAN = 10_000_000
+# Largest owner x month table cohorts() builds (one byte per cell)
+COHORT_CELLS = 200_000_000
+
+
+class ColumnarUnavailable(Exception):
+    """NumPy is not installed, or no snapshot has been exported yet."""
+
+
+def _require_numpy():
+    if np is None:
+        raise ColumnarUnavailable('The columnar snapshot needs NumPy: pip install numpy')
+
+
+def _directory(directory=None):
+    return str(directory or settings.COLUMNAR_DIR)
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(directory, meta):
+    # Written to a temporary file and renamed, so readers see the old or the new list.
+    path = os.path.join(directory, 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+
+def _open_columns(directory, segment, mode='r'):
+    path = os.path.join(directory, segment['name'])
+    return {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)[:segment['rows']]
+        for name in COLUMNS
+    }
+
+
+def _rows(queryset):
+    """Yield chunks of (id, owner, date, created, type, category, cents) tuples in id order."""
+    rows = queryset.order_by('pk').annotate(
+        cents=converted_cents(settings.DEFAULT_CURRENCY)
+    ).values_list('pk', 'owner_id', 'date', 'created_at', 'type', 'category_id', 'cents')
+    after = None
+    while True:
+        chunk = list((rows.filter(pk__gt=after) if after is not None else rows)[:EXPORT_CHUNK])
+        if not chunk:
+            return
+        yield [
+            (pk, owner_id, day.toordinal(), timezone.localdate(created_at).toordinal(),
+             TYPES.index(type), category_id if category_id is not None else -1, cents or 0)
+            for pk, owner_id, day, created_at, type, category_id, cents in chunk
+        ]
+        after = chunk[-1][0]
+
+
+def _write_segment(directory, queryset):
+    """Export queryset into a new segment; returns its meta entry, or None if it is empty."""
+    count = queryset.count()
+    if not count:
+        return None
+    name = f'segment-{time.time_ns()}'
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    arrays = {
+        column: np.lib.format.open_memmap(os.path.join(path, f'{column}.npy'), mode='w+', dtype=dtype, shape=(count,))
+        for column, dtype in COLUMNS.items()
+    }
+    rows = 0
+    for chunk in _rows(queryset):
+        # Rows deleted since the count leave unused space at the end; the
+        # segment's row count excludes it.
+        chunk = chunk[:count - rows]
+        values = np.array(chunk, dtype='int64')
+        for index, column in enumerate(COLUMNS):
+            arrays[column][rows:rows + len(chunk)] = values[:, index]
+        rows += len(chunk)
+        if rows == count:
+            break
+    for array in arrays.values():
+        array.flush()
+    return {'name': name, 'rows': rows, 'first_id': int(arrays['id'][0]) if rows else None}
+
+
+def _compact(directory, segments):
+    """Concatenate segments into one."""
+    name = f'segment-{time.time_ns()}'
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    rows = sum(segment['rows'] for segment in segments)
+    opened = [_open_columns(directory, segment) for segment in segments]
+    for column, dtype in COLUMNS.items():
+        target = np.lib.format.open_memmap(os.path.join(path, f'{column}.npy'), mode='w+', dtype=dtype, shape=(rows,))
+        offset = 0
+        for columns in opened:
+            target[offset:offset + len(columns[column])] = columns[column]
+            offset += len(columns[column])
+        target.flush()
+    return {'name': name, 'rows': rows, 'first_id': segments[0]['first_id']}
+
+
+def _patch_updated(directory, segments, since, high_water):
+    """Rewrite the rows saved since the last refresh in place. Returns how many were found."""
+    updated = Transaction.objects.filter(pk__lte=high_water, updated_at__gte=since)
+    patched = 0
+    opened = [(segment, _open_columns(directory, segment, mode='r+')) for segment in segments if segment['rows']]
+    for chunk in _rows(updated):
+        values = np.array(chunk, dtype='int64')
+        for segment, columns in opened:
+            positions = np.searchsorted(columns['id'], values[:, 0])
+            positions = np.minimum(positions, len(columns['id']) - 1)
+            found = columns['id'][positions] == values[:, 0]
+            for index, column in enumerate(COLUMNS):
+                columns[column][positions[found]] = values[found, index]
+            patched += int(found.sum())
+    for _, columns in opened:
+        for array in columns.values():
+            array.flush()
+    return patched
+
+
+def export_columnar(full=False, directory=None):
+    """
+    Create or refresh the snapshot. Returns a dict with the rows appended
+    and patched, the total row count and whether it was rebuilt.
+    """
+    _require_numpy()
+    if sharding_enabled():
+        # The id high-water mark assumes one table.
+        raise ColumnarUnavailable('The columnar snapshot does not support DATABASE_SHARDS yet.')
+    directory = _directory(directory)
+    os.makedirs(directory, exist_ok=True)
+    started_at = timezone.now()
+    meta = _read_meta(directory)
+
+    if meta and not full:
+        high_water = meta['high_water']
+        # Fewer rows at or below the mark than were exported: something was deleted.
+        full = Transaction.objects.filter(pk__lte=high_water).count() != meta['rows']
+
+    if not meta or full:
+        previous = meta['segments'] if meta else []
+        high_water = Transaction.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        segment = _write_segment(directory, Transaction.objects.filter(pk__lte=high_water))
+        segments = [segment] if segment else []
+        appended, patched, rebuilt = sum(s['rows'] for s in segments), 0, True
+    else:
+        previous = []
+        segments = list(meta['segments'])
+        patched = _patch_updated(
+            directory, segments, datetime.fromisoformat(meta['exported_at']), meta['high_water']
+        )
+        new_high_water = Transaction.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        segment = _write_segment(directory, Transaction.objects.filter(pk__gt=high_water, pk__lte=new_high_water))
+        appended = segment['rows'] if segment else 0
+        if segment:
+            segments.append(segment)
+        high_water = new_high_water
+        rebuilt = False
+        if len(segments) > MAX_SEGMENTS:
+            previous = segments
+            segments = [_compact(directory, segments)]
+
+    rows = sum(segment['rows'] for segment in segments)
+    _write_meta(directory, {
+        'high_water': high_water,
+        'rows': rows,
+        'exported_at': started_at.isoformat(),
+        'segments': segments,
+    })
+    # Processes that still map the old files keep reading them until they reload.
+    for segment in previous:
+        shutil.rmtree(os.path.join(directory, segment['name']), ignore_errors=True)
+    return {'appended': appended, 'patched': patched, 'rows': rows, 'rebuilt': rebuilt}
+
+
+class ColumnarSnapshot:
+    """
+    Read-only, memory-mapped view of an exported snapshot. Reports walk the
+    columns in blocks of BLOCK_ROWS, so their temporaries stay small however
+    large the table is.
+    """
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.high_water = meta['high_water']
+        self.exported_at = meta['exported_at']
+        self.rows = meta['rows']
+        self.segments = [_open_columns(directory, segment) for segment in meta['segments']]
+
+    def _blocks(self, columns=(), owner_id=None, date_from=None, date_to=None, field='date'):
+        """Yield {column: values} blocks of the selected rows, with only the requested columns."""
+        for segment in self.segments:
+            for start in range(0, len(segment['id']), BLOCK_ROWS):
+                block = {name: segment[name][start:start + BLOCK_ROWS] for name in (*columns, 'type', 'cents')}
+                mask = None
+                if owner_id is not None:
+                    mask = segment['owner_id'][start:start + BLOCK_ROWS] == owner_id
+                if date_from is not None or date_to is not None:
+                    days = segment[field][start:start + BLOCK_ROWS]
+                    if date_from is not None:
+                        mask = _and(mask, days >= date_from.toordinal())
+                    if date_to is not None:
+                        mask = _and(mask, days <= date_to.toordinal())
+                if mask is not None:
+                    block = {name: values[mask] for name, values in block.items()}
+                if len(block['type']):
+                    yield block
+
+    def totals(self, owner_id=None, date_from=None, date_to=None, field='date'):
+        """{'INCOME': (count, cents), 'EXPENSE': (count, cents)} over the selected rows."""
+        count = expense_count = cents = expense_cents = 0
+        for block in self._blocks((), owner_id, date_from, date_to, field):
+            expense = block['type'].view(np.bool_)
+            count += len(expense)
+            expense_count += int(np.count_nonzero(expense))
+            cents += int(block['cents'].sum())
+            expense_cents += int(block['cents'][expense].sum())
+        return {
+            'INCOME': (count - expense_count, cents - expense_cents),
+            'EXPENSE': (expense_count, expense_cents),
+        }
+
+    def group_by(self, key, owner_id=None, date_from=None, date_to=None, field='date'):
+        """
+        Totals per value of key: 'owner_id', 'category_id' (-1: uncategorized),
+        'date', 'created' (ordinals) or 'month' (months since 1970-01). Returns
+        {value: {'count': n, 'INCOME': cents, 'EXPENSE': cents}}.
+        """
+        column = 'date' if key == 'month' else key
+        partials = []
+        for block in self._blocks((column,), owner_id, date_from, date_to, field):
+            keys = _months(block['date']) if key == 'month' else block[column]
+            # Key and type in one integer (key * 2 + type), so one pass counts both types.
+            values, counts, (cents,) = _sum_by_key(keys.astype('int64') * 2 + block['type'], block['cents'])
+            partials.append((values, counts, cents))
+        if not partials:
+            return {}
+
+        # Blocks share keys; add their partial sums up per key.
+        values, _, (counts, cents) = _sum_by_key(
+            *(np.concatenate([partial[i] for partial in partials]) for i in range(3))
+        )
+        result = {}
+        for value, n, total in zip(values.tolist(), counts.tolist(), cents.tolist()):
+            totals = result.setdefault(value >> 1, {'count': 0, 'INCOME': 0, 'EXPENSE': 0})
+            totals['count'] += int(n)
+            totals[TYPES[value & 1]] += int(total)
+        return result
+
+    def cohorts(self):
+        """
+        Active users per month, by the month of their first transaction:
+        {first month: [users active in it, in the month after, ...]}, months
+        as 'YYYY-MM'.
+        """
+        bounds = [
+            (int(block['owner_id'].min()), int(block['owner_id'].max()), int(block['date'].min()), int(block['date'].max()))
+            for block in self._blocks(('owner_id', 'date'))
+        ]
+        if not bounds:
+            return {}
+        owner_low, owner_high = min(b[0] for b in bounds), max(b[1] for b in bounds)
+        month_low, month_high = (int(m) for m in _months(np.array([min(b[2] for b in bounds), max(b[3] for b in bounds)])))
+        owners, months = owner_high - owner_low + 1, month_high - month_low + 1
+        if owners * months > COHORT_CELLS:
+            raise ValueError(f'{owners} owner ids x {months} months is too many cells for a cohort table.')
+
+        # active[owner, month]: the owner has a transaction in that month.
+        active = np.zeros((owners, months), dtype=np.bool_)
+        for block in self._blocks(('owner_id', 'date')):
+            active[block['owner_id'] - owner_low, _months(block['date']) - month_low] = True
+
+        seen = active.any(axis=1)
+        first = active.argmax(axis=1)
+        result = {}
+        for cohort in np.unique(first[seen]):
+            members = active[seen & (first == cohort), cohort:]
+            label = str(np.datetime64(int(cohort) + month_low, 'M'))
+            result[label] = [int(users) for users in members.sum(axis=0)]
+        return result
+
+
+def _and(mask, condition):
+    return condition if mask is None else mask & condition
+
+
+def _months(ordinals):
+    """Months since 1970-01 of date ordinals, looked up per distinct day."""
+    low = int(ordinals.min())
+    days = np.arange(low, int(ordinals.max()) + 1) - EPOCH_ORDINAL
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype('int64')[ordinals - low]
+
+
+def _sum_by_key(keys, *weights):
+    """(distinct keys, rows per key, [sum of each weights array per key])."""
+    low = int(keys.min())
+    span = int(keys.max()) - low + 1
+    if span <= BINCOUNT_SPAN:
+        values, index = None, keys - low
+    else:
+        values, index = np.unique(keys, return_inverse=True)
+        span = len(values)
+    counts = np.bincount(index, minlength=span)
+    present = np.nonzero(counts)[0]
+    # float64 weights are exact for sums below 2**53 cents.
+    sums = [np.bincount(index, weights=w, minlength=span)[present] for w in weights]
+    return (present + low if values is None else values[present]), counts[present], sums
+
+
+def load_snapshot(directory=None):
+    """The exported snapshot, memory-mapped; ColumnarUnavailable if there is none."""
+    _require_numpy()
+    directory = _directory(directory)
+    meta = _read_meta(directory)
+    if meta is None:
+        raise ColumnarUnavailable(f'No columnar snapshot in {directory}; run manage.py export_columnar.')
+    return ColumnarSnapshot(directory, meta)
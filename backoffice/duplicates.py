@@ -0,0 +1,91 @@
+"""
+Scan for clusters of duplicate transactions.
+
+Transactions sharing a fingerprint (finance.duplicates) are likely
+duplicates. The scan walks the fingerprint index of each shard in ranges
+of chunk_size rows, groups each range, and stores a DuplicateCluster per
+fingerprint found more than once. Every chunk is a short read of one index
+range, so it can run in the background next to live traffic. Clusters the
+scan no longer finds, because a copy was deleted or edited, are removed at
+the end.
+"""
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from fintech_health.sharding import current_shard, each_shard
+
+from finance.models import Transaction
+from .models import DuplicateCluster
+
+CLUSTER_FIELDS = ['type', 'date', 'amount', 'currency', 'note', 'size', 'transaction_ids', 'scanned_at']
+
+
+def _clusters(fingerprints, scanned_at):
+    rows = (
+        Transaction.objects.filter(fingerprint__in=fingerprints).order_by('fingerprint', 'pk')
+        .values_list('fingerprint', 'pk', 'owner_id', 'type', 'date', 'amount', 'currency', 'note')
+    )
+    clusters = []
+    for fingerprint, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        _, _, owner_id, type, date, amount, currency, note = group[0]
+        clusters.append(DuplicateCluster(
+            owner_id=owner_id,
+            fingerprint=fingerprint,
+            type=type,
+            date=date,
+            amount=amount,
+            currency=currency,
+            note=note,
+            size=len(group),
+            transaction_ids=','.join(str(row[1]) for row in group),
+            scanned_at=scanned_at,
+        ))
+    return clusters
+
+
+def _scan_shard(chunk_size, progress):
+    scanned_at = timezone.now()
+    fingerprints = Transaction.objects.order_by('fingerprint').values_list('fingerprint', flat=True)
+    scanned = found = 0
+    after = ''
+    while True:
+        # The chunk_size-th fingerprint after the last chunk bounds this one.
+        upper = fingerprints.filter(fingerprint__gt=after)[chunk_size - 1:chunk_size].first()
+        in_chunk = Transaction.objects.filter(fingerprint__gt=after)
+        if upper is not None:
+            in_chunk = in_chunk.filter(fingerprint__lte=upper)
+        sizes = list(
+            in_chunk.order_by().values_list('fingerprint').annotate(size=Count('pk')).values_list('fingerprint', 'size')
+        )
+        repeated = [fingerprint for fingerprint, size in sizes if size > 1]
+        if repeated:
+            clusters = _clusters(repeated, scanned_at)
+            with transaction.atomic(using=current_shard()):
+                DuplicateCluster.objects.bulk_create(
+                    clusters, update_conflicts=True, unique_fields=['fingerprint'], update_fields=CLUSTER_FIELDS,
+                )
+            found += len(clusters)
+        scanned += sum(size for _, size in sizes)
+        if progress:
+            progress(scanned, found)
+        if upper is None:
+            break
+        after = upper
+    DuplicateCluster.objects.filter(scanned_at__lt=scanned_at).delete()
+    return scanned, found
+
+
+def scan_duplicates(chunk_size=5000, progress=None):
+    """
+    Rebuild the duplicate clusters of every shard. Returns (transactions
+    scanned, clusters found).
+    """
+    scanned = found = 0
+    for _ in each_shard():
+        shard_scanned, shard_found = _scan_shard(chunk_size, progress)
+        scanned += shard_scanned
+        found += shard_found
+    return scanned, found
@@ -0,0 +1,46 @@
+from django import forms
+from finance.models import Transaction
+
+
+class TransactionSearchForm(forms.Form):
+    """Filters of the backoffice transaction search; every field is optional."""
+    user = forms.CharField(required=False, max_length=150, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Username',
+    }))
+    type = forms.ChoiceField(required=False, choices=[('', 'Any type')] + Transaction.TYPE_CHOICES, widget=forms.Select(attrs={
+        'class': 'form-control',
+    }))
+    category = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Category name',
+    }))
+    amount_min = forms.DecimalField(required=False, min_value=0, max_digits=12, decimal_places=2, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'step': '0.01',
+        'placeholder': 'Min amount',
+    }))
+    amount_max = forms.DecimalField(required=False, min_value=0, max_digits=12, decimal_places=2, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'step': '0.01',
+        'placeholder': 'Max amount',
+    }))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={
+        'class': 'form-control',
+        'type': 'date',
+    }))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={
+        'class': 'form-control',
+        'type': 'date',
+    }))
+    note = forms.CharField(required=False, max_length=200, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Note contains',
+    }))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for low, high in (('amount_min', 'amount_max'), ('date_from', 'date_to')):
+            if cleaned_data.get(low) is not None and cleaned_data.get(high) is not None and cleaned_data[low] > cleaned_data[high]:
+                self.add_error(high, 'Must not be before the lower bound.' if high == 'date_to' else 'Must be at least the minimum.')
+        return cleaned_data
@@ -0,0 +1,94 @@
+"""
+HyperLogLog sketches for counting distinct ids.
+
+A sketch is 2**PRECISION one-byte registers, each holding the longest run
+of leading zeros seen among the hashes routed to it. Two sketches merge by
+taking the larger of each pair of registers, so the union of any number of
+sketches estimates the number of distinct ids added to any of them, with a
+standard error of 1.04 / sqrt(2**PRECISION), about 1.6%.
+
+Registers never exceed 64 - PRECISION + 1 < 128, so a merge compares all
+4096 registers at once as lanes of one big integer instead of looping over
+them in Python.
+"""
+import hashlib
+import math
+import zlib
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+
+_HASH_BITS = 64
+_RANK_BITS = _HASH_BITS - PRECISION
+# The high bit of every register, as lanes of one integer.
+_HIGH_BITS = int.from_bytes(b'\x80' * REGISTERS, 'big')
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def _max_registers(a, b):
+    """Lane-wise maximum of two sketches' registers as integers."""
+    # The high bit of a lane of (a | high) - b is set where a >= b. Each
+    # lane's difference is at least 1, so no borrow crosses lanes.
+    mask = ((((a | _HIGH_BITS) - b) & _HIGH_BITS) >> 7) * 0xFF
+    return b ^ ((a ^ b) & mask)
+
+
+class HyperLogLog:
+    __slots__ = ['registers']
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+        if len(self.registers) != REGISTERS:
+            raise ValueError(f'A sketch has {REGISTERS} registers, not {len(self.registers)}.')
+
+    @classmethod
+    def from_bytes(cls, data):
+        """A sketch stored with to_bytes()."""
+        return cls(zlib.decompress(data))
+
+    def to_bytes(self):
+        """The registers, compressed: mostly-empty sketches of quiet days stay small."""
+        return zlib.compress(bytes(self.registers))
+
+    def add(self, value):
+        """Add an id; True if the sketch changed."""
+        digest = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+        index = digest >> _RANK_BITS
+        rank = _RANK_BITS - (digest & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+        if rank <= self.registers[index]:
+            return False
+        self.registers[index] = rank
+        return True
+
+    def update(self, *others):
+        """Merge other sketches into this one."""
+        merged = int.from_bytes(self.registers, 'big')
+        for other in others:
+            merged = _max_registers(merged, int.from_bytes(other.registers, 'big'))
+        self.registers = bytearray(merged.to_bytes(REGISTERS, 'big'))
+
+    @classmethod
+    def union(cls, sketches):
+        sketch = cls()
+        sketch.update(*sketches)
+        return sketch
+
+    def count(self):
+        """Estimated number of distinct ids added."""
+        registers = bytes(self.registers)
+        total = 0.0
+        remaining = REGISTERS
+        # Ranks are small; stop once every register has been counted.
+        for rank in range(_RANK_BITS + 2):
+            if not remaining:
+                break
+            found = registers.count(rank)
+            total += found * 2.0 ** -rank
+            remaining -= found
+        estimate = _ALPHA * REGISTERS * REGISTERS / total
+        zeros = registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Small-range correction (linear counting).
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
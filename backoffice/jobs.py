@@ -0,0 +1,255 @@
+"""
+Background jobs, queued in the database.
+
+enqueue() stores a Job naming a registered task and its JSON arguments, and
+`manage.py runworker` runs queued jobs in a pool of worker processes, so
+exports, recomputations and large admin changes run outside of requests
+without a broker. Tasks are functions registered with @task (see
+backoffice.tasks); they receive the Job and report progress with
+job.set_progress().
+
+The runworker process claims jobs and hands them to the pool. A claim is
+one write transaction that picks the oldest due job whose task is below its
+concurrency limit and marks it running only if it is still queued, so a job
+is never claimed twice, even by workers on other machines. A job that
+raises is queued again after JOB_RETRY_BACKOFF * 2**(attempt - 1) seconds
+until it has used its attempts. Running jobs send a heartbeat; one whose
+heartbeat is older than JOB_STALE_AFTER, because its process died, is
+retried the same way by another worker. A worker never retries its own
+jobs this way: a job whose heartbeat was held up by a long write
+transaction is still running in its pool.
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+Task = namedtuple('Task', 'name func label concurrency max_attempts manual')
+
+# Task name -> Task
+TASKS = {}
+
+
+def task(name, label, concurrency=None, max_attempts=None, manual=False):
+    """
+    Register func(job, **arguments) as a task. At most `concurrency` of its
+    jobs run at once (None: no limit). Manual tasks take no arguments and
+    can be started from the backoffice Jobs page.
+    """
+    def register(func):
+        TASKS[name] = Task(name, func, label, concurrency, max_attempts or settings.JOB_MAX_ATTEMPTS, manual)
+        return func
+    return register
+
+
+def enqueue(name, created_by=None, **arguments):
+    """Queue a job of a registered task."""
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    return Job.objects.create(
+        task=name,
+        arguments=json.dumps(arguments, cls=DjangoJSONEncoder),
+        max_attempts=TASKS[name].max_attempts,
+        created_by=created_by,
+    )
+
+
+def claim_job(worker):
+    """Mark the next due job running for worker and return it, or None."""
+    now = timezone.now()
+    try:
+        with transaction.atomic(using='default'):
+            running = Counter(Job.objects.filter(status='RUNNING').values_list('task', flat=True))
+            full = [name for name, task in TASKS.items() if task.concurrency and running[name] >= task.concurrency]
+            job = (
+                Job.objects.filter(status='QUEUED', run_at__lte=now).exclude(task__in=full)
+                .order_by('run_at', 'pk').first()
+            )
+            if job is None:
+                return None
+            # Conditional, so a job another worker just claimed is skipped.
+            claimed = Job.objects.filter(pk=job.pk, status='QUEUED').update(
+                status='RUNNING',
+                worker=worker,
+                attempts=F('attempts') + 1,
+                started_at=now,
+                heartbeat_at=now,
+            )
+    except OperationalError:
+        # Another worker held the lock for longer than the timeout.
+        return None
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def _claimed(job_id, attempt):
+    # This attempt's row; a stale attempt that was retried elsewhere no longer matches.
+    return Job.objects.filter(pk=job_id, status='RUNNING', attempts=attempt)
+
+
+def fail_attempt(job_id, attempt, error):
+    """End a failed attempt: queue the job again after a backoff, or fail it for good."""
+    now = timezone.now()
+    job = Job.objects.filter(pk=job_id).only('attempts', 'max_attempts', 'task').first()
+    if job is None:
+        return
+    if job.attempts < job.max_attempts and job.task in TASKS:
+        delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        _claimed(job_id, attempt).update(
+            status='QUEUED', run_at=now + timedelta(seconds=delay), worker='', heartbeat_at=None, error=error,
+        )
+    else:
+        _claimed(job_id, attempt).update(status='FAILED', finished_at=now, error=error)
+
+
+def retry_stale_jobs(exclude_worker=None):
+    """Retry or fail running jobs whose worker stopped sending heartbeats."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+    stale = Job.objects.filter(status='RUNNING', heartbeat_at__lt=cutoff)
+    if exclude_worker:
+        stale = stale.exclude(worker=exclude_worker)
+    stale = list(stale.values_list('pk', 'attempts'))
+    for job_id, attempt in stale:
+        fail_attempt(job_id, attempt, 'The worker stopped sending heartbeats.')
+    return len(stale)
+
+
+def _heartbeat(job_id, attempt, stop):
+    while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+        try:
+            _claimed(job_id, attempt).update(heartbeat_at=timezone.now())
+        except OperationalError:
+            # A write transaction, maybe the job's own, held the lock past
+            # the timeout. Keep beating; the next one may get through.
+            pass
+    connections.close_all()
+
+
+def run_job(job_id):
+    """Run a claimed job in this process and record how it ended."""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.pk, job.attempts, stop), daemon=True)
+    heartbeat.start()
+    started = time.monotonic()
+    try:
+        if job.task not in TASKS:
+            raise LookupError(f'Unknown task: {job.task}')
+        result = TASKS[job.task].func(job, **job.get_arguments())
+    except Exception:
+        fail_attempt(job.pk, job.attempts, traceback.format_exc())
+        succeeded = False
+    else:
+        _claimed(job.pk, job.attempts).update(
+            status='SUCCEEDED',
+            result=json.dumps(result, cls=DjangoJSONEncoder),
+            error='',
+            finished_at=timezone.now(),
+        )
+        succeeded = True
+    finally:
+        stop.set()
+        heartbeat.join()
+        close_old_connections()
+    return succeeded, time.monotonic() - started
+
+
+class Worker:
+    """
+    Claims due jobs and runs up to `processes` of them at once in a pool of
+    worker processes, until stopped with SIGINT or SIGTERM; with burst=True,
+    until no job is due. Running jobs are finished before it exits.
+    """
+
+    def __init__(self, processes, poll_interval, burst=False, log=None):
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.log = log or (lambda message: None)
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+
+    def stop(self, *args):
+        if not self.stopping:
+            self.log('Stopping after the running jobs finish')
+        self.stopping = True
+
+    def _pool(self):
+        # Fresh interpreters: forked children would share the parent's
+        # database connections.
+        return ProcessPoolExecutor(self.processes, mp_context=get_context('spawn'), initializer=django.setup)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        running = {}  # future -> job
+        pool = self._pool()
+        try:
+            while True:
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    pool_broken = False
+                    for future in done:
+                        pool_broken |= self._finished(running.pop(future), future)
+                    if pool_broken:
+                        # Every job in a broken pool is lost.
+                        for job in running.values():
+                            fail_attempt(job.pk, job.attempts, 'The worker process died.')
+                        running = {}
+                        pool.shutdown(wait=False)
+                        pool = self._pool()
+
+                retried = retry_stale_jobs(exclude_worker=self.name)
+                if retried:
+                    self.log(f'Retrying {retried} jobs with stale heartbeats')
+
+                claimed = False
+                while not self.stopping and len(running) < self.processes:
+                    job = claim_job(self.name)
+                    if job is None:
+                        break
+                    claimed = True
+                    self.log(f'Started job {job.pk} ({job.task}), attempt {job.attempts} of {job.max_attempts}')
+                    running[pool.submit(run_job, job.pk)] = job
+
+                if not running and (self.stopping or (self.burst and not claimed)):
+                    break
+                if not running:
+                    time.sleep(self.poll_interval)
+        finally:
+            pool.shutdown(wait=True)
+
+    def _finished(self, job, future):
+        """Log how a job ended; True if its process died and broke the pool."""
+        try:
+            succeeded, elapsed = future.result()
+        except BrokenProcessPool:
+            fail_attempt(job.pk, job.attempts, 'The worker process died.')
+            self.log(f'Job {job.pk} ({job.task}) lost its worker process')
+            return True
+        except Exception:
+            # run_job records failures itself; this is a failure to record one.
+            fail_attempt(job.pk, job.attempts, traceback.format_exc())
+            self.log(f'Job {job.pk} ({job.task}) failed')
+            return False
+        self.log(f'Job {job.pk} ({job.task}) {"succeeded" if succeeded else "failed"} in {elapsed:.1f}s')
+        return False
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from backoffice.anomalies import backfill_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-user, per-category spending statistics from existing transactions and flags outliers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Transactions read per chunk')
+        parser.add_argument('--no-flag', action='store_true', help='Only rebuild the statistics, do not flag anomalies')
+
+    def handle(self, *args, **options):
+        def progress(processed, flagged):
+            self.stdout.write(f'  {processed} transactions, {flagged} anomalies')
+
+        processed, flagged = backfill_stats(
+            chunk_size=options['chunk_size'],
+            flag=not options['no_flag'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {processed} transactions, flagged {flagged} new anomalies'
+        ))
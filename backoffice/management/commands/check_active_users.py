@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from backoffice.activity import active_user_counts, exact_active_user_counts, rebuild_sketches
+from backoffice.hyperloglog import STANDARD_ERROR, HyperLogLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the sketched daily, weekly and monthly active users with an exact recount, '
+        'optionally rebuilding the sketches first'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', type=int, metavar='DAYS', help='Rebuild the last DAYS days of sketches first')
+        parser.add_argument(
+            '--synthetic', metavar='N[,N...]',
+            help='Also estimate sketches of N random ids, to check the error at sizes the data does not reach',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild'] is not None:
+            if options['rebuild'] < 1:
+                raise CommandError('--rebuild must be at least 1')
+            written = rebuild_sketches(options['rebuild'])
+            self.stdout.write(f'Rebuilt {written} daily sketches')
+
+        started = time.perf_counter()
+        estimates = active_user_counts()
+        estimated_in = time.perf_counter() - started
+        started = time.perf_counter()
+        exact = exact_active_user_counts()
+        counted_in = time.perf_counter() - started
+
+        self.stdout.write(f'Expected standard error: {STANDARD_ERROR:.2%}')
+        for name, estimate in estimates.items():
+            self.stdout.write(f'  {name:<8} estimate {estimate:>9}  exact {exact[name]:>9}  {self._error(estimate, exact[name])}')
+        self.stdout.write(f'Estimated in {estimated_in * 1000:.2f} ms, counted exactly in {counted_in * 1000:.2f} ms')
+
+        if options['synthetic']:
+            try:
+                sizes = [int(size) for size in options['synthetic'].split(',')]
+            except ValueError:
+                raise CommandError('--synthetic must be a comma-separated list of integers')
+            for size in sizes:
+                sketch = HyperLogLog()
+                for user_id in random.sample(range(size * 100), size):
+                    sketch.add(user_id)
+                self.stdout.write(f'  {size:>9} ids  estimate {sketch.count():>9}  {self._error(sketch.count(), size)}')
+
+    def _error(self, estimate, exact):
+        if not exact:
+            return 'exact' if not estimate else 'n/a'
+        return f'{(estimate - exact) / exact:+.2%}'
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from backoffice.columnar import ColumnarUnavailable, export_columnar, load_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Creates or refreshes the memory-mapped columnar snapshot of transactions used by analytics reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the snapshot instead of refreshing it')
+        parser.add_argument('--report', action='store_true', help='Time a few reports over the snapshot afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            started = time.perf_counter()
+            result = export_columnar(full=options['full'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{'Rebuilt' if result['rebuilt'] else 'Refreshed'} snapshot in {elapsed:.1f}s: "
+                f"{result['appended']} rows appended, {result['patched']} patched, {result['rows']} in total"
+            ))
+            if options['report']:
+                self._report(load_snapshot())
+        except ColumnarUnavailable as e:
+            raise CommandError(str(e))
+
+    def _timed(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write(f'{label:>28}: {(time.perf_counter() - started) * 1000:8.1f} ms')
+        return result
+
+    def _report(self, snapshot):
+        self._timed('system totals', snapshot.totals)
+        by_owner = self._timed('totals by owner', lambda: snapshot.group_by('owner_id'))
+        self._timed('totals by category', lambda: snapshot.group_by('category_id'))
+        self._timed('totals by month', lambda: snapshot.group_by('month'))
+        self._timed('transactions by created day', lambda: snapshot.group_by('created'))
+        if by_owner:
+            owner_id = max(by_owner, key=lambda owner: by_owner[owner]['count'])
+            self._timed('busiest user by month', lambda: snapshot.group_by('month', owner_id=owner_id))
+        self._timed('monthly cohorts', snapshot.cohorts)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backoffice.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs in a pool of worker processes until stopped with Ctrl-C or SIGTERM'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOB_WORKERS,
+            help=f'Jobs run at once (default: JOB_WORKERS, {settings.JOB_WORKERS})',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+            help='Seconds between checks for due jobs',
+        )
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due, e.g. from cron')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1')
+        if options['poll_interval'] <= 0:
+            raise CommandError('--poll-interval must be positive')
+
+        worker = Worker(
+            options['processes'],
+            options['poll_interval'],
+            burst=options['burst'],
+            log=lambda message: self.stdout.write(message),
+        )
+        self.stdout.write(f'Worker {worker.name} running up to {worker.processes} jobs at once')
+        worker.run()
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
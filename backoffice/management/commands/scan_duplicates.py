@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from backoffice.duplicates import scan_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Finds clusters of likely duplicate transactions for the backoffice report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Transactions read per chunk')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        def progress(scanned, found):
+            self.stdout.write(f'  {scanned} transactions, {found} clusters')
+
+        scanned, found = scan_duplicates(
+            chunk_size=options['chunk_size'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} transactions, found {found} duplicate clusters'
+        ))
@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_recurringrule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('backoffice', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('m2', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='spending_stats', to='finance.category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mean', models.FloatField()),
+                ('stddev', models.FloatField()),
+                ('z_score', models.FloatField()),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('CONFIRMED', 'Confirmed'), ('DISMISSED', 'Dismissed')], default='OPEN', max_length=10)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to=settings.AUTH_USER_MODEL)),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_anomalies', to=settings.AUTH_USER_MODEL)),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly', to='finance.transaction')),
+            ],
+            options={
+                'verbose_name_plural': 'anomalies',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='spendingstats',
+            constraint=models.UniqueConstraint(fields=('owner', 'category', 'type'), name='unique_spending_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='spendingstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('owner', 'type'), name='unique_spending_stats_uncategorized'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['status', '-created_at'], name='anomaly_queue_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from finance.models import Category, Transaction
 import json
 
 
@@ -30,5 +32,161 @@ class AuditLog(models.Model):
         return {}
 
 
+class SpendingStats(models.Model):
+    """Running count, mean and sum of squared deviations (Welford) of transaction amounts."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_stats')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='spending_stats')
+    type = models.CharField(max_length=10, choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')])
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'category', 'type'], name='unique_spending_stats'),
+            models.UniqueConstraint(
+                fields=['owner', 'type'],
+                condition=models.Q(category__isnull=True),
+                name='unique_spending_stats_uncategorized',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.owner} - {self.category or 'Uncategorized'} - {self.type}"
+    
+    @property
+    def stddev(self):
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+
+class Anomaly(models.Model):
+    """A transaction flagged as unusually large for its owner and category."""
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('CONFIRMED', 'Confirmed'),
+        ('DISMISSED', 'Dismissed'),
+    ]
+    
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='anomaly')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='anomalies')
+    # In the owner's base currency, like the statistics
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Statistics for the owner and category just before the transaction
+    mean = models.FloatField()
+    stddev = models.FloatField()
+    z_score = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OPEN')
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_anomalies')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'anomalies'
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='anomaly_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.owner} - {self.amount} (z={self.z_score:.1f})"
+
+
+class ActiveUserSketch(models.Model):
+    """HyperLogLog sketch (backoffice.hyperloglog) of the users active on a day."""
+    date = models.DateField(unique=True)
+    # Compressed registers, see HyperLogLog.to_bytes()
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Active users on {self.date}"
 
 
+class DuplicateCluster(models.Model):
+    """Transactions of one user sharing a fingerprint, found by the duplicate scan."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='duplicate_clusters')
+    fingerprint = models.CharField(max_length=32, unique=True)
+    # Shared by every transaction in the cluster, for the report
+    type = models.CharField(max_length=10, choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')])
+    date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    note = models.TextField(blank=True, null=True)
+    size = models.PositiveIntegerField()
+    # Comma-separated ids, oldest first
+    transaction_ids = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Start of the last scan that found the cluster
+    scanned_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-date', '-id']
+    
+    def __str__(self):
+        return f"{self.owner} - {self.size} x {self.amount} {self.currency} on {self.date}"
+
+
+class Job(models.Model):
+    """A background job, run by `manage.py runworker` (backoffice.jobs)."""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    # Name of a task registered in backoffice.jobs.TASKS
+    task = models.CharField(max_length=100)
+    # JSON object of the task's keyword arguments
+    arguments = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Not claimed before this; pushed back after a failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    # Worker running the job and when it last reported in
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    progress_done = models.BigIntegerField(default=0)
+    progress_total = models.BigIntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=200, blank=True)
+    # JSON of the task's return value
+    result = models.TextField(blank=True)
+    # Traceback of the last failed attempt
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} - {self.status}"
+    
+    def get_arguments(self):
+        return json.loads(self.arguments)
+    
+    @property
+    def percent_done(self):
+        if not self.progress_total:
+            return None
+        return min(100, round(self.progress_done * 100 / self.progress_total))
+    
+    def set_progress(self, done, total=None, message=''):
+        """Report progress from a running task; also counts as a heartbeat."""
+        self.progress_done = done
+        self.progress_total = total
+        self.progress_message = message[:200]
+        Job.objects.filter(pk=self.pk).update(
+            progress_done=done,
+            progress_total=total,
+            progress_message=self.progress_message,
+            heartbeat_at=timezone.now(),
+        )
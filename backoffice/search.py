@@ -0,0 +1,158 @@
+"""
+Search across every user's transactions for the backoffice.
+
+Results come newest first, by keyset on (date, id): a page reads the
+matching rows after the previous page's last one from each shard's indexes
+and merges them, so every page costs about the same however deep it is,
+and no total count is taken unless asked for. Each filter has an index to
+walk in that order:
+
+- user: (owner, date, id)
+- category: (category, date, id)
+- any other combination: (date, id), checking the remaining filters on
+  each row
+- a narrow amount range: the amount index, sorting the rows it finds
+- note text: the trigram full-text index finance_transaction_note, for
+  substrings of three characters or more
+"""
+import base64
+import binascii
+import heapq
+from datetime import date
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db.models import F, Func, IntegerField, Q
+from django.db.models.expressions import RawSQL
+from fintech_health.sharding import fan_out
+from finance.models import Category, Transaction, to_cents
+
+PAGE_SIZE = 50
+# The trigram tokenizer cannot match anything shorter.
+MIN_INDEXED_NOTE = 3
+# Amount ranges with at most this many rows are read from the amount index.
+NARROW_AMOUNT_ROWS = 20000
+# Category names matching more categories than this are filtered with IN.
+MAX_CATEGORY_SPLIT = 20
+
+
+def encode_cursor(row_date, pk):
+    return base64.urlsafe_b64encode(f'{row_date.isoformat()}.{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(date, id) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        row_date, pk = raw.split('.')
+        return date.fromisoformat(row_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _note_matches(text):
+    if len(text) < MIN_INDEXED_NOTE:
+        return Q(note__icontains=text)
+    phrase = '"{}"'.format(text.replace('"', '""'))
+    return Q(pk__in=RawSQL(
+        'SELECT rowid FROM finance_transaction_note WHERE finance_transaction_note MATCH %s', [phrase]
+    ))
+
+
+def _owner_ids(filters):
+    """Ids of the users the user filter names, or None without one."""
+    if not filters.get('user'):
+        return None
+    return list(User.objects.filter(username__iexact=filters['user']).values_list('pk', flat=True))
+
+
+def _amount_range(transactions, low, high):
+    amount = Q()
+    if low is not None:
+        amount &= Q(amount_cents__gte=to_cents(low))
+    if high is not None:
+        amount &= Q(amount_cents__lte=to_cents(high))
+    in_range = Transaction.objects.filter(amount).order_by()
+    # Counting up to the cap reads only the amount index.
+    if in_range[:NARROW_AMOUNT_ROWS + 1].count() <= NARROW_AMOUNT_ROWS:
+        # Few rows: read them from the amount index and sort those.
+        return transactions.filter(pk__in=in_range.values('pk'))
+    # Many rows: walking the date index finds a page of them sooner.
+    return transactions.filter(amount)
+
+
+def filtered_transactions(filters, owner_ids=None):
+    """
+    Transactions on the current shard matching a TransactionSearchForm's
+    cleaned_data, as querysets whose rows together are the matches: one per
+    category when the category name matches a few, so each can be read in
+    order from the category index.
+    """
+    transactions = Transaction.objects.all()
+    if owner_ids is not None:
+        transactions = transactions.filter(owner_id__in=owner_ids)
+    if filters.get('type'):
+        transactions = transactions.filter(type=filters['type'])
+    if filters.get('amount_min') is not None or filters.get('amount_max') is not None:
+        transactions = _amount_range(transactions, filters.get('amount_min'), filters.get('amount_max'))
+    if filters.get('date_from'):
+        transactions = transactions.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        transactions = transactions.filter(date__lte=filters['date_to'])
+    if filters.get('note'):
+        transactions = transactions.filter(_note_matches(filters['note']))
+    if not filters.get('category'):
+        return [transactions]
+    # Global categories and categories of different users can share a name.
+    category_ids = list(Category.objects.filter(name__iexact=filters['category']).values_list('pk', flat=True))
+    if owner_ids is not None:
+        # A user's transactions are few enough to check each one; the unary
+        # plus keeps SQLite, which has no statistics, off the category index.
+        return [transactions.alias(
+            unindexed_category=Func(F('category_id'), template='+%(expressions)s', output_field=IntegerField()),
+        ).filter(unindexed_category__in=category_ids)]
+    if len(category_ids) > MAX_CATEGORY_SPLIT:
+        return [transactions.filter(category_id__in=category_ids)]
+    return [transactions.filter(category_id=category_id) for category_id in category_ids]
+
+
+def _newest_first(rows):
+    return heapq.merge(*rows, key=lambda txn: (txn.date, txn.pk), reverse=True)
+
+
+def _page(filters, owner_ids, after, limit):
+    pages = []
+    for transactions in filtered_transactions(filters, owner_ids):
+        if after:
+            after_date, after_pk = after
+            transactions = transactions.filter(Q(date__lt=after_date) | Q(date=after_date, pk__lt=after_pk))
+        pages.append(list(transactions.select_related('owner', 'category').order_by('-date', '-id')[:limit]))
+    return list(islice(_newest_first(pages), limit))
+
+
+def search_transactions(filters, after=None, limit=PAGE_SIZE):
+    """
+    Up to limit matching transactions newest first, after the (date, id)
+    of the previous page's last row, and the cursor of the next page
+    (None on the last).
+    """
+    owner_ids = _owner_ids(filters)
+    if owner_ids == []:
+        return [], None
+    rows = list(islice(_newest_first(fan_out(_page, filters, owner_ids, after, limit + 1)), limit + 1))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].date, rows[-1].pk)
+
+
+def _count(filters, owner_ids):
+    return sum(transactions.count() for transactions in filtered_transactions(filters, owner_ids))
+
+
+def count_matches(filters):
+    """Total matching transactions on every shard; reads every match."""
+    owner_ids = _owner_ids(filters)
+    if owner_ids == []:
+        return 0
+    return sum(fan_out(_count, filters, owner_ids))
@@ -0,0 +1,55 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from fintech_health.sharding import shard_for_user, use_shard
+from finance.models import Category, Transaction
+from finance.signals import _deleting_user, base_currency_changed, category_merged, transactions_bulk_created
+from .activity import record_activity
+from .anomalies import backfill_stats, move_category_stats, observe_transactions
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_created(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        with use_shard(using):
+            observe_transactions([instance])
+
+
+@receiver(transactions_bulk_created, sender=Transaction)
+def transactions_created(sender, transactions, **kwargs):
+    observe_transactions(transactions)
+    # Occurrences of recurring rules are written by the scheduler, not their owners.
+    record_activity(txn.owner_id for txn in transactions if txn.recurring_rule_id is None)
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_written(sender, instance, using, raw=False, **kwargs):
+    if not raw and instance.recurring_rule_id is None:
+        with use_shard(using):
+            record_activity([instance.owner_id])
+
+
+@receiver(user_logged_in)
+def user_logged_in_handler(sender, user, **kwargs):
+    with use_shard(shard_for_user(user.pk)):
+        record_activity([user.pk])
+
+
+@receiver(base_currency_changed)
+def base_currency_changed_handler(sender, user_id, **kwargs):
+    # Statistics are kept in the base currency; replay the user's history in the new one.
+    backfill_stats(flag=False, owner_id=user_id)
+
+
+@receiver(category_merged, sender=Category)
+def category_merged_handler(sender, source_id, target_id, **kwargs):
+    move_category_stats(source_id, target_id)
+
+
+@receiver(pre_delete, sender=Category)
+def category_pre_delete(sender, instance, using, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    # Its transactions become uncategorized; so do their statistics.
+    with use_shard(using):
+        move_category_stats(instance.pk, None)
@@ -0,0 +1,74 @@
+"""
+Long-running operations as background job tasks (backoffice.jobs).
+
+Each wraps the function behind the matching management command and
+returns a JSON-serializable summary. Rebuilds of one kind run one at a
+time: they read and rewrite the same rows, and SQLite has a single writer
+per database anyway.
+"""
+from fintech_health.sharding import shard_for_pk
+
+from finance.budgets import rebuild_budget_spend
+from finance.merge import merge_category
+from finance.models import Category, Transaction
+from finance.rollups import rebuild_rollups
+from .activity import rebuild_sketches
+from .anomalies import backfill_stats
+from .columnar import export_columnar
+from .duplicates import scan_duplicates
+from .jobs import task
+from .utils import count_all
+
+
+@task('export_columnar', 'Refresh the columnar snapshot', concurrency=1, manual=True)
+def export_columnar_task(job, full=False):
+    return export_columnar(full=full)
+
+
+@task('rebuild_rollups', 'Rebuild daily rollups', concurrency=1, manual=True)
+def rebuild_rollups_task(job, user_id=None):
+    return {'rows': rebuild_rollups(user_id)}
+
+
+@task('rebuild_budgets', 'Recompute budget spend', concurrency=1, manual=True)
+def rebuild_budgets_task(job, fix=True):
+    return {'mismatches': len(rebuild_budget_spend(fix=fix))}
+
+
+@task('backfill_anomalies', 'Rebuild spending statistics and flag anomalies', concurrency=1, manual=True)
+def backfill_anomalies_task(job, chunk_size=2000, flag=True):
+    total = count_all(Transaction.objects.all())
+
+    def progress(processed, flagged):
+        job.set_progress(processed, total, f'{flagged} anomalies flagged')
+
+    processed, flagged = backfill_stats(chunk_size=chunk_size, flag=flag, progress=progress)
+    return {'processed': processed, 'flagged': flagged}
+
+
+@task('scan_duplicates', 'Scan for duplicate transactions', concurrency=1, manual=True)
+def scan_duplicates_task(job, chunk_size=5000):
+    total = count_all(Transaction.objects.all())
+
+    def progress(scanned, found):
+        job.set_progress(scanned, total, f'{found} clusters found')
+
+    scanned, found = scan_duplicates(chunk_size=chunk_size, progress=progress)
+    return {'scanned': scanned, 'clusters': found}
+
+
+@task('rebuild_active_users', 'Rebuild the last 30 days of active-user sketches', concurrency=1, manual=True)
+def rebuild_active_users_task(job, days=30):
+    return {'sketches': rebuild_sketches(days)}
+
+
+@task('merge_category', 'Delete a category, moving its transactions', concurrency=1)
+def merge_category_task(job, category_id, target_id=None, chunk_size=2000):
+    # Ids are unique across shards and say which shard allocated them.
+    source = Category.objects.using(shard_for_pk(category_id)).get(pk=category_id)
+    target = Category.objects.using(shard_for_pk(target_id)).get(pk=target_id) if target_id else None
+
+    def progress(moved, total):
+        job.set_progress(moved, total, f'Moving the transactions of {source.name}')
+
+    return {'moved': merge_category(source, target, chunk_size=chunk_size, progress=progress)}
@@ -5,11 +5,18 @@ app_name = 'backoffice'
 
 urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),
+    path('async/', views.dashboard_async_view, name='dashboard_async'),
     path('users/', views.user_list_view, name='user_list'),
     path('users/<int:pk>/', views.user_detail_view, name='user_detail'),
     path('settings/', views.settings_view, name='settings'),
     path('monitoring/', views.monitoring_view, name='monitoring'),
+    path('monitoring/live/', views.monitoring_live_view, name='monitoring_live'),
+    path('transactions/', views.transaction_search_view, name='transaction_search'),
+    path('duplicates/', views.duplicate_list_view, name='duplicate_list'),
+    path('jobs/', views.job_list_view, name='job_list'),
     path('audit/', views.audit_log_view, name='audit_log'),
+    path('anomalies/', views.anomaly_list_view, name='anomaly_list'),
+    path('anomalies/<int:pk>/review/', views.anomaly_review_view, name='anomaly_review'),
 ]
 
 
@@ -1,3 +1,11 @@
+from operator import attrgetter
+
+from django.conf import settings
+from fintech_health.routers import pin_to_primary
+from fintech_health.sharding import AcrossShards, fan_out
+from finance.currency import from_cents
+from finance.models import Transaction
+from finance.utils import totals_in_cents
 from .models import AuditLog
 
 
@@ -11,8 +19,40 @@ def log_admin_action(actor, action, target, metadata=None):
     if metadata:
         log.set_metadata(metadata)
         log.save()
+    # Let the acting admin see the new entry in the (replica-backed) audit log.
+    pin_to_primary(actor.id if actor else None)
     return log
 
 
+def count_all(queryset):
+    """queryset.count() summed over every shard."""
+    return sum(fan_out(queryset.count))
+
+
+def latest_transactions(limit):
+    """The newest transactions across every shard, with owner and category."""
+    transactions = Transaction.objects.select_related('owner', 'category').order_by('-created_at')
+    return AcrossShards(transactions, key=attrgetter('created_at'), reverse=True)[:limit]
+
+
+def totals_in_cents_all(transactions, base_currency):
+    """totals_in_cents() summed over every shard."""
+    totals = fan_out(totals_in_cents, transactions, base_currency)
+    return sum(income for income, _ in totals), sum(expense for _, expense in totals)
+
+
+def _day_totals(day):
+    day_transactions = Transaction.objects.filter(created_at__date=day)
+    return (day_transactions.count(), *totals_in_cents(day_transactions, settings.DEFAULT_CURRENCY))
 
 
+def get_daily_totals(day):
+    """Transaction count and income/expense/net across all users for one day, in DEFAULT_CURRENCY."""
+    day_count, day_income, day_expense = (sum(column) for column in zip(*fan_out(_day_totals, day)))
+    return {
+        'date': day,
+        'count': day_count,
+        'income': from_cents(day_income),
+        'expense': from_cents(day_expense),
+        'net': from_cents(day_income - day_expense)
+    }
@@ -1,20 +1,33 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from decimal import Decimal
+from operator import attrgetter
 from accounts.decorators import admin_required
 from accounts.models import Profile
+from fintech_health.routers import read_from_replica
+from fintech_health.sharding import AcrossShards, shard_for_pk
+from finance.currency import from_cents
+from finance.live import ADMINS, live_response
+from finance.merge import CategoryMergeError, check_merge_target, merge_category
 from finance.models import Transaction, Category
-from .models import AuditLog
-from .utils import log_admin_action
+from finance.utils import run_concurrently, totals_in_cents
+from .activity import active_user_counts
+from .forms import TransactionSearchForm
+from .jobs import TASKS, enqueue
+from .models import Anomaly, AuditLog, DuplicateCluster, Job
+from .search import count_matches, decode_cursor, search_transactions
+from .utils import count_all, get_daily_totals, latest_transactions, log_admin_action, totals_in_cents_all
 
 
 @admin_required
+@read_from_replica
 def dashboard_view(request):
     """Admin dashboard with overview statistics."""
     # User statistics
@@ -22,35 +35,20 @@ def dashboard_view(request):
     active_users = Profile.objects.filter(is_active=True).count()
     admin_users = Profile.objects.filter(role='ADMIN').count()
     
-    # Transaction statistics
-    total_transactions = Transaction.objects.count()
-    today_transactions = Transaction.objects.filter(
+    # Transaction statistics, across every shard
+    total_transactions = count_all(Transaction.objects.all())
+    today_transactions = count_all(Transaction.objects.filter(
         created_at__date=timezone.now().date()
-    ).count()
+    ))
     
     # Recent transactions
-    recent_transactions = Transaction.objects.select_related('owner', 'category').order_by('-created_at')[:20]
+    recent_transactions = latest_transactions(20)
     
     # Daily totals (last 7 days)
     now = timezone.now().date()
     daily_totals = []
     for day_offset in range(7):
-        day = now - timedelta(days=day_offset)
-        day_transactions = Transaction.objects.filter(created_at__date=day)
-        day_count = day_transactions.count()
-        day_income = day_transactions.filter(type='INCOME').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        day_expense = day_transactions.filter(type='EXPENSE').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        daily_totals.append({
-            'date': day,
-            'count': day_count,
-            'income': day_income,
-            'expense': day_expense,
-            'net': day_income - day_expense
-        })
+        daily_totals.append(get_daily_totals(now - timedelta(days=day_offset)))
     
     daily_totals.reverse()  # Show oldest first
     
@@ -68,6 +66,37 @@ def dashboard_view(request):
 
 
 @admin_required
+@read_from_replica
+async def dashboard_async_view(request):
+    """Async admin dashboard for ASGI deployments; runs the queries concurrently."""
+    now = timezone.now().date()
+    
+    (total_users, active_users, admin_users, total_transactions, today_transactions,
+     recent_transactions, *daily_totals) = await run_concurrently(
+        (User.objects.count,),
+        (Profile.objects.filter(is_active=True).count,),
+        (Profile.objects.filter(role='ADMIN').count,),
+        (count_all, Transaction.objects.all()),
+        (count_all, Transaction.objects.filter(created_at__date=now)),
+        (latest_transactions, 20),
+        *((get_daily_totals, now - timedelta(days=day_offset)) for day_offset in range(6, -1, -1)),
+    )
+    
+    context = {
+        'total_users': total_users,
+        'active_users': active_users,
+        'admin_users': admin_users,
+        'total_transactions': total_transactions,
+        'today_transactions': today_transactions,
+        'recent_transactions': recent_transactions,
+        'daily_totals': daily_totals,
+    }
+    
+    return await sync_to_async(render)(request, 'backoffice/dashboard.html', context)
+
+
+@admin_required
+@read_from_replica
 def user_list_view(request):
     """List all users with management options."""
     users = User.objects.select_related('profile').all().order_by('-date_joined')
@@ -99,15 +128,12 @@ def user_detail_view(request, pk):
     user = get_object_or_404(User, pk=pk)
     profile, created = Profile.objects.get_or_create(user=user)
     
-    # Get user's transaction stats
-    user_transactions = Transaction.objects.filter(owner=user)
-    total_income = user_transactions.filter(type='INCOME').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    total_expense = user_transactions.filter(type='EXPENSE').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    net_balance = total_income - total_expense
+    # Get user's transaction stats, in their base currency
+    user_transactions = user.transactions.all()  # on the user's shard
+    income, expense = totals_in_cents(user_transactions, profile.base_currency)
+    total_income = from_cents(income)
+    total_expense = from_cents(expense)
+    net_balance = from_cents(income - expense)
     transaction_count = user_transactions.count()
     
     if request.method == 'POST':
@@ -165,7 +191,8 @@ def settings_view(request):
             category_type = request.POST.get('type', 'BOTH')
             
             if name:
-                category = Category.objects.create(
+                # Created on 'default', which copies it to the other shards.
+                category = Category.objects.using('default').create(
                     name=name,
                     type=category_type,
                     owner=None
@@ -182,18 +209,41 @@ def settings_view(request):
         
         elif action == 'delete_category':
             category_id = request.POST.get('category_id')
+            target_id = request.POST.get('target_id') or None
             try:
                 category = Category.objects.get(id=category_id, owner__isnull=True)
+                target = Category.objects.get(id=target_id, owner__isnull=True) if target_id else None
+                count = count_all(Transaction.objects.filter(category_id=category.id))
+                if count > settings.CATEGORY_INLINE_MERGE_LIMIT:
+                    check_merge_target(category, target)
+                    job = enqueue(
+                        'merge_category', created_by=request.user,
+                        category_id=category.id, target_id=target.id if target else None,
+                    )
+                    log_admin_action(
+                        request.user,
+                        'Global category deletion queued',
+                        category.name,
+                        {'category_id': category_id, 'target_id': target_id, 'job_id': job.pk}
+                    )
+                    messages.success(
+                        request,
+                        f'{category.name} has {count} transactions, so it is deleted in the background. '
+                        f'Follow job {job.pk} under Jobs.'
+                    )
+                    return redirect('backoffice:settings')
                 category_name = category.name
-                category.delete()
+                moved = merge_category(category, target)
                 log_admin_action(
                     request.user,
                     'Global category deleted',
                     category_name,
-                    {'category_id': category_id}
+                    {'category_id': category_id, 'target_id': target_id, 'transactions_moved': moved}
                 )
                 messages.success(request, 'Global category deleted successfully.')
-            except Category.DoesNotExist:
+            except CategoryMergeError as e:
+                messages.error(request, str(e))
+            except (Category.DoesNotExist, ValueError):
                 messages.error(request, 'Category not found.')
         
         return redirect('backoffice:settings')
@@ -204,42 +254,41 @@ def settings_view(request):
 
 
 @admin_required
+@read_from_replica
 def monitoring_view(request):
     """System monitoring and statistics."""
     now = timezone.now()
     
     # Transaction counts
-    total_transactions = Transaction.objects.count()
-    today_count = Transaction.objects.filter(created_at__date=now.date()).count()
-    week_count = Transaction.objects.filter(
+    total_transactions = count_all(Transaction.objects.all())
+    today_count = count_all(Transaction.objects.filter(created_at__date=now.date()))
+    week_count = count_all(Transaction.objects.filter(
         created_at__gte=now - timedelta(days=7)
-    ).count()
-    month_count = Transaction.objects.filter(
+    ))
+    month_count = count_all(Transaction.objects.filter(
         created_at__gte=now - timedelta(days=30)
-    ).count()
+    ))
     
-    # Financial totals
-    total_income = Transaction.objects.filter(type='INCOME').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    total_expense = Transaction.objects.filter(type='EXPENSE').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    net_total = total_income - total_expense
+    # Financial totals, in the default currency
+    income, expense = totals_in_cents_all(Transaction.objects.all(), settings.DEFAULT_CURRENCY)
+    total_income = from_cents(income)
+    total_expense = from_cents(expense)
+    net_total = from_cents(income - expense)
     
     # User statistics
     total_users = User.objects.count()
-    users_with_transactions = User.objects.filter(transactions__isnull=False).distinct().count()
+    # A user's transactions are all on one shard.
+    users_with_transactions = count_all(Transaction.objects.values('owner_id').distinct())
+    # Estimated from the daily HyperLogLog sketches
+    active_users = active_user_counts()
     
-    # Category statistics
-    total_categories = Category.objects.count()
+    # Category statistics; every shard has a copy of the global categories
     global_categories = Category.objects.filter(owner__isnull=True).count()
-    user_categories = Category.objects.filter(owner__isnull=False).count()
+    user_categories = count_all(Category.objects.filter(owner__isnull=False))
+    total_categories = global_categories + user_categories
     
     # Recent activity (last 50 transactions)
-    recent_transactions = Transaction.objects.select_related(
-        'owner', 'category'
-    ).order_by('-created_at')[:50]
+    recent_transactions = latest_transactions(50)
     
     context = {
         'total_transactions': total_transactions,
@@ -251,6 +300,7 @@ def monitoring_view(request):
         'net_total': net_total,
         'total_users': total_users,
         'users_with_transactions': users_with_transactions,
+        'active_users': active_users,
         'total_categories': total_categories,
         'global_categories': global_categories,
         'user_categories': user_categories,
@@ -261,6 +311,13 @@ def monitoring_view(request):
 
 
 @admin_required
+async def monitoring_live_view(request):
+    """Server-Sent Events with the monitoring counters and newly created transactions."""
+    return live_response(request, ADMINS)
+
+
+@admin_required
+@read_from_replica
 def audit_log_view(request):
     """View audit logs of admin actions."""
     logs = AuditLog.objects.select_related('actor').all()
@@ -280,3 +337,149 @@ def audit_log_view(request):
         'action_filter': action_filter
     })
 
+
+@admin_required
+@read_from_replica
+def transaction_search_view(request):
+    """Search every user's transactions, a page at a time newest first."""
+    form = TransactionSearchForm(request.GET or None)
+    transactions, next_cursor, total = [], None, None
+    if form.is_valid():
+        # No total unless asked for: counting reads every match.
+        after = decode_cursor(request.GET.get('after', ''))
+        transactions, next_cursor = search_transactions(form.cleaned_data, after=after)
+        if request.GET.get('count'):
+            total = count_matches(form.cleaned_data)
+
+    # The same filters with the next page's cursor
+    next_query = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['after'] = next_cursor
+        query.pop('count', None)
+        next_query = query.urlencode()
+
+    return render(request, 'backoffice/transaction_search.html', {
+        'form': form,
+        'transactions': transactions,
+        'next_query': next_query,
+        'total': total,
+        'is_first_page': 'after' not in request.GET,
+    })
+
+
+@admin_required
+@read_from_replica
+def anomaly_list_view(request):
+    """Review queue of transactions flagged as unusual."""
+    status_filter = request.GET.get('status', 'OPEN')
+    # Profiles live on 'default', so they are fetched separately from
+    # anomalies on the other shards.
+    anomalies = Anomaly.objects.select_related(
+        'owner', 'transaction__category', 'reviewed_by'
+    ).prefetch_related('owner__profile')
+    if status_filter in dict(Anomaly.STATUS_CHOICES):
+        anomalies = anomalies.filter(status=status_filter)
+    
+    # Pagination, newest first across every shard
+    paginator = Paginator(AcrossShards(anomalies, key=attrgetter('created_at'), reverse=True), 50)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    return render(request, 'backoffice/anomaly_list.html', {
+        'page_obj': page_obj,
+        'status_filter': status_filter,
+        'status_choices': Anomaly.STATUS_CHOICES,
+    })
+
+
+@admin_required
+@read_from_replica
+def duplicate_list_view(request):
+    """Clusters of likely duplicate transactions found by the last scan."""
+    clusters = DuplicateCluster.objects.select_related('owner')
+
+    # Pagination, latest transaction date first across every shard
+    paginator = Paginator(AcrossShards(clusters, key=attrgetter('date', 'pk'), reverse=True), 50)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    return render(request, 'backoffice/duplicate_list.html', {
+        'page_obj': page_obj,
+    })
+
+
+@admin_required
+def job_list_view(request):
+    """Background jobs with their progress; start, retry or cancel them."""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            task = TASKS.get(request.POST.get('task'))
+            if task is None or not task.manual:
+                messages.error(request, 'Unknown task.')
+            else:
+                job = enqueue(task.name, created_by=request.user)
+                log_admin_action(request.user, 'Job queued', task.label, {'job_id': job.pk, 'task': task.name})
+                messages.success(request, f'Queued job {job.pk}: {task.label}.')
+        elif action in ('retry', 'cancel'):
+            job = Job.objects.filter(pk=request.POST.get('job_id')).first()
+            if job is None:
+                messages.error(request, 'Job not found.')
+            elif action == 'retry' and job.status == 'FAILED':
+                Job.objects.filter(pk=job.pk, status='FAILED').update(
+                    status='QUEUED', attempts=0, run_at=timezone.now(), finished_at=None,
+                )
+                log_admin_action(request.user, 'Job retried', job.task, {'job_id': job.pk})
+                messages.success(request, f'Queued job {job.pk} again.')
+            elif action == 'cancel' and Job.objects.filter(pk=job.pk, status='QUEUED').update(
+                status='CANCELLED', finished_at=timezone.now(),
+            ):
+                log_admin_action(request.user, 'Job cancelled', job.task, {'job_id': job.pk})
+                messages.success(request, f'Cancelled job {job.pk}.')
+            else:
+                messages.error(request, f'Job {job.pk} is {job.get_status_display().lower()}.')
+        return redirect('backoffice:job_list')
+
+    status_filter = request.GET.get('status', '')
+    jobs = Job.objects.select_related('created_by')
+    if status_filter in dict(Job.STATUS_CHOICES):
+        jobs = jobs.filter(status=status_filter)
+
+    # Pagination
+    paginator = Paginator(jobs, 50)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    for job in page_obj:
+        job.label = TASKS[job.task].label if job.task in TASKS else job.task
+    
+    return render(request, 'backoffice/job_list.html', {
+        'page_obj': page_obj,
+        'status_filter': status_filter,
+        'status_choices': Job.STATUS_CHOICES,
+        'manual_tasks': [task for task in TASKS.values() if task.manual],
+        'active': any(job.status in ('QUEUED', 'RUNNING') for job in page_obj),
+    })
+
+
+@admin_required
+def anomaly_review_view(request, pk):
+    """Confirm or dismiss a flagged transaction."""
+    anomaly = get_object_or_404(Anomaly.objects.using(shard_for_pk(pk)).select_related('owner'), pk=pk)
+    
+    if request.method == 'POST':
+        status = request.POST.get('status')
+        if status in ['CONFIRMED', 'DISMISSED']:
+            anomaly.status = status
+            anomaly.reviewed_by = request.user
+            anomaly.reviewed_at = timezone.now()
+            anomaly.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+            log_admin_action(
+                request.user,
+                f'Anomaly {status.lower()}',
+                f'Transaction #{anomaly.transaction_id} ({anomaly.owner.username})',
+                {'anomaly_id': anomaly.id, 'amount': str(anomaly.amount), 'z_score': round(anomaly.z_score, 2)}
+            )
+            messages.success(request, f'Anomaly marked as {status.lower()}.')
+    
+    return redirect('backoffice:anomaly_list')
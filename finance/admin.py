@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Category, Transaction
+from .models import (
+    Budget, BudgetAlert, Category, ChangeFeedConsumer, DailyRollup, ExchangeRate, RecurringRule, Transaction,
+    TransactionChange,
+)
 
 
 @admin.register(Category)
@@ -11,11 +14,55 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['owner', 'type', 'amount', 'category', 'date', 'created_at']
+    list_display = ['owner', 'type', 'amount', 'currency', 'category', 'date', 'created_at']
     list_filter = ['type', 'date', 'created_at']
     search_fields = ['note', 'owner__username']
     date_hierarchy = 'date'
 
 
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'type', 'amount', 'currency', 'category', 'frequency', 'next_date', 'is_active']
+    list_filter = ['frequency', 'type', 'is_active']
+    search_fields = ['note', 'owner__username']
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'date', 'category', 'type', 'total', 'count']
+    list_filter = ['type', 'date']
+    search_fields = ['owner__username']
+    date_hierarchy = 'date'
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'category', 'month', 'limit', 'spent']
+    list_filter = ['month']
+    search_fields = ['owner__username', 'category__name']
+    readonly_fields = ['spent']
+
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    list_display = ['budget', 'threshold', 'spent', 'is_read', 'created_at']
+    list_filter = ['threshold', 'is_read']
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'date', 'rate']
+    list_filter = ['currency']
+    date_hierarchy = 'date'
+
+
+@admin.register(TransactionChange)
+class TransactionChangeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'operation', 'transaction_id', 'owner_id', 'created_at']
+    list_filter = ['operation']
+    search_fields = ['transaction_id']
 
 
+@admin.register(ChangeFeedConsumer)
+class ChangeFeedConsumerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'position', 'updated_at']
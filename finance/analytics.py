@@ -0,0 +1,117 @@
+"""
+Per-category spending analytics.
+
+Totals come from DailyRollup with one grouped query per month window, so
+the cost depends on the number of active days and categories in the window,
+not on the length of the user's history.
+"""
+import heapq
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Budget, DailyRollup
+
+CENTS = Decimal('0.01')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def previous_month_start(day):
+    return (month_start(day) - timedelta(days=1)).replace(day=1)
+
+
+def category_totals(user, start_date, end_date, type='EXPENSE'):
+    """Map of category_id -> (name, total) for a date window, in one query."""
+    rows = DailyRollup.objects.filter(
+        owner=user,
+        type=type,
+        date__gte=start_date,
+        date__lte=end_date,
+    ).values('category_id', 'category__name').annotate(
+        total=Sum('total')
+    ).order_by()
+
+    return {
+        row['category_id']: (row['category__name'] or 'Uncategorized', row['total'].quantize(CENTS))
+        for row in rows
+        if row['total']
+    }
+
+
+def category_breakdown(user, month=None, type='EXPENSE', top_n=5):
+    """
+    Category totals, shares, month-over-month changes and budget limits for
+    a month. The top_n categories are listed individually; the rest are
+    summed into an 'Other' bucket.
+    """
+    month = month_start(month or timezone.now().date())
+    month_end = next_month_start(month) - timedelta(days=1)
+    previous = previous_month_start(month)
+
+    current_totals = category_totals(user, month, month_end, type)
+    previous_totals = category_totals(user, previous, month - timedelta(days=1), type)
+
+    budgets = dict(
+        Budget.objects.filter(owner=user, month=month).values_list('category_id', 'limit')
+    ) if type == 'EXPENSE' else {}
+
+    total = sum((amount for _, amount in current_totals.values()), Decimal('0.00'))
+    previous_total = sum((amount for _, amount in previous_totals.values()), Decimal('0.00'))
+
+    def entry(category_id, name, amount, previous_amount):
+        return {
+            'category_id': category_id,
+            'name': name,
+            'total': amount,
+            'share': round(float(amount / total) * 100, 1) if total else 0.0,
+            'previous': previous_amount,
+            'change': amount - previous_amount,
+            'budget': budgets.get(category_id),
+        }
+
+    # heapq.nlargest is O(n log top_n), which matters for users with many categories.
+    top = heapq.nlargest(top_n, current_totals.items(), key=lambda item: item[1][1])
+    categories = [
+        entry(category_id, name, amount, previous_totals.get(category_id, (name, Decimal('0.00')))[1])
+        for category_id, (name, amount) in top
+    ]
+
+    other = None
+    top_ids = {category_id for category_id, _ in top}
+    rest = [category_id for category_id in current_totals if category_id not in top_ids]
+    if rest:
+        other_amount = sum((current_totals[category_id][1] for category_id in rest), Decimal('0.00'))
+        other_previous = sum(
+            (amount for category_id, (_, amount) in previous_totals.items() if category_id not in top_ids),
+            Decimal('0.00')
+        )
+        other = entry(None, 'Other', other_amount, other_previous)
+        other['category_count'] = len(rest)
+
+    return {
+        'month': month,
+        'type': type,
+        'total': total,
+        'previous_total': previous_total,
+        'change': total - previous_total,
+        'categories': categories,
+        'other': other,
+    }
+
+
+def parse_month(value):
+    """Parse 'YYYY-MM' into the first day of that month, or None."""
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,359 @@
+"""
+JSON API for transactions.
+
+    GET    /app/api/transactions/          list, newest first, cursor-paginated
+    POST   /app/api/transactions/          create one
+    POST   /app/api/transactions/bulk/     create up to API_BULK_MAX_ROWS
+    GET    /app/api/transactions/<id>/     one transaction
+    DELETE /app/api/transactions/<id>/     delete one
+    GET    /app/api/changes/               change feed of every user's writes (admins)
+
+Lists are paginated by keyset on (date, id), so a deep page costs the same
+as the first, and `fields=` limits both the columns read and those returned.
+Responses are compact JSON, gzipped when the client accepts it.
+
+Bulk creates validate every row with TransactionForm, insert with
+bulk_create and fold the rows into the derived tables in one pass. A write
+sent with an Idempotency-Key header stores its response in the same
+database transaction as its rows; a retry with the same key and body gets
+the stored response back without writing anything.
+
+Creates look up rows repeating stored transactions by fingerprint
+(finance.duplicates). `duplicates=` chooses what happens to them: `allow`
+(the default) creates them, `skip` leaves them out and `reject` fails the
+request with 409. Bulk responses list the indices of the repeated rows.
+
+The change feed returns outbox entries (finance.outbox) oldest first after
+the `after` cursor, with the cursor to pass next. With `consumer=<name>`
+the request also acknowledges `after` for that consumer, and without
+`after` it resumes from the consumer's acknowledged position.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+
+from accounts.decorators import api_login_required
+from fintech_health.routers import read_from_replica
+from fintech_health.sharding import current_shard
+from .categories import categories_for
+from .duplicates import find_duplicate, find_duplicates
+from .forms import TransactionForm
+from .models import IdempotencyKey, Transaction
+from .outbox import CursorError, acknowledge, change_as_dict, consumer_positions, format_cursor, parse_cursor, read_changes
+from .signals import apply_transaction_changes, transactions_bulk_created
+
+# What a create does with rows repeating stored transactions
+DUPLICATE_MODES = ['allow', 'skip', 'reject']
+
+# API field name -> lookup passed to values()
+FIELDS = {
+    'id': 'id',
+    'type': 'type',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'amount': 'amount',
+    'currency': 'currency',
+    'date': 'date',
+    'note': 'note',
+    'recurring_rule': 'recurring_rule_id',
+    'created_at': 'created_at',
+}
+DEFAULT_FIELDS = ['id', 'type', 'category', 'amount', 'currency', 'date', 'note']
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'separators': (',', ':')})
+
+
+def _error(message, status=400, **extra):
+    return _json({'error': message, **extra}, status=status)
+
+
+def _parse_fields(request):
+    if not request.GET.get('fields'):
+        return DEFAULT_FIELDS
+    fields = [name.strip() for name in request.GET['fields'].split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(FIELDS)}.")
+    return fields
+
+
+def _rows(queryset, fields):
+    lookups = [FIELDS[name] for name in fields]
+    return [
+        {name: row[lookup] for name, lookup in zip(fields, lookups)}
+        for row in queryset.values(*lookups)
+    ]
+
+
+def _encode_cursor(row_date, pk):
+    return base64.urlsafe_b64encode(f'{row_date.isoformat()}.{pk}'.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        row_date, pk = raw.split('.')
+        return date.fromisoformat(row_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise APIError('Invalid cursor.')
+
+
+def _parse_body(request):
+    try:
+        return json.loads(request.body or b'null')
+    except (ValueError, UnicodeDecodeError):
+        raise APIError('Request body must be valid JSON.')
+
+
+def _filtered(request):
+    transactions = Transaction.objects.filter(owner=request.user)
+    transaction_type = request.GET.get('type')
+    if transaction_type:
+        if transaction_type not in ('INCOME', 'EXPENSE'):
+            raise APIError('type must be INCOME or EXPENSE.')
+        transactions = transactions.filter(type=transaction_type)
+    if request.GET.get('category'):
+        try:
+            transactions = transactions.filter(category_id=int(request.GET['category']))
+        except ValueError:
+            raise APIError('category must be an integer.')
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        if request.GET.get(param):
+            try:
+                transactions = transactions.filter(**{lookup: date.fromisoformat(request.GET[param])})
+            except ValueError:
+                raise APIError(f'{param} must be in YYYY-MM-DD format.')
+    return transactions
+
+
+@read_from_replica
+def _list(request):
+    fields = _parse_fields(request)
+    try:
+        limit = min(max(int(request.GET.get('limit', settings.API_PAGE_SIZE)), 1), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise APIError('limit must be an integer.')
+
+    transactions = _filtered(request)
+    if request.GET.get('cursor'):
+        after_date, after_pk = _decode_cursor(request.GET['cursor'])
+        transactions = transactions.filter(Q(date__lt=after_date) | Q(date=after_date, pk__lt=after_pk))
+
+    # The cursor needs the last row's date and id whatever fields were asked for.
+    page = _rows(transactions.order_by('-date', '-id')[:limit + 1], list(dict.fromkeys(fields + ['id', 'date'])))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = _encode_cursor(page[-1]['date'], page[-1]['id'])
+    results = [{name: row[name] for name in fields} for row in page]
+    return _json({'results': results, 'next': next_cursor})
+
+
+def _parse_duplicates(request):
+    mode = request.GET.get('duplicates', 'allow')
+    if mode not in DUPLICATE_MODES:
+        raise APIError(f'duplicates must be one of: {", ".join(DUPLICATE_MODES)}.')
+    return mode
+
+
+def _create(request):
+    data = _parse_body(request)
+    if not isinstance(data, dict):
+        raise APIError('Request body must be a JSON object.')
+    mode = _parse_duplicates(request)
+    form = TransactionForm(data, user=request.user)
+    if not form.is_valid():
+        return _error('Invalid transaction.', errors=form.errors.get_json_data())
+    txn = form.save(commit=False)
+    txn.owner = request.user
+    with transaction.atomic(using=current_shard()):
+        duplicate = find_duplicate(txn) if mode != 'allow' else None
+        if duplicate is None:
+            txn.save()
+    if duplicate is None:
+        return _json(_rows(Transaction.objects.filter(pk=txn.pk), _parse_fields(request))[0], status=201)
+    if mode == 'reject':
+        return _error('Transaction repeats a stored one.', status=409, duplicate_of=duplicate.pk)
+    return _json(_rows(Transaction.objects.filter(pk=duplicate.pk), _parse_fields(request))[0])
+
+
+def _bulk_create(request):
+    data = _parse_body(request)
+    if not isinstance(data, list) or not data:
+        raise APIError('Request body must be a non-empty JSON array of transactions.')
+    if len(data) > settings.API_BULK_MAX_ROWS:
+        raise APIError(f'At most {settings.API_BULK_MAX_ROWS} transactions per request.', status=413)
+    mode = _parse_duplicates(request)
+
+    categories = categories_for(request.user)
+    transactions = []
+    errors = {}
+    for index, row in enumerate(data):
+        if not isinstance(row, dict):
+            errors[index] = {'__all__': [{'message': 'Must be a JSON object.', 'code': 'invalid'}]}
+            continue
+        form = TransactionForm(row, user=request.user, categories=categories)
+        if form.is_valid():
+            txn = form.save(commit=False)
+            txn.owner = request.user
+            transactions.append(txn)
+        else:
+            errors[index] = form.errors.get_json_data()
+    if errors:
+        # All or nothing, so a corrected retry never duplicates rows.
+        return _error('Invalid transactions; nothing was created.', errors=errors)
+
+    with transaction.atomic(using=current_shard()):
+        duplicates = find_duplicates(transactions)
+        if duplicates and mode == 'reject':
+            return _error('Transactions repeat stored ones; nothing was created.', status=409, duplicates=duplicates)
+        if mode == 'skip':
+            skipped = set(duplicates)
+            transactions = [txn for index, txn in enumerate(transactions) if index not in skipped]
+        Transaction.objects.bulk_create(transactions, batch_size=500)
+        apply_transaction_changes(transactions)
+        transactions_bulk_created.send(sender=Transaction, transactions=transactions)
+    return _json({
+        'created': len(transactions),
+        'ids': [txn.pk for txn in transactions],
+        'duplicates': duplicates,
+    }, status=201)
+
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return _error('Idempotency-Key was already used with a different request body.', status=422)
+    response = HttpResponse(stored.response, status=stored.status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _idempotent(request, handler):
+    """Run a write handler, or replay its stored response for a repeated Idempotency-Key."""
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return handler(request)
+    if len(key) > 255:
+        raise APIError('Idempotency-Key must be at most 255 characters.')
+
+    request_hash = hashlib.sha256(request.body).hexdigest()
+    cutoff = timezone.now() - timedelta(seconds=settings.API_IDEMPOTENCY_TTL)
+    stored = IdempotencyKey.objects.filter(owner=request.user, key=key, created_at__gte=cutoff).first()
+    if stored:
+        return _replay(stored, request_hash)
+
+    try:
+        with transaction.atomic(using=current_shard()):
+            response = handler(request)
+            if 200 <= response.status_code < 300:
+                IdempotencyKey.objects.filter(owner=request.user, created_at__lt=cutoff).delete()
+                IdempotencyKey.objects.create(
+                    owner=request.user,
+                    key=key,
+                    request_hash=request_hash,
+                    status_code=response.status_code,
+                    response=response.content.decode(),
+                )
+    except IntegrityError:
+        # A concurrent retry with the same key committed first; this one rolled back.
+        stored = IdempotencyKey.objects.filter(owner=request.user, key=key).first()
+        if stored is None:
+            raise
+        return _replay(stored, request_hash)
+    return response
+
+
+def _api_view(handlers):
+    """View dispatching on HTTP method, turning APIError into a JSON error response."""
+    @gzip_page
+    @api_login_required
+    def view(request, *args, **kwargs):
+        handler = handlers.get(request.method)
+        if handler is None:
+            response = _error('Method not allowed.', status=405)
+            response['Allow'] = ', '.join(handlers)
+            return response
+        try:
+            return handler(request, *args, **kwargs)
+        except APIError as e:
+            return _error(str(e), status=e.status)
+        except IntegrityError:
+            # A token outlives its user until every process has reloaded the
+            # revocation written when the user was deleted.
+            if getattr(request, 'auth', None) and not User.objects.filter(pk=request.user.pk).exists():
+                return _error('Account no longer exists.', status=401)
+            raise
+    return view
+
+
+def _detail(request, pk):
+    rows = _rows(Transaction.objects.filter(owner=request.user, pk=pk), _parse_fields(request))
+    if not rows:
+        return _error('Not found.', status=404)
+    return _json(rows[0])
+
+
+def _delete(request, pk):
+    txn = Transaction.objects.filter(owner=request.user, pk=pk).first()
+    if txn is None:
+        return _error('Not found.', status=404)
+    txn.delete()
+    return HttpResponse(status=204)
+
+
+def _changes(request):
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin():
+        raise APIError('Admin access required.', status=403)
+    try:
+        limit = min(max(int(request.GET.get('limit', settings.API_PAGE_SIZE)), 1), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise APIError('limit must be an integer.')
+    consumer = request.GET.get('consumer', '')
+    if len(consumer) > 100:
+        raise APIError('consumer must be at most 100 characters.')
+
+    try:
+        positions = parse_cursor(request.GET['after']) if 'after' in request.GET else {}
+    except CursorError as e:
+        raise APIError(str(e))
+    if consumer:
+        if 'after' in request.GET:
+            acknowledge(consumer, positions)
+        else:
+            positions = consumer_positions(consumer)
+    changes, positions = read_changes(positions, limit)
+    return _json({'results': [change_as_dict(change) for change in changes], 'next': format_cursor(positions)})
+
+
+transactions_view = _api_view({
+    'GET': _list,
+    'POST': lambda request: _idempotent(request, _create),
+})
+transactions_bulk_view = _api_view({
+    'POST': lambda request: _idempotent(request, _bulk_create),
+})
+transaction_detail_view = _api_view({
+    'GET': _detail,
+    'DELETE': _delete,
+})
+changes_view = _api_view({
+    'GET': _changes,
+})
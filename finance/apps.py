@@ -5,6 +5,5 @@ class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
 
-
-
-
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,150 @@
+"""
+Budget spend tracking.
+
+Budget.spent is adjusted by each expense as it is saved or deleted, so
+reading budget status never scans transactions. Crossing 80% or 100% of
+the limit creates a BudgetAlert.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from fintech_health.sharding import current_shard, each_shard
+
+from .analytics import month_start, next_month_start
+from .currency import base_amounts, converted_amount
+from .models import Budget, BudgetAlert, DailyRollup, Transaction
+
+ALERT_THRESHOLDS = [threshold for threshold, _ in BudgetAlert.THRESHOLD_CHOICES]
+
+
+def check_thresholds(budget, previous_spent):
+    """Create alerts for any threshold crossed going from previous_spent to budget.spent."""
+    for threshold in ALERT_THRESHOLDS:
+        level = budget.limit * threshold / 100
+        if previous_spent < level <= budget.spent:
+            BudgetAlert.objects.get_or_create(
+                budget=budget,
+                threshold=threshold,
+                defaults={'spent': budget.spent},
+            )
+
+
+def record_budget_spend(transactions, sign=1):
+    """Add (sign=1) or remove (sign=-1) expenses from matching budgets."""
+    deltas = defaultdict(Decimal)
+    expenses = [txn for txn in transactions if txn.type == 'EXPENSE' and txn.category_id]
+    for txn, amount in zip(expenses, base_amounts(expenses)):
+        deltas[(txn.owner_id, txn.category_id, month_start(txn.date))] += sign * Decimal(amount)
+
+    with transaction.atomic(using=current_shard()):
+        for (owner_id, category_id, month), delta in deltas.items():
+            budgets = Budget.objects.filter(owner_id=owner_id, category_id=category_id, month=month)
+            if not budgets.update(spent=F('spent') + delta):
+                continue
+            if delta > 0:
+                budget = budgets.get()
+                check_thresholds(budget, budget.spent - delta)
+
+
+def move_budget_spend(rollups, from_category_id, to_category_id=None):
+    """Move the expense totals of rollup rows from one category's budgets to another's."""
+    deltas = defaultdict(Decimal)
+    for row in rollups:
+        if row.type == 'EXPENSE':
+            deltas[(row.owner_id, month_start(row.date))] += row.total
+
+    budgets = {
+        (budget.owner_id, budget.category_id, budget.month): budget
+        for budget in Budget.objects.filter(
+            owner_id__in={owner_id for owner_id, _ in deltas},
+            category_id__in=[from_category_id, to_category_id],
+            month__in={month for _, month in deltas},
+        )
+    }
+    with transaction.atomic(using=current_shard()):
+        for (owner_id, month), delta in deltas.items():
+            source = budgets.get((owner_id, from_category_id, month))
+            if source:
+                Budget.objects.filter(pk=source.pk).update(spent=F('spent') - delta)
+            target = budgets.get((owner_id, to_category_id, month)) if to_category_id else None
+            if target:
+                Budget.objects.filter(pk=target.pk).update(spent=F('spent') + delta)
+                target.refresh_from_db(fields=['spent'])
+                check_thresholds(target, target.spent - delta)
+
+
+def spend_from_rollups(budget):
+    """The budget's spend, summed from the daily rollups."""
+    return DailyRollup.objects.filter(
+        owner_id=budget.owner_id,
+        category_id=budget.category_id,
+        type='EXPENSE',
+        date__gte=budget.month,
+        date__lt=next_month_start(budget.month),
+    ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+
+
+def start_budget(budget):
+    """Save a new budget with its spend so far taken from the rollups."""
+    budget.spent = spend_from_rollups(budget)
+    budget.save()
+    check_thresholds(budget, Decimal('0.00'))
+    return budget
+
+
+def budget_status(user, month=None):
+    """The user's budgets for a month, read from the stored counters."""
+    month = month_start(month or timezone.now().date())
+    return {
+        'month': month,
+        'budgets': list(
+            Budget.objects.filter(owner=user, month=month).select_related('category')
+        ),
+    }
+
+
+def unread_alerts(user, limit=10):
+    return list(
+        BudgetAlert.objects.filter(
+            budget__owner=user, is_read=False
+        ).select_related('budget__category')[:limit]
+    )
+
+
+def rebuild_budget_spend(fix=True):
+    """
+    Recompute every budget's spend from transactions, one grouped query per
+    budgeted month. Returns the budgets whose stored spend was wrong, as
+    (budget, stored, actual) tuples; with fix=True they are corrected.
+    """
+    mismatches = []
+    for _ in each_shard():
+        mismatches.extend(_rebuild_shard_budget_spend(fix))
+    return mismatches
+
+
+def _rebuild_shard_budget_spend(fix):
+    mismatches = []
+    months = Budget.objects.order_by('month').values_list('month', flat=True).distinct()
+    for month in months:
+        actual = {
+            (row['owner_id'], row['category_id']): row['total']
+            for row in Transaction.objects.filter(
+                type='EXPENSE',
+                date__gte=month,
+                date__lt=next_month_start(month),
+            ).order_by().values('owner_id', 'category_id').annotate(total=Sum(converted_amount()))
+        }
+        for budget in Budget.objects.filter(month=month).select_related('category'):
+            spent = Decimal(actual.get((budget.owner_id, budget.category_id)) or 0).quantize(Decimal('0.01'))
+            if budget.spent != spent:
+                mismatches.append((budget, budget.spent, spent))
+                if fix:
+                    previous_spent = budget.spent
+                    budget.spent = spent
+                    budget.save(update_fields=['spent'])
+                    check_thresholds(budget, previous_spent)
+    return mismatches
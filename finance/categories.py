@@ -0,0 +1,74 @@
+"""
+In-memory category lookups for forms and filter dropdowns.
+
+Global categories are shared by every user and change only from the
+backoffice, so each process keeps them in memory together with the version
+stamp it loaded them at. The stamp lives in the shared cache and is replaced
+whenever a global category is saved or deleted; a process that sees a new
+stamp reloads. Each user's own categories are kept in the shared cache and
+dropped when one of them changes. Invalidation waits for the write to commit
+so a concurrent reader cannot cache the old rows again.
+"""
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+GLOBAL_VERSION_KEY = 'categories:global-version'
+USER_CATEGORIES_TIMEOUT = 60 * 60 * 24
+
+CachedCategory = namedtuple('CachedCategory', 'id name type owner_id label')
+
+# (version, categories), replaced as a whole so threads never see a mix.
+_global_categories = (None, [])
+
+
+def _user_key(user_id):
+    return f'categories:user:{user_id}'
+
+
+def _load(queryset, owner_name=None):
+    suffix = f' ({owner_name})' if owner_name else ' (Global)'
+    return [
+        CachedCategory(pk, name, type, owner_id, f'{name}{suffix}')
+        for pk, name, type, owner_id in queryset.values_list('pk', 'name', 'type', 'owner_id')
+    ]
+
+
+def _global(version):
+    global _global_categories
+    loaded_version, categories = _global_categories
+    if version is None or version != loaded_version:
+        if version is None:
+            # Evicted or never set: start a new stamp so every process reloads.
+            version = time.time_ns()
+            cache.add(GLOBAL_VERSION_KEY, version, None)
+            version = cache.get(GLOBAL_VERSION_KEY, version)
+        categories = _load(Category.objects.filter(owner__isnull=True))
+        _global_categories = (version, categories)
+    return categories
+
+
+def categories_for(user, types=None):
+    """The user's own and the global categories, by name, optionally limited to some types."""
+    key = _user_key(user.pk)
+    cached = cache.get_many([GLOBAL_VERSION_KEY, key])
+    own = cached.get(key)
+    if own is None:
+        own = _load(Category.objects.filter(owner_id=user.pk), user.get_username())
+        cache.set(key, own, USER_CATEGORIES_TIMEOUT)
+    categories = sorted(own + _global(cached.get(GLOBAL_VERSION_KEY)), key=lambda c: (c.name, c.id))
+    if types is not None:
+        categories = [category for category in categories if category.type in types]
+    return categories
+
+
+def invalidate_categories(owner_id=None):
+    """Drop cached categories of one user, or the global ones, once the current transaction commits."""
+    if owner_id:
+        transaction.on_commit(lambda: cache.delete(_user_key(owner_id)))
+    else:
+        transaction.on_commit(lambda: cache.set(GLOBAL_VERSION_KEY, time.time_ns(), None))
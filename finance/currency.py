@@ -0,0 +1,223 @@
+"""
+Currency conversion.
+
+Each transaction is stored in its own currency; balances, rollups and
+budgets are kept in the owner's base currency. Rates come from the
+ExchangeRate table, which holds the value of one unit of each currency in
+settings.FX_QUOTE_CURRENCY per day; a conversion on a given date uses the
+latest rate on or before it.
+
+Aggregates convert in the database with converted_cents() (or
+converted_amount() where a Decimal column is needed), which look the rates
+up with correlated subqueries on the (currency, date) index. Write
+paths convert a handful of rows at a time with convert(), whose rate lookups
+are kept in an in-process LRU cache.
+"""
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, DecimalField, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Round
+
+from accounts.models import Profile
+from .models import ExchangeRate
+
+CENTS = Decimal('0.01')
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=10)
+
+
+class MissingRateError(ValueError):
+    """No exchange rate is loaded for a currency on or before a date."""
+
+
+def currency_choices():
+    return [(code, code) for code in settings.CURRENCIES]
+
+
+@lru_cache(maxsize=4096)
+def _cached_rate(currency, day, bucket):
+    if currency == settings.FX_QUOTE_CURRENCY:
+        return Decimal('1')
+    rate = ExchangeRate.objects.filter(
+        currency=currency, date__lte=day
+    ).order_by('-date').values_list('rate', flat=True).first()
+    if rate is None:
+        # Raised rather than returned, so a miss is not cached.
+        raise MissingRateError(f'No {currency} exchange rate on or before {day}')
+    return rate
+
+
+def get_rate(currency, day):
+    """Value of one unit of currency in FX_QUOTE_CURRENCY on day, or None."""
+    # The time bucket expires entries, so rates changed by another process
+    # are picked up within FX_RATE_CACHE_SECONDS. Missing rates are looked
+    # up again every time, so newly loaded ones are used at once.
+    try:
+        return _cached_rate(currency, day, int(time.time() // settings.FX_RATE_CACHE_SECONDS))
+    except MissingRateError:
+        return None
+
+
+def has_rate(currency, day):
+    return get_rate(currency, day) is not None
+
+
+def convert(amount, from_currency, to_currency, day):
+    """Convert amount at day's rates, rounded to cents like converted_amount()."""
+    if from_currency == to_currency:
+        return amount
+    from_rate = get_rate(from_currency, day)
+    to_rate = get_rate(to_currency, day)
+    if from_rate is None or to_rate is None:
+        missing = from_currency if from_rate is None else to_currency
+        raise MissingRateError(f'No {missing} exchange rate on or before {day}')
+    return (Decimal(amount) * from_rate / to_rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def user_base_currency(user):
+    try:
+        return user.profile.base_currency
+    except Profile.DoesNotExist:
+        return settings.DEFAULT_CURRENCY
+
+
+def base_currencies(user_ids):
+    """Map of user id -> base currency."""
+    return dict(
+        Profile.objects.filter(user_id__in=set(user_ids)).values_list('user_id', 'base_currency')
+    )
+
+
+def base_amounts(transactions):
+    """The transactions' amounts in their owners' base currencies, in order."""
+    currencies = base_currencies(txn.owner_id for txn in transactions)
+    return [
+        convert(txn.amount, txn.currency, currencies.get(txn.owner_id, settings.DEFAULT_CURRENCY), txn.date)
+        for txn in transactions
+    ]
+
+
+def _latest_rate(currency):
+    return Subquery(
+        ExchangeRate.objects.filter(
+            currency=currency, date__lte=OuterRef('date')
+        ).order_by('-date').values('rate')[:1],
+        output_field=RATE_FIELD,
+    )
+
+
+def _rate_of(currency_field):
+    """Rate on the row's date of the currency named in one of its fields."""
+    return Case(
+        When(**{currency_field: settings.FX_QUOTE_CURRENCY}, then=Value(Decimal('1'))),
+        default=_latest_rate(OuterRef(currency_field)),
+        output_field=RATE_FIELD,
+    )
+
+
+def _base(base_currency):
+    """(base currency, its rate) expressions for converting into base_currency."""
+    if base_currency is None:
+        return F('owner__profile__base_currency'), _rate_of('owner__profile__base_currency')
+    if base_currency == settings.FX_QUOTE_CURRENCY:
+        return Value(base_currency), Value(Decimal('1'))
+    return Value(base_currency), _latest_rate(base_currency)
+
+
+def converted_amount(base_currency=None):
+    """
+    Expression for a Transaction's amount in base_currency (default: each
+    owner's base currency), converted in the database at the rates for the
+    transaction's date and rounded to cents per row, so sums match the
+    rollups. Rows already in the base currency skip the lookup.
+    """
+    base, base_rate = _base(base_currency)
+    return Case(
+        When(currency=base, then=F('amount')),
+        default=Round(F('amount') * _rate_of('currency') / base_rate, 2),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def converted_cents(base_currency=None):
+    """
+    converted_amount() in whole cents, from the integer amount_cents column.
+    Sums of it are exact integer arithmetic in the database; turn them into
+    amounts with from_cents().
+    """
+    base, base_rate = _base(base_currency)
+    return Case(
+        When(currency=base, then=F('amount_cents')),
+        default=Cast(Round(F('amount_cents') * _rate_of('currency') / base_rate), BigIntegerField()),
+        output_field=BigIntegerField(),
+    )
+
+
+def from_cents(cents):
+    """A sum of cents (None for no rows) as a Decimal amount."""
+    return (Decimal(cents or 0) / 100).quantize(CENTS)
+
+
+def set_base_currency(user, currency):
+    """
+    Switch a user's base currency, recomputing their rollups and budget
+    spend in it. Budget limits are converted at today's rate.
+    """
+    from django.utils import timezone
+    from fintech_health.routers import pin_to_primary
+    from fintech_health.sharding import shard_for_user, use_shard
+    from .budgets import check_thresholds, spend_from_rollups
+    from .models import Budget
+    from .rollups import rebuild_rollups
+    from .signals import base_currency_changed
+    from .utils import bump_data_version
+
+    profile = user.profile
+    previous = profile.base_currency
+    if currency == previous:
+        return
+    today = timezone.now().date()
+    convert(Decimal('1'), previous, currency, today)  # fail before changing anything
+
+    shard = shard_for_user(user.id)
+    with use_shard(shard), transaction.atomic(using=shard):
+        profile.base_currency = currency
+        profile.save(update_fields=['base_currency'])
+        rebuild_rollups(user.id)
+        for budget in Budget.objects.filter(owner=user):
+            budget.limit = convert(budget.limit, previous, currency, today)
+            budget.spent = spend_from_rollups(budget)
+            budget.save(update_fields=['limit', 'spent'])
+            check_thresholds(budget, Decimal('0.00'))
+        base_currency_changed.send(sender=Profile, user_id=user.id)
+    bump_data_version(user.id)
+    pin_to_primary(user.id)
+
+
+def load_rates(rows):
+    """
+    Insert or update (currency, date, rate) rows. Rows for the quote
+    currency are ignored; its rate is always 1. Returns the number stored.
+    """
+    rates = [
+        ExchangeRate(currency=currency, date=day, rate=rate)
+        for currency, day, rate in rows
+        if currency != settings.FX_QUOTE_CURRENCY
+    ]
+    # Every shard keeps a copy: conversions look rates up next to the transactions.
+    for alias in settings.SHARD_DATABASES:
+        with transaction.atomic(using=alias):
+            ExchangeRate.objects.using(alias).bulk_create(
+                rates,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['currency', 'date'],
+                update_fields=['rate'],
+            )
+    # Only this process's cache; other processes see changed rates once
+    # their time bucket expires.
+    _cached_rate.cache_clear()
+    return len(rates)
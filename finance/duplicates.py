@@ -0,0 +1,50 @@
+"""
+Likely duplicate transactions.
+
+Every transaction stores a fingerprint (models.transaction_fingerprint) of
+its owner, type, date, amount, currency and note, ignoring case and spacing
+in the note, with an index on it. A form submitted twice or a bank export
+imported over an overlapping period gives rows whose fingerprint is
+already stored, so each is found with one indexed lookup, or one IN lookup
+per chunk of an import, instead of by comparing fields.
+"""
+from collections import Counter
+
+from .models import Transaction
+
+# Fingerprints per IN lookup, well under SQLite's limit on query parameters.
+LOOKUP_CHUNK_SIZE = 500
+
+
+def stored_fingerprints(fingerprints):
+    """How many transactions on the current shard have each fingerprint."""
+    fingerprints = list(set(fingerprints))
+    counts = Counter()
+    for start in range(0, len(fingerprints), LOOKUP_CHUNK_SIZE):
+        counts.update(
+            Transaction.objects.filter(fingerprint__in=fingerprints[start:start + LOOKUP_CHUNK_SIZE])
+            .order_by().values_list('fingerprint', flat=True)
+        )
+    return counts
+
+
+def find_duplicate(txn):
+    """The oldest stored transaction an unsaved one repeats, or None."""
+    return Transaction.objects.filter(fingerprint=txn.get_fingerprint()).order_by('pk').first()
+
+
+def find_duplicates(transactions):
+    """
+    Indices of the unsaved transactions that repeat stored ones. Each
+    stored row matches one repeat, so an import overlapping an earlier one
+    matches exactly the overlap, while identical rows that are new (two
+    coffees on the same day) are not matched.
+    """
+    fingerprints = [txn.get_fingerprint() for txn in transactions]
+    unmatched = stored_fingerprints(fingerprints)
+    duplicates = []
+    for index, fingerprint in enumerate(fingerprints):
+        if unmatched[fingerprint]:
+            unmatched[fingerprint] -= 1
+            duplicates.append(index)
+    return duplicates
@@ -0,0 +1,172 @@
+"""
+Balance and health score projections.
+
+The last HISTORY_DAYS of daily income and expense are read from DailyRollup
+in one grouped query. Occurrences of the user's recurring rules are taken
+out of that history, and the remaining day-to-day activity is projected
+forward at a blend of its 30-day and full-history moving averages. The
+recurring rules are then replayed on their actual schedule, so a salary
+lands on its pay day rather than being smeared across the month.
+
+Window sums over the daily series use prefix sums, so each horizon costs
+O(1) once the series is built. Results are cached per user per day, keyed
+on the user's data version so new transactions show up immediately.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import Profile
+from .analytics import CENTS
+from .currency import MissingRateError, convert, converted_amount, user_base_currency
+from .models import DailyRollup, RecurringRule, Transaction
+from .recurring import next_occurrence
+from .utils import get_health_status, score_from_totals
+
+HORIZONS = (30, 90)
+HISTORY_DAYS = 90
+SHORT_WINDOW = 30
+SCORE_WINDOW = 30
+FORECAST_CACHE_SECONDS = 60 * 60 * 24
+
+ZERO = Decimal('0.00')
+
+
+def prefix_sums(series):
+    return list(accumulate(series, initial=ZERO))
+
+
+def window_sum(prefix, start, end):
+    """Sum of series[start:end] from its prefix sums."""
+    return prefix[end] - prefix[start]
+
+
+def _daily_series(rows, start, days):
+    """Income and expense lists indexed by day offset from start."""
+    income = [ZERO] * days
+    expense = [ZERO] * days
+    for row in rows:
+        offset = (row['date'] - start).days
+        if 0 <= offset < days:
+            series = income if row['type'] == 'INCOME' else expense
+            series[offset] += row['total']
+    return income, expense
+
+
+def _moving_average(series):
+    """Blend of the short-window and full-span daily averages of a series."""
+    prefix = prefix_sums(series)
+    span = len(series)
+    short = min(SHORT_WINDOW, span)
+    return (window_sum(prefix, span - short, span) / short + prefix[span] / span) / 2
+
+
+def _recurring_schedule(rules, today, days, base_currency):
+    """Income and expense lists of scheduled amounts for the next days, day 1 first."""
+    income = [ZERO] * days
+    expense = [ZERO] * days
+    last_day = today + timedelta(days=days)
+    for rule in rules:
+        try:
+            # Future rates are unknown, so occurrences use today's.
+            amount = convert(rule.amount, rule.currency, base_currency, today)
+        except MissingRateError:
+            continue
+        series = income if rule.type == 'INCOME' else expense
+        day = rule.next_date
+        end = min(last_day, rule.end_date) if rule.end_date else last_day
+        while day <= end:
+            # Occurrences the scheduler has not caught up on yet land tomorrow.
+            series[max((day - today).days, 1) - 1] += amount
+            day = next_occurrence(rule, day)
+    return income, expense
+
+
+def build_forecast(user, today=None):
+    """Projected balance, totals and health score at each of HORIZONS days out."""
+    today = today or timezone.now().date()
+    base_currency = user_base_currency(user)
+    days = max(HORIZONS)
+    history_start = today - timedelta(days=HISTORY_DAYS - 1)
+
+    balance = ZERO
+    for row in DailyRollup.objects.filter(owner=user).values('type').annotate(total=Sum('total')).order_by():
+        balance += row['total'] if row['type'] == 'INCOME' else -row['total']
+
+    history = DailyRollup.objects.filter(
+        owner=user, date__gte=history_start, date__lte=today
+    ).values('date', 'type').annotate(total=Sum('total')).order_by()
+    income, expense = _daily_series(history, history_start, HISTORY_DAYS)
+
+    rules = list(RecurringRule.objects.filter(owner=user))
+    recurring_history = Transaction.objects.filter(
+        recurring_rule_id__in=[rule.pk for rule in rules],
+        date__gte=history_start,
+        date__lte=today,
+    ).values('date', 'type').annotate(total=Sum(converted_amount(base_currency))).order_by() if rules else []
+    recurring_income, recurring_expense = _daily_series(recurring_history, history_start, HISTORY_DAYS)
+
+    # Only average over the days since the user's first activity.
+    first_day = next(
+        (offset for offset in range(HISTORY_DAYS) if income[offset] or expense[offset]),
+        HISTORY_DAYS,
+    )
+    if first_day < HISTORY_DAYS:
+        daily_income = _moving_average([
+            total - recurring for total, recurring in zip(income[first_day:], recurring_income[first_day:])
+        ])
+        daily_expense = _moving_average([
+            total - recurring for total, recurring in zip(expense[first_day:], recurring_expense[first_day:])
+        ])
+    else:
+        daily_income = daily_expense = ZERO
+
+    scheduled_income, scheduled_expense = _recurring_schedule(
+        [rule for rule in rules if rule.is_active], today, days, base_currency
+    )
+    income_prefix = prefix_sums(daily_income + scheduled for scheduled in scheduled_income)
+    expense_prefix = prefix_sums(daily_expense + scheduled for scheduled in scheduled_expense)
+
+    horizons = []
+    for horizon in HORIZONS:
+        projected_income = window_sum(income_prefix, 0, horizon)
+        projected_expense = window_sum(expense_prefix, 0, horizon)
+        score = score_from_totals(
+            window_sum(income_prefix, horizon - SCORE_WINDOW, horizon),
+            window_sum(expense_prefix, horizon - SCORE_WINDOW, horizon),
+        )
+        health_status, health_class = get_health_status(score)
+        horizons.append({
+            'days': horizon,
+            'date': today + timedelta(days=horizon),
+            'income': projected_income.quantize(CENTS),
+            'expense': projected_expense.quantize(CENTS),
+            'balance': (balance + projected_income - projected_expense).quantize(CENTS),
+            'health_score': score,
+            'health_status': health_status,
+            'health_class': health_class,
+        })
+
+    return {
+        'balance': balance,
+        'daily_income': daily_income.quantize(CENTS),
+        'daily_expense': daily_expense.quantize(CENTS),
+        'recurring_count': sum(1 for rule in rules if rule.is_active),
+        'horizons': horizons,
+    }
+
+
+def get_forecast(user):
+    """build_forecast(), cached per user per day until their data changes."""
+    today = timezone.now().date()
+    version = Profile.objects.filter(user=user).values_list('data_version', flat=True).first()
+    key = f'forecast:{user.pk}:{today}:{version}'
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = build_forecast(user, today)
+        cache.set(key, forecast, FORECAST_CACHE_SECONDS)
+    return forecast
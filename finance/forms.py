@@ -1,13 +1,70 @@
 from django import forms
-from django.db import models
 from datetime import date
-from .models import Transaction, Category
+from .categories import categories_for
+from .currency import currency_choices, has_rate, user_base_currency
+from .models import Budget, Category, RecurringRule, Transaction
 
 
-class TransactionForm(forms.ModelForm):
+class CategoryChoiceField(forms.ModelChoiceField):
+    """
+    Category select that, once given a list from finance.categories, renders
+    and validates against it without querying the database.
+    """
+    categories = None
+
+    def set_categories(self, categories):
+        self.categories = categories
+        self.widget.choices = self.choices
+
+    def _get_choices(self):
+        if self.categories is None:
+            return super()._get_choices()
+        choices = [(category.id, category.label) for category in self.categories]
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        return choices
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def to_python(self, value):
+        if self.categories is None or value in self.empty_values:
+            return super().to_python(value)
+        for category in self.categories:
+            if str(category.id) == str(value):
+                return Category(id=category.id, name=category.name, type=category.type, owner_id=category.owner_id)
+        raise forms.ValidationError(
+            self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+        )
+
+
+class CachedCategoryFormMixin:
+    """
+    Skips the model's own foreign-key check of `category` once the field has
+    validated it against the cached list, saving a query per submission.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.fields['category'].categories is not None:
+            exclude.add('category')
+        return exclude
+
+
+def validate_currency(form, currency, day):
+    """Add an error unless currency can be converted to the form user's base currency on day."""
+    base_currency = user_base_currency(form.user)
+    if currency and day and currency != base_currency:
+        for code in (currency, base_currency):
+            if not has_rate(code, day):
+                form.add_error('currency', f'No {code} exchange rate is available for {day}.')
+                return
+
+
+class TransactionForm(CachedCategoryFormMixin, forms.ModelForm):
     class Meta:
         model = Transaction
-        fields = ['type', 'category', 'amount', 'date', 'note']
+        fields = ['type', 'category', 'amount', 'currency', 'date', 'note']
+        field_classes = {'category': CategoryChoiceField}
         widgets = {
             'type': forms.Select(attrs={
                 'class': 'form-control',
@@ -21,6 +78,10 @@ class TransactionForm(forms.ModelForm):
                 'min': '0.01',
                 'placeholder': '0.00'
             }),
+            'currency': forms.Select(attrs={
+                'class': 'form-select',
+                'style': 'max-width: 7rem;'
+            }),
             'date': forms.DateInput(attrs={
                 'class': 'form-control',
                 'type': 'date'
@@ -34,13 +95,17 @@ class TransactionForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
+        # Callers validating many rows pass categories_for(user) once.
+        categories = kwargs.pop('categories', None)
         super().__init__(*args, **kwargs)
+        self.user = user
+        self.fields['currency'].widget.choices = currency_choices()
         
         if user:
             # Get user's categories and global categories
-            self.fields['category'].queryset = Category.objects.filter(
-                models.Q(owner=user) | models.Q(owner__isnull=True)
-            ).order_by('name')
+            self.fields['category'].set_categories(categories if categories is not None else categories_for(user))
+            if not self.instance.pk and not self.data:
+                self.initial['currency'] = user_base_currency(user)
         
         # Set default date to today if not provided
         if not self.initial.get('date') and not self.data:
@@ -51,6 +116,18 @@ class TransactionForm(forms.ModelForm):
         if amount and amount <= 0:
             raise forms.ValidationError('Amount must be greater than zero.')
         return amount
+    
+    def clean_currency(self):
+        currency = self.cleaned_data.get('currency')
+        if currency not in dict(currency_choices()):
+            raise forms.ValidationError('Select a supported currency.')
+        return currency
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.user:
+            validate_currency(self, cleaned_data.get('currency'), cleaned_data.get('date'))
+        return cleaned_data
 
 
 class CategoryForm(forms.ModelForm):
@@ -67,3 +144,164 @@ class CategoryForm(forms.ModelForm):
             }),
         }
 
+
+class CategoryDeleteForm(forms.Form):
+    """Where a deleted category's transactions go."""
+    target = CategoryChoiceField(
+        queryset=Category.objects.none(),
+        required=False,
+        empty_label='Uncategorized',
+        label='Move transactions to',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    
+    def __init__(self, *args, **kwargs):
+        self.category = kwargs.pop('category')
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['target'].set_categories([
+            category for category in categories_for(user) if category.id != self.category.pk
+        ])
+
+
+class BudgetForm(CachedCategoryFormMixin, forms.ModelForm):
+    month = forms.DateField(
+        input_formats=['%Y-%m'],
+        widget=forms.DateInput(format='%Y-%m', attrs={
+            'class': 'form-control',
+            'type': 'month'
+        })
+    )
+    
+    class Meta:
+        model = Budget
+        fields = ['category', 'month', 'limit']
+        field_classes = {'category': CategoryChoiceField}
+        widgets = {
+            'category': forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            'limit': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'min': '0.01',
+                'placeholder': '0.00'
+            }),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        
+        # Only expense categories can be budgeted
+        self.fields['category'].set_categories(categories_for(self.user, types=('EXPENSE', 'BOTH')))
+        
+        if not self.initial.get('month') and not self.data:
+            self.initial['month'] = date.today().replace(day=1)
+    
+    def clean_month(self):
+        return self.cleaned_data['month'].replace(day=1)
+    
+    def clean_limit(self):
+        limit = self.cleaned_data.get('limit')
+        if limit is not None and limit <= 0:
+            raise forms.ValidationError('Limit must be greater than zero.')
+        return limit
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        category = cleaned_data.get('category')
+        month = cleaned_data.get('month')
+        if category and month and Budget.objects.filter(
+            owner=self.user, category=category, month=month
+        ).exists():
+            raise forms.ValidationError('You already have a budget for this category and month.')
+        return cleaned_data
+
+
+class RecurringRuleForm(CachedCategoryFormMixin, forms.ModelForm):
+    class Meta:
+        model = RecurringRule
+        fields = ['type', 'category', 'amount', 'currency', 'frequency', 'interval_days', 'start_date', 'end_date', 'note']
+        field_classes = {'category': CategoryChoiceField}
+        widgets = {
+            'type': forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            'category': forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            'amount': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'min': '0.01',
+                'placeholder': '0.00'
+            }),
+            'currency': forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            'frequency': forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            'interval_days': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': '1',
+                'placeholder': 'Only for "Every N days"'
+            }),
+            'start_date': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }),
+            'end_date': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }),
+            'note': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 3,
+                'placeholder': 'Optional note...'
+            }),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.fields['currency'].widget.choices = currency_choices()
+        
+        if user:
+            self.fields['category'].set_categories(categories_for(user))
+            if not self.data:
+                self.initial['currency'] = user_base_currency(user)
+        
+        if not self.initial.get('start_date') and not self.data:
+            self.initial['start_date'] = date.today()
+    
+    def clean_amount(self):
+        amount = self.cleaned_data.get('amount')
+        if amount and amount <= 0:
+            raise forms.ValidationError('Amount must be greater than zero.')
+        return amount
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        frequency = cleaned_data.get('frequency')
+        interval_days = cleaned_data.get('interval_days')
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        
+        if frequency == 'CUSTOM' and not interval_days:
+            self.add_error('interval_days', 'Enter the number of days between occurrences.')
+        elif frequency != 'CUSTOM':
+            cleaned_data['interval_days'] = None
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', 'End date must be on or after the start date.')
+        if self.user:
+            validate_currency(self, cleaned_data.get('currency'), start_date)
+        return cleaned_data
+    
+    def clean_currency(self):
+        currency = self.cleaned_data.get('currency')
+        if currency not in dict(currency_choices()):
+            raise forms.ValidationError('Select a supported currency.')
+        return currency
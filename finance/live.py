@@ -0,0 +1,256 @@
+"""
+Live dashboard updates over Server-Sent Events (ASGI only).
+
+Each process runs one LiveHub. While any client is connected, a single task
+polls the transaction outbox (finance.outbox) and turns each batch of
+changes into events:
+
+- `totals` for every affected user with a connected dashboard: their
+  balance and today's income, expense and net, computed once per batch and
+  sent to all of that user's connections;
+- `counters` and `recent` for the admins' monitoring pages: transaction
+  counts kept up to date from the changes themselves, recounted every
+  LIVE_COUNTER_REFRESH seconds, and the newly created transactions, read
+  once per batch.
+
+So the database work depends on how many users wrote, not on how many
+clients are listening. Events carry current values rather than increments,
+and the latest one for a stream is replayed to clients that connect later,
+so a client that misses an event or reconnects catches up with the next.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.defaultfilters import floatformat
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from fintech_health.sharding import fan_out, shard_for_user, use_shard
+
+from .models import Transaction, TransactionChange
+from .outbox import read_changes
+from .utils import calculate_balance, get_period_totals, run_concurrently
+
+# Subscription key of the admins' monitoring stream; users subscribe by id.
+ADMINS = 'admins'
+
+COUNTER_WINDOWS = {'week': timedelta(days=7), 'month': timedelta(days=30)}
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))}\n\n'
+
+
+def _in_thread(func, *args):
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def _run_in_thread(func, *args):
+    return await sync_to_async(_in_thread, thread_sensitive=False)(func, *args)
+
+
+def _latest_position():
+    return TransactionChange.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def latest_positions():
+    """Outbox positions after every change committed so far."""
+    return {
+        alias: position
+        for alias, position in zip(settings.SHARD_DATABASES, fan_out(_latest_position))
+        if position
+    }
+
+
+def user_totals(user_id):
+    """Balance and today's totals for a user's dashboard, formatted as it shows them."""
+    with use_shard(shard_for_user(user_id)):
+        user = User.objects.select_related('profile').filter(pk=user_id).first()
+        if user is None:
+            return None
+        today = get_period_totals(user, timezone.now().date())
+        return {
+            'balance': floatformat(calculate_balance(user), 2),
+            'today': {name: floatformat(value, 2) for name, value in today.items()},
+        }
+
+
+def _count_since(since, today):
+    transactions = Transaction.objects.all()
+    return (
+        transactions.count(),
+        transactions.filter(created_at__date=today).count(),
+        *(transactions.filter(created_at__gte=since[name]).count() for name in COUNTER_WINDOWS),
+    )
+
+
+def transaction_counters():
+    """The monitoring page's transaction counts: total, today, week and month."""
+    now = timezone.now()
+    since = {name: now - window for name, window in COUNTER_WINDOWS.items()}
+    counts = [sum(column) for column in zip(*fan_out(_count_since, since, timezone.localdate(now)))]
+    return dict(zip(['total', 'today', *COUNTER_WINDOWS], counts))
+
+
+def _created(ids):
+    return list(Transaction.objects.select_related('owner', 'category').filter(pk__in=ids))
+
+
+def recent_rows(ids):
+    """Rows for the monitoring page's recent transactions table, newest first."""
+    transactions = [txn for rows in fan_out(_created, ids) for txn in rows]
+    transactions.sort(key=lambda txn: txn.created_at, reverse=True)
+    return [
+        {
+            'date': txn.date,
+            'user': txn.owner.username,
+            'type': txn.type,
+            'type_display': txn.get_type_display(),
+            'category': txn.category.name if txn.category else None,
+            'amount': floatformat(txn.amount, 2),
+            'currency': txn.currency,
+            'note': txn.note,
+        }
+        for txn in transactions
+    ]
+
+
+class LiveHub:
+    """In-process fan-out of outbox changes to the connected SSE clients."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        # Last message sent on each stream, replayed to new subscribers.
+        self.latest = {}
+        self.counters = None
+        self.counted_at = None
+        self._task = None
+
+    def subscribe(self, key):
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        for message in self.latest.get(key, {}).values():
+            queue.put_nowait(message)
+        self.subscribers[key].add(queue)
+        self.ensure_running()
+        return queue
+
+    def ensure_running(self):
+        """Start the polling task, or restart it after an error."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def unsubscribe(self, key, queue):
+        self.subscribers[key].discard(queue)
+        if not self.subscribers[key]:
+            del self.subscribers[key]
+            self.latest.pop(key, None)
+            if key == ADMINS:
+                self.counters = None
+
+    def publish(self, key, event, data):
+        message = format_event(event, data)
+        if event != 'recent':
+            self.latest.setdefault(key, {})[event] = message
+        for queue in self.subscribers.get(key, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client skips this update; the next event carries current values.
+                pass
+
+    async def _run(self):
+        positions = await _run_in_thread(latest_positions)
+        full = False
+        while self.subscribers:
+            if not full:
+                await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+            recounted = ADMINS in self.subscribers and (
+                self.counters is None
+                or timezone.now() - self.counted_at > timedelta(seconds=settings.LIVE_COUNTER_REFRESH)
+            )
+            if recounted:
+                self.counted_at = timezone.now()
+                self.counters = await _run_in_thread(transaction_counters)
+            changes, positions = await _run_in_thread(read_changes, positions, settings.LIVE_BATCH_SIZE)
+            full = len(changes) == settings.LIVE_BATCH_SIZE
+            # A fresh count already includes the changes committed before it.
+            if changes or recounted:
+                await self._dispatch(changes, count=not recounted)
+
+    async def _dispatch(self, changes, count=True):
+        owners = sorted({change.owner_id for change in changes if change.owner_id in self.subscribers})
+        results = await run_concurrently(*((user_totals, owner_id) for owner_id in owners))
+        for owner_id, totals in zip(owners, results):
+            if totals is not None:
+                self.publish(owner_id, 'totals', totals)
+
+        if ADMINS not in self.subscribers or self.counters is None:
+            return
+        if count:
+            self._count(changes)
+        self.publish(ADMINS, 'counters', self.counters)
+        created = [change.transaction_id for change in changes if change.operation == 'CREATE']
+        if created:
+            rows = await _run_in_thread(recent_rows, created)
+            if rows:
+                self.publish(ADMINS, 'recent', rows)
+
+    def _count(self, changes):
+        now = timezone.now()
+        for change in changes:
+            sign = {'CREATE': 1, 'DELETE': -1}.get(change.operation)
+            if sign is None:
+                continue
+            created_at = parse_datetime(json.loads(change.data)['created_at'])
+            self.counters['total'] += sign
+            if timezone.localdate(created_at) == timezone.localdate(now):
+                self.counters['today'] += sign
+            for name, window in COUNTER_WINDOWS.items():
+                if created_at >= now - window:
+                    self.counters[name] += sign
+
+
+hub = LiveHub()
+
+
+async def event_stream(key):
+    """SSE body for one client: the stream's events, with keep-alives, for LIVE_STREAM_TIMEOUT seconds."""
+    loop = asyncio.get_running_loop()
+    queue = hub.subscribe(key)
+    try:
+        # Browsers reconnect this long after the stream ends.
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+        deadline = loop.time() + settings.LIVE_STREAM_TIMEOUT
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                yield await asyncio.wait_for(queue.get(), min(remaining, settings.LIVE_KEEPALIVE))
+            except asyncio.TimeoutError:
+                hub.ensure_running()
+                yield ': keep-alive\n\n'
+    finally:
+        hub.unsubscribe(key, queue)
+
+
+def live_response(request, key):
+    """The event stream for key, or 204 when not served over ASGI."""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole stream; 204 tells
+        # EventSource not to reconnect.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(event_stream(key), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,115 @@
+import random
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from finance.currency import converted_amount, converted_cents, from_cents, user_base_currency
+from finance.models import Transaction
+from finance.utils import totals_in_cents
+from fintech_health.sharding import shard_for_user, use_shard
+
+BENCH_USERNAME = 'bench-amounts'
+
+
+class Command(BaseCommand):
+    help = 'Compares Decimal and integer-cents aggregates and materialization over a synthetic table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best is reported')
+
+    def handle(self, *args, **options):
+        # Everything is rolled back at the end, so the synthetic rows never
+        # reach the derived tables. The write lock of every shard is held
+        # throughout: run this against a copy of the database.
+        with ExitStack() as stack:
+            for alias in settings.SHARD_DATABASES:
+                stack.enter_context(transaction.atomic(using=alias))
+            user = User.objects.create(username=BENCH_USERNAME)
+            with use_shard(shard_for_user(user.id)):
+                self._insert(user, options['rows'])
+                self._run(user, options['repeat'])
+            for alias in settings.SHARD_DATABASES:
+                transaction.set_rollback(True, using=alias)
+
+    def _insert(self, user, rows):
+        rng = random.Random(0)
+        currency = user_base_currency(user)
+        start = date.today() - timedelta(days=3 * 365)
+        started = time.perf_counter()
+        batch = []
+        for i in range(rows):
+            batch.append(Transaction(
+                owner=user,
+                type='INCOME' if i % 5 == 0 else 'EXPENSE',
+                amount=Decimal(rng.randint(1, 500_000)) / 100,
+                currency=currency,
+                date=start + timedelta(days=rng.randrange(3 * 365)),
+            ))
+            if len(batch) == 10_000:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+        self.stdout.write(f'Inserted {rows} rows in {time.perf_counter() - started:.1f}s')
+
+    def _best(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000, result
+
+    def _compare(self, label, decimal_func, cents_func, repeat):
+        decimal_ms, decimal_result = self._best(decimal_func, repeat)
+        cents_ms, cents_result = self._best(cents_func, repeat)
+        match = 'match' if decimal_result == cents_result else f'MISMATCH {decimal_result} != {cents_result}'
+        self.stdout.write(
+            f'{label:>22}: Decimal {decimal_ms:9.1f} ms, cents {cents_ms:9.1f} ms '
+            f'({decimal_ms / cents_ms:.1f}x), results {match}'
+        )
+
+    def _run(self, user, repeat):
+        currency = user_base_currency(user)
+        transactions = Transaction.objects.filter(owner=user)
+
+        def decimal_totals():
+            income = transactions.filter(type='INCOME').aggregate(
+                total=Sum(converted_amount(currency))
+            )['total'] or Decimal('0.00')
+            expense = transactions.filter(type='EXPENSE').aggregate(
+                total=Sum(converted_amount(currency))
+            )['total'] or Decimal('0.00')
+            return income.quantize(Decimal('0.01')), expense.quantize(Decimal('0.01'))
+
+        def cents_totals():
+            income, expense = totals_in_cents(transactions, currency)
+            return from_cents(income), from_cents(expense)
+
+        def monthly(expression, to_float):
+            rows = transactions.annotate(period=TruncMonth('date')).values('period', 'type').annotate(
+                total=Sum(expression)
+            ).order_by('period')
+            return [(row['period'], row['type'], round(to_float(row['total']), 2)) for row in rows]
+
+        def decimal_materialize():
+            return sum(transactions.values_list('amount', flat=True))
+
+        def cents_materialize():
+            return from_cents(sum(transactions.values_list('amount_cents', flat=True)))
+
+        self._compare('income/expense totals', decimal_totals, cents_totals, repeat)
+        self._compare(
+            'monthly chart series',
+            lambda: monthly(converted_amount(currency), float),
+            lambda: monthly(converted_cents(currency), lambda cents: cents / 100),
+            repeat,
+        )
+        self._compare('load and sum amounts', decimal_materialize, cents_materialize, repeat)
@@ -0,0 +1,91 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Compares dashboard latency of the sync (WSGI) and async (ASGI) views under concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='user', help='Username to load the dashboard as')
+        parser.add_argument('--admin', action='store_true', help='Benchmark the backoffice dashboard instead')
+        parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated concurrency levels')
+        parser.add_argument('--requests', type=int, default=64, help='Requests per concurrency level')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        if options['admin']:
+            sync_url, async_url = '/backoffice/', '/backoffice/async/'
+        else:
+            sync_url, async_url = '/app/dashboard/', '/app/dashboard/async/'
+        total = options['requests']
+
+        def run_wsgi(concurrency):
+            latencies = []
+            lock = threading.Lock()
+
+            def worker(count):
+                client = Client()
+                client.force_login(user)
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.get(sync_url)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if response.status_code != 200:
+                        raise CommandError(f'{sync_url} returned {response.status_code}')
+                    with lock:
+                        latencies.append(elapsed)
+
+            threads = [threading.Thread(target=worker, args=(total // concurrency,)) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return latencies
+
+        def run_asgi(concurrency):
+            clients = []
+            for _ in range(concurrency):
+                client = AsyncClient()
+                client.force_login(user)
+                clients.append(client)
+
+            async def worker(client, count):
+                latencies = []
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = await client.get(async_url)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f'{async_url} returned {response.status_code}')
+                return latencies
+
+            async def main():
+                results = await asyncio.gather(*(worker(client, total // concurrency) for client in clients))
+                return [latency for latencies in results for latency in latencies]
+
+            return asyncio.run(main())
+
+        # Measure the aggregates, not the fragment cache.
+        with override_settings(ALLOWED_HOSTS=['testserver'], DASHBOARD_FRAGMENT_TIMEOUT=0):
+            for concurrency in [int(level) for level in options['concurrency'].split(',')]:
+                for label, runner in (('WSGI', run_wsgi), ('ASGI', run_asgi)):
+                    p50, p99 = _percentiles(runner(concurrency))
+                    self.stdout.write(
+                        f'{label} concurrency={concurrency:<3} p50 {p50:7.1f} ms   p99 {p99:7.1f} ms'
+                    )
@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from finance.views import dashboard_view
+from fintech_health.sharding import shard_for_user, use_shard
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks dashboard render time with cold and warm fragment caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='user', help='Username to render the dashboard for')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('profile').get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        factory = RequestFactory()
+        iterations = options['iterations']
+
+        def render_once():
+            request = factory.get('/app/dashboard/')
+            request.user = user
+            with use_shard(shard_for_user(user.id)), CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = dashboard_view(request)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f'Dashboard returned {response.status_code}')
+            return elapsed, len(queries)
+
+        # Warm up the template loader before timing anything.
+        render_once()
+
+        for label, clear in (('cold fragments', True), ('warm fragments', False)):
+            timings = []
+            query_counts = []
+            for _ in range(iterations):
+                if clear:
+                    cache.clear()
+                elapsed, queries = render_once()
+                timings.append(elapsed * 1000)
+                query_counts.append(queries)
+            timings.sort()
+            self.stdout.write(
+                f'{label:>15}: mean {statistics.mean(timings):.2f} ms, '
+                f'p50 {timings[len(timings) // 2]:.2f} ms, '
+                f'p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms, '
+                f'{statistics.mean(query_counts):.0f} queries/render'
+            )
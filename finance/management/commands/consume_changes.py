@@ -0,0 +1,44 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from finance.outbox import acknowledge, change_as_dict, compact_changes, consumer_positions, read_changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints transaction changes after the consumer\'s acknowledged position as JSON lines, '
+        'acknowledging each batch and compacting the changes every consumer is past'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', required=True, help='Name the position is stored under')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Changes read per batch')
+        parser.add_argument('--follow', action='store_true', help='Keep polling for new changes')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --follow')
+
+    def handle(self, *args, **options):
+        name = options['consumer']
+        if len(name) > 100:
+            raise CommandError('--consumer must be at most 100 characters')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        positions = consumer_positions(name)
+        consumed = 0
+        while True:
+            changes, positions = read_changes(positions, options['batch_size'])
+            for change in changes:
+                self.stdout.write(json.dumps(change_as_dict(change), cls=DjangoJSONEncoder, separators=(',', ':')))
+            if changes:
+                acknowledge(name, positions)
+                consumed += len(changes)
+                continue
+            compacted = compact_changes()
+            if not options['follow']:
+                break
+            if compacted:
+                self.stderr.write(f'Compacted {compacted} changes')
+            time.sleep(options['interval'])
+        self.stderr.write(self.style.SUCCESS(f'Consumed {consumed} changes, compacted {compacted}'))
@@ -0,0 +1,36 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from finance.currency import load_rates
+
+
+class Command(BaseCommand):
+    help = 'Loads exchange rates from a CSV file with date,currency,rate columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file; rate is the value of one unit in FX_QUOTE_CURRENCY')
+
+    def handle(self, *args, **options):
+        rows = []
+        try:
+            with open(options['path'], newline='') as f:
+                for line, record in enumerate(csv.DictReader(f), start=2):
+                    try:
+                        day = date.fromisoformat(record['date'])
+                        currency = record['currency'].strip().upper()
+                        rate = Decimal(record['rate'])
+                    except (KeyError, TypeError, ValueError, InvalidOperation):
+                        raise CommandError(f'Line {line}: expected date,currency,rate')
+                    if currency not in settings.CURRENCIES:
+                        raise CommandError(f'Line {line}: unsupported currency {currency}')
+                    if rate <= 0:
+                        raise CommandError(f'Line {line}: rate must be positive')
+                    rows.append((currency, day, rate))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        stored = load_rates(rows)
+        self.stdout.write(self.style.SUCCESS(f'Loaded {stored} exchange rates'))
@@ -0,0 +1,135 @@
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.test.utils import override_settings
+from finance.currency import user_base_currency
+
+TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+class QueryCounter:
+    """Database execute wrapper counting reads and writes per table."""
+
+    def __init__(self):
+        self.reads = Counter()
+        self.writes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        match = TABLE_RE.search(sql)
+        if match:
+            verb = sql.lstrip().split(None, 1)[0].upper()
+            (self.reads if verb == 'SELECT' else self.writes)[match.group(1)] += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Runs concurrent create-transaction/dashboard requests and reports throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run for')
+        parser.add_argument('--users', type=int, default=1, help='Spread the threads over this many users (and their shards)')
+        parser.add_argument('--keep', action='store_true', help='Keep the load-test transactions afterwards')
+
+    def handle(self, *args, **options):
+        accounts = []
+        for index in range(options['users']):
+            suffix = str(index + 1) if index else ''
+            user, created = User.objects.get_or_create(
+                username=f'loadtest{suffix}',
+                defaults={'email': f'loadtest{suffix}@example.com'}
+            )
+            category, _ = user.categories.get_or_create(name='Load Test')
+            accounts.append((user, category, user_base_currency(user)))
+
+        latencies = []
+        errors = []
+        counter = QueryCounter()
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(user, category, currency):
+            client = Client()
+            client.force_login(user)
+            local_latencies = []
+            local_errors = 0
+            local_counter = QueryCounter()
+            with ExitStack() as stack:
+                for alias in settings.SHARD_DATABASES:
+                    stack.enter_context(connections[alias].execute_wrapper(local_counter))
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        client.post('/app/transactions/new/', {
+                            'type': 'EXPENSE',
+                            'category': category.id,
+                            'amount': '12.34',
+                            'currency': currency,
+                            'date': date.today().isoformat(),
+                            'note': 'load test',
+                        })
+                        client.get('/app/dashboard/')
+                    except OperationalError:
+                        local_errors += 1
+                        continue
+                    local_latencies.append((time.perf_counter() - start) * 1000)
+            connections.close_all()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+                counter.reads.update(local_counter.reads)
+                counter.writes.update(local_counter.writes)
+
+        # Lock errors are counted below; don't log a traceback for each one.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            threads = [
+                threading.Thread(target=worker, args=accounts[index % len(accounts)])
+                for index in range(options['threads'])
+            ]
+            started = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+
+        db = connections['default'].settings_dict
+        self.stdout.write(
+            f"CONN_MAX_AGE={db['CONN_MAX_AGE']} pragmas={db['OPTIONS'].get('pragmas', {})} "
+            f"SESSION_MODE={settings.SESSION_MODE} shards={len(settings.SHARD_DATABASES)} users={len(accounts)}"
+        )
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f'{len(latencies)} write+read iterations in {elapsed:.1f}s '
+                f'({len(latencies) / elapsed:.1f}/s) with {options["threads"]} threads; '
+                f'p50 {statistics.median(latencies):.1f} ms, '
+                f'p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms'
+            )
+        self.stdout.write(f'"database is locked" errors: {sum(errors)}')
+        if latencies:
+            iterations = len(latencies)
+            self.stdout.write(
+                f'Writes per iteration: {sum(counter.writes.values()) / iterations:.2f} '
+                f'(django_session: {counter.writes["django_session"] / iterations:.2f}); '
+                f'django_session reads per iteration: {counter.reads["django_session"] / iterations:.2f}'
+            )
+            for table, count in counter.writes.most_common():
+                self.stdout.write(f'  {table}: {count / iterations:.2f} writes')
+
+        if not options['keep']:
+            for user, _, _ in accounts:
+                user.transactions.all().delete()
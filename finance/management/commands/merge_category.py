@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from finance.merge import CategoryMergeError, merge_category
+from finance.models import Category
+from fintech_health.sharding import shard_for_pk
+
+
+class Command(BaseCommand):
+    help = 'Deletes a category, moving its transactions to another category (or uncategorized) in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_id', type=int)
+        parser.add_argument('--into', type=int, help='Category that takes over the transactions (default: uncategorized)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Transactions moved per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            # Ids are unique across shards and say which shard allocated them.
+            source = Category.objects.using(shard_for_pk(options['category_id'])).get(pk=options['category_id'])
+            target = Category.objects.using(shard_for_pk(options['into'])).get(pk=options['into']) if options['into'] else None
+        except Category.DoesNotExist:
+            raise CommandError('Category does not exist.')
+
+        def progress(moved, total):
+            self.stdout.write(f'Moved {moved}/{total} transactions')
+
+        name = source.name
+        started = time.perf_counter()
+        try:
+            moved = merge_category(source, target, chunk_size=options['chunk_size'], progress=progress)
+        except CategoryMergeError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {name}, moved {moved} transactions to '
+            f'{target.name if target else "uncategorized"} in {elapsed:.2f}s'
+        ))
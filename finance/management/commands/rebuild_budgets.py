@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from finance.budgets import rebuild_budget_spend
+
+
+class Command(BaseCommand):
+    help = 'Recomputes budget spend from transactions and reports any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report mismatches, do not fix them')
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_budget_spend(fix=not options['check'])
+        for budget, stored, actual in mismatches:
+            self.stdout.write(f'{budget.owner_id} {budget}: stored {stored}, actual {actual}')
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All budgets are consistent'))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} budgets are out of date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} budgets'))
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from finance.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily category rollups from transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['user']:
+            try:
+                user_id = User.objects.get(username=options['user']).id
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        created = rebuild_rollups(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} rollup rows'))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from finance.currency import MissingRateError, set_base_currency
+
+
+class Command(BaseCommand):
+    help = "Changes a user's base currency and recomputes their rollups and budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('currency')
+
+    def handle(self, *args, **options):
+        currency = options['currency'].upper()
+        if currency not in settings.CURRENCIES:
+            raise CommandError(f'Unsupported currency {currency}')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        try:
+            set_base_currency(user, currency)
+        except MissingRateError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{user.username} now uses {currency}'))
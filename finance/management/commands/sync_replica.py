@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database into the read replica file'
+
+    def handle(self, *args, **options):
+        if settings.REPLICA_DATABASE not in connections.databases:
+            raise CommandError('No replica configured. Set DATABASE_REPLICA_NAME.')
+
+        primary = connections['default'].settings_dict['NAME']
+        replica = connections[settings.REPLICA_DATABASE].settings_dict['NAME']
+        connections[settings.REPLICA_DATABASE].close()
+
+        # The backup API takes a consistent snapshot while writers keep going.
+        source = sqlite3.connect(str(primary))
+        target = sqlite3.connect(str(replica))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Replica {replica} synced from {primary}'))
@@ -0,0 +1,73 @@
+from accounts.models import Profile
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models
+from fintech_health.sharding import SHARD_ID_BITS, copy_to_shards, is_sharded, use_shard
+from finance.models import Category, ExchangeRate
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Creates or migrates the shard databases and copies users, profiles, rates and global categories to them'
+
+    def handle(self, *args, **options):
+        if len(settings.SHARD_DATABASES) < 2:
+            raise CommandError('Sharding is not enabled. Set DATABASE_SHARDS.')
+
+        for index, alias in enumerate(settings.SHARD_DATABASES[1:], start=1):
+            # Data migrations use the historical models, which the router
+            # sends to the current shard.
+            with use_shard(alias):
+                call_command('migrate', database=alias, verbosity=max(options['verbosity'] - 1, 0))
+            self._reserve_ids(alias, index)
+            self.stdout.write(f'{alias}: {connections[alias].settings_dict["NAME"]}')
+
+        users = self._copy(User, User.objects.using('default').order_by('pk'))
+        self._copy(Profile, Profile.objects.using('default').order_by('pk'))
+        categories = self._copy(Category, Category.objects.using('default').filter(owner__isnull=True).order_by('pk'))
+        rates = ExchangeRate.objects.using('default').values_list('currency', 'date', 'rate')
+        for alias in settings.SHARD_DATABASES[1:]:
+            ExchangeRate.objects.using(alias).bulk_create(
+                [ExchangeRate(currency=currency, date=day, rate=rate) for currency, day, rate in rates],
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['currency', 'date'],
+                update_fields=['rate'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(settings.SHARD_DATABASES)} shards in sync: copied {users} users, '
+            f'{categories} global categories and {len(rates)} exchange rates'
+        ))
+
+    def _reserve_ids(self, alias, index):
+        """Start the shard's sharded tables at index << SHARD_ID_BITS."""
+        floor = index << SHARD_ID_BITS
+        with connections[alias].cursor() as cursor:
+            for model in apps.get_models():
+                if not is_sharded(model) or not isinstance(model._meta.pk, models.AutoField):
+                    continue
+                table = model._meta.db_table
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, floor, table],
+                )
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s', [floor, table, floor])
+
+    def _copy(self, model, queryset):
+        copied = 0
+        batch = []
+        for obj in queryset.iterator(chunk_size=BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                copy_to_shards(model, batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            copy_to_shards(model, batch)
+            copied += len(batch)
+        return copied
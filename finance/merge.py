@@ -0,0 +1,145 @@
+"""
+Category merge and deletion.
+
+Deleting a category directly lets the database null out category_id on all
+of its transactions in one UPDATE, holding the write lock for as long as
+that takes. merge_category() instead moves the transactions to the target
+category (or to uncategorized) a chunk at a time, each chunk in its own
+short transaction.
+
+Chunks are planned from the category's rollup rows, which already count its
+transactions per (date, owner): each chunk is a run of (date, owner) keys
+holding about chunk_size transactions. The transactions in that run are
+reassigned with one UPDATE, and the run's rollup rows and budget spend move
+with them, so the derived tables agree with the transactions after every
+chunk without revisiting individual amounts. Transactions added to the
+category while a merge runs land in fresh rollup rows and are picked up by
+a later chunk. The category is deleted once it is empty.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from fintech_health.sharding import current_shard, shard_for_user, use_shard
+
+from .budgets import move_budget_spend, spend_from_rollups
+from .models import Budget, Category, DailyRollup, RecurringRule, Transaction
+from .outbox import record_changes
+from .rollups import move_category_rollups
+from .signals import category_merged, mark_changed
+
+
+class CategoryMergeError(ValueError):
+    """The target category cannot take over the source's transactions."""
+
+
+def check_merge_target(source, target):
+    if target is None:
+        return
+    if target.pk == source.pk:
+        raise CategoryMergeError('A category cannot be merged into itself.')
+    if target.owner_id is not None and target.owner_id != source.owner_id:
+        raise CategoryMergeError(
+            'Global categories can only be merged into global categories.'
+            if source.owner_id is None else
+            "A category can only be merged into one of its owner's categories or a global one."
+        )
+
+
+def _key_range(first, last):
+    """Rows whose (date, owner_id) lies between two keys, inclusive."""
+    (first_date, first_owner), (last_date, last_owner) = first, last
+    return (
+        (Q(date__gt=first_date) | Q(date=first_date, owner_id__gte=first_owner))
+        & (Q(date__lt=last_date) | Q(date=last_date, owner_id__lte=last_owner))
+    )
+
+
+def _next_chunk(source_id, chunk_size):
+    """The (date, owner) key range of the next chunk, or None when the category is empty."""
+    rows = DailyRollup.objects.filter(
+        category_id=source_id, count__gt=0
+    ).order_by('date', 'owner_id').values_list('date', 'owner_id', 'count')[:chunk_size]
+    first = last = None
+    total = 0
+    for date, owner_id, count in rows:
+        if last is not None and total >= chunk_size and (date, owner_id) != last:
+            break
+        first = first or (date, owner_id)
+        last = (date, owner_id)
+        total += count
+    return (first, last) if first else None
+
+
+def _move_chunk(source_id, target_id, key_range):
+    with transaction.atomic(using=current_shard()):
+        # The atomic block holds the write lock (BEGIN IMMEDIATE), so the
+        # rows read here and the rollup rows read next cover exactly the
+        # transactions that move.
+        changed = list(Transaction.objects.filter(key_range, category_id=source_id))
+        moved = Transaction.objects.filter(key_range, category_id=source_id).update(category_id=target_id)
+        for txn in changed:
+            txn.category_id = target_id
+        record_changes(changed, 'UPDATE')
+        rollups = move_category_rollups(source_id, target_id, within=key_range & Q(count__gt=0))
+        move_budget_spend(rollups, source_id, target_id)
+    mark_changed({row.owner_id for row in rollups})
+    return moved
+
+
+def _move_budgets(source, target):
+    """Hand the source's budgets to the target where it has none for that month."""
+    taken = set(Budget.objects.filter(category=target).values_list('owner_id', 'month'))
+    for budget in Budget.objects.filter(category=source):
+        if (budget.owner_id, budget.month) not in taken:
+            budget.category = target
+            budget.spent = spend_from_rollups(budget)
+            budget.save(update_fields=['category', 'spent'])
+
+
+def merge_category(source, target=None, chunk_size=2000, progress=None):
+    """
+    Move every transaction of source to target (None: uncategorized) in
+    chunks of about chunk_size, then delete source. Recurring rules and,
+    where the target has none for the month, budgets follow the
+    transactions. progress(moved, total) is called after each chunk.
+    Returns the number of transactions moved.
+    """
+    check_merge_target(source, target)
+    if source.owner_id is not None:
+        with use_shard(shard_for_user(source.owner_id)):
+            return _merge(source, target, chunk_size, progress)
+
+    # A global category has a copy on every shard. Deleting the one on
+    # 'default' deletes the others, so it goes last.
+    moved = 0
+    for alias in reversed(settings.SHARD_DATABASES):
+        with use_shard(alias):
+            shard_source = Category.objects.filter(pk=source.pk).first()
+            if shard_source is not None:
+                moved += _merge(shard_source, target, chunk_size, progress)
+    return moved
+
+
+def _merge(source, target, chunk_size, progress):
+    target_id = target.pk if target else None
+    total = Transaction.objects.filter(category_id=source.pk).count()
+
+    moved = 0
+    while True:
+        chunk = _next_chunk(source.pk, chunk_size)
+        if chunk is None:
+            break
+        moved += _move_chunk(source.pk, target_id, _key_range(*chunk))
+        if progress:
+            progress(moved, max(total, moved))
+
+    with transaction.atomic(using=current_shard()):
+        RecurringRule.objects.filter(category_id=source.pk).update(category_id=target_id)
+        # The chunks emptied the source's rollup rows; don't carry them over.
+        DailyRollup.objects.filter(category_id=source.pk, count=0).delete()
+        if target is not None:
+            _move_budgets(source, target)
+        category_merged.send(sender=Category, source_id=source.pk, target_id=target_id)
+        # Anything added since the last chunk is handled by the delete signals.
+        source.delete()
+    return moved
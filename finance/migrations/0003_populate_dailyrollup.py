@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    DailyRollup = apps.get_model('finance', 'DailyRollup')
+    grouped = Transaction.objects.order_by().values(
+        'owner_id', 'date', 'category_id', 'type'
+    ).annotate(total=Sum('amount'), count=Count('id'))
+    DailyRollup.objects.bulk_create(
+        (DailyRollup(**row) for row in grouped.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
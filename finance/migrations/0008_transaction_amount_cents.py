@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19
+
+from django.db import migrations, models
+from django.db.models import F, Max
+from django.db.models.functions import Cast, Round
+
+CHUNK_SIZE = 50000
+
+
+def populate_amount_cents(apps, schema_editor):
+    # In pk ranges, so each UPDATE holds the write lock briefly.
+    Transaction = apps.get_model('finance', 'Transaction')
+    last_pk = Transaction.objects.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(0, last_pk, CHUNK_SIZE):
+        Transaction.objects.filter(pk__gt=start, pk__lte=start + CHUNK_SIZE).update(
+            amount_cents=Cast(Round(F('amount') * 100), models.BigIntegerField())
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_idempotencykey_transaction_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_cents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_amount_cents, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount_cents',
+            field=models.BigIntegerField(editable=False),
+        ),
+    ]
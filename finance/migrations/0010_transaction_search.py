@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-19
+
+from django.db import migrations, models
+
+# Trigram full-text index of transaction notes for substring search. It is
+# an external-content FTS5 table: it stores only the index, and the
+# triggers keep it in step with every write, including bulk ones.
+CREATE_NOTE_INDEX = [
+    "CREATE VIRTUAL TABLE finance_transaction_note USING fts5("
+    "note, content='finance_transaction', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER finance_transaction_note_insert AFTER INSERT ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (rowid, note) VALUES (new.id, new.note); END",
+    "CREATE TRIGGER finance_transaction_note_delete AFTER DELETE ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (finance_transaction_note, rowid, note) VALUES ('delete', old.id, old.note); END",
+    "CREATE TRIGGER finance_transaction_note_update AFTER UPDATE OF note ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (finance_transaction_note, rowid, note) VALUES ('delete', old.id, old.note); "
+    "INSERT INTO finance_transaction_note (rowid, note) VALUES (new.id, new.note); END",
+    "INSERT INTO finance_transaction_note (finance_transaction_note) VALUES ('rebuild')",
+]
+DROP_NOTE_INDEX = [
+    "DROP TRIGGER finance_transaction_note_update",
+    "DROP TRIGGER finance_transaction_note_delete",
+    "DROP TRIGGER finance_transaction_note_insert",
+    "DROP TABLE finance_transaction_note",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_transactionchange_changefeedconsumer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', '-date', '-id'], name='transaction_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['amount_cents'], name='transaction_amount_idx'),
+        ),
+        migrations.RunSQL(CREATE_NOTE_INDEX, DROP_NOTE_INDEX),
+    ]
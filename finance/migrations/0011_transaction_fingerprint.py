@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-19
+
+import hashlib
+
+from django.db import migrations, models
+
+CHUNK_SIZE = 5000
+# Making the column NOT NULL rebuilds finance_transaction, which drops the
+# note index triggers of 0010_transaction_search, in either direction.
+NOTE_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS finance_transaction_note_insert",
+    "CREATE TRIGGER finance_transaction_note_insert AFTER INSERT ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (rowid, note) VALUES (new.id, new.note); END",
+    "DROP TRIGGER IF EXISTS finance_transaction_note_delete",
+    "CREATE TRIGGER finance_transaction_note_delete AFTER DELETE ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (finance_transaction_note, rowid, note) VALUES ('delete', old.id, old.note); END",
+    "DROP TRIGGER IF EXISTS finance_transaction_note_update",
+    "CREATE TRIGGER finance_transaction_note_update AFTER UPDATE OF note ON finance_transaction BEGIN "
+    "INSERT INTO finance_transaction_note (finance_transaction_note, rowid, note) VALUES ('delete', old.id, old.note); "
+    "INSERT INTO finance_transaction_note (rowid, note) VALUES (new.id, new.note); END",
+]
+
+
+def _fingerprint(owner_id, type, date, amount_cents, currency, note):
+    # finance.models.transaction_fingerprint as of this migration
+    note = ' '.join((note or '').split()).casefold()
+    key = f'{owner_id}|{type}|{date}|{amount_cents}|{currency}|{note}'
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def populate_fingerprints(apps, schema_editor):
+    # In pk order and chunks of plain SQL: bulk_update's CASE statements
+    # are ten times slower over a large table.
+    after = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                'SELECT id, owner_id, type, date, amount_cents, currency, note FROM finance_transaction '
+                'WHERE id > %s ORDER BY id LIMIT %s', [after, CHUNK_SIZE]
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                'UPDATE finance_transaction SET fingerprint = %s WHERE id = %s',
+                [(_fingerprint(*row[1:]), row[0]) for row in rows],
+            )
+            after = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_transaction_search'),
+    ]
+
+    operations = [
+        # Reversed last, after the rebuilds of the reverse direction.
+        migrations.RunSQL(migrations.RunSQL.noop, NOTE_TRIGGERS),
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(editable=False, max_length=32),
+        ),
+        migrations.RunSQL(NOTE_TRIGGERS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['fingerprint'], name='transaction_fingerprint_idx'),
+        ),
+    ]
@@ -1,7 +1,32 @@
+import hashlib
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from decimal import Decimal
 
+from django.db.models.functions import Cast, Round
+
+
+def to_cents(amount):
+    """An amount as a whole number of minor units (cents)."""
+    return int(Decimal(amount).quantize(Decimal('0.01')) * 100)
+
+
+def normalize_note(note):
+    """A note with case and runs of whitespace ignored."""
+    return ' '.join((note or '').split()).casefold()
+
+
+def transaction_fingerprint(owner_id, type, date, amount, currency, note):
+    """Hash shared by likely duplicates: same owner, type, date, amount, currency and normalized note."""
+    key = f'{owner_id}|{type}|{date}|{to_cents(amount)}|{currency}|{normalize_note(note)}'
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+# Writes to any of these change a transaction's fingerprint.
+FINGERPRINT_FIELDS = {'owner', 'owner_id', 'type', 'date', 'amount', 'currency', 'note'}
+
 
 class Category(models.Model):
     TYPE_CHOICES = [
@@ -24,6 +49,81 @@ class Category(models.Model):
         return f"{self.name}{owner_str}"
 
 
+class RecurringRule(models.Model):
+    """Template for a transaction that repeats on a schedule (salary, rent, bills)."""
+    FREQUENCY_CHOICES = [
+        ('DAILY', 'Daily'),
+        ('WEEKLY', 'Weekly'),
+        ('MONTHLY', 'Monthly'),
+        ('CUSTOM', 'Every N days'),
+    ]
+    
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_rules')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='recurring_rules')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY)
+    type = models.CharField(max_length=10, choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')])
+    note = models.TextField(blank=True, null=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='MONTHLY')
+    interval_days = models.PositiveIntegerField(null=True, blank=True, help_text='Days between occurrences for custom schedules')
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # Date of the next occurrence that has not been materialized yet
+    next_date = models.DateField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['next_date']
+        indexes = [
+            models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_frequency_display()} {self.type} - {self.amount}"
+
+
+class TransactionQuerySet(models.QuerySet):
+    """Keeps amount_cents and fingerprint in step on writes that bypass save()."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.amount_cents = to_cents(obj.amount)
+            obj.fingerprint = obj.get_fingerprint()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'amount' in fields:
+            for obj in objs:
+                obj.amount_cents = to_cents(obj.amount)
+            fields = [*fields, 'amount_cents']
+        if not FINGERPRINT_FIELDS.isdisjoint(fields):
+            for obj in objs:
+                obj.fingerprint = obj.get_fingerprint()
+            fields = [*fields, 'fingerprint']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'amount' in kwargs:
+            amount = kwargs['amount']
+            kwargs['amount_cents'] = (
+                Cast(Round(amount * 100), models.BigIntegerField())
+                if hasattr(amount, 'resolve_expression') else to_cents(amount)
+            )
+        if FINGERPRINT_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        # The new values may be expressions, so the fingerprints are
+        # recomputed from the updated rows.
+        pks = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        rows = list(self.model.objects.using(self.db).filter(pk__in=pks))
+        for row in rows:
+            row.fingerprint = row.get_fingerprint()
+        self.model.objects.using(self.db).bulk_update(rows, ['fingerprint'], batch_size=500)
+        return updated
+
+
 class Transaction(models.Model):
     TYPE_CHOICES = [
         ('INCOME', 'Income'),
@@ -32,19 +132,204 @@ class Transaction(models.Model):
     
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='transactions')
+    # In `currency`; rollups, budgets and balances are in the owner's base currency
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # amount in cents, for exact integer aggregates; set from amount on every write
+    amount_cents = models.BigIntegerField(editable=False)
+    currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     date = models.DateField()
     note = models.TextField(blank=True, null=True)
+    recurring_rule = models.ForeignKey(RecurringRule, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
+    # transaction_fingerprint() of the row; set on every write
+    fingerprint = models.CharField(max_length=32, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-date', '-created_at']
+        constraints = [
+            # One occurrence per rule per date; makes the scheduler idempotent.
+            models.UniqueConstraint(fields=['recurring_rule', 'date'], name='unique_recurring_occurrence'),
+        ]
+        indexes = [
+            # Keyset pagination of a user's history, newest first.
+            models.Index(fields=['owner', '-date', '-id'], name='transaction_owner_date_idx'),
+            # Backoffice search across all users: newest first, optionally
+            # within a category or amount range.
+            models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+            models.Index(fields=['category', '-date', '-id'], name='transaction_category_date_idx'),
+            models.Index(fields=['amount_cents'], name='transaction_amount_idx'),
+            # Duplicate lookups on create and import, and the duplicate scan.
+            models.Index(fields=['fingerprint'], name='transaction_fingerprint_idx'),
+        ]
+        # The note full-text index (migration 0010) is kept up to date by
+        # triggers. A migration that rebuilds this table on SQLite, as most
+        # AddField and AlterField operations do, must create them again.
+    
+    objects = TransactionQuerySet.as_manager()
     
     def __str__(self):
-        return f"{self.type} - {self.amount} - {self.date}"
+        return f"{self.type} - {self.amount} {self.currency} - {self.date}"
+    
+    def get_fingerprint(self):
+        return transaction_fingerprint(self.owner_id, self.type, self.date, self.amount, self.currency, self.note)
+    
+    def save(self, *args, **kwargs):
+        self.amount_cents = to_cents(self.amount)
+        self.fingerprint = self.get_fingerprint()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if 'amount' in update_fields:
+                update_fields = {*update_fields, 'amount_cents'}
+            if not FINGERPRINT_FIELDS.isdisjoint(update_fields):
+                update_fields = {*update_fields, 'fingerprint'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
 
 
+class DailyRollup(models.Model):
+    """
+    Per-user daily totals by category and type, kept in step with
+    Transaction writes so analytics never scan the full history.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='daily_rollups')
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'date', 'category', 'type'],
+                name='unique_daily_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['owner', 'date', 'type'],
+                condition=models.Q(category__isnull=True),
+                name='unique_daily_rollup_uncategorized',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.owner_id} - {self.date} - {self.category_id} - {self.type}: {self.total}"
 
 
+class Budget(models.Model):
+    """Monthly spending limit for a category. `spent` is maintained on Transaction writes."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
+    month = models.DateField(help_text='First day of the budgeted month')
+    limit = models.DecimalField(max_digits=12, decimal_places=2)
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-month', 'category__name']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'category', 'month'], name='unique_budget_per_month'),
+        ]
+    
+    def __str__(self):
+        return f"{self.category.name} - {self.month:%b %Y}: {self.spent}/{self.limit}"
+    
+    @property
+    def percent_used(self):
+        if not self.limit:
+            return 0
+        return int(self.spent / self.limit * 100)
+
+
+class BudgetAlert(models.Model):
+    THRESHOLD_CHOICES = [
+        (80, '80%'),
+        (100, '100%'),
+    ]
+    
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts')
+    threshold = models.PositiveSmallIntegerField(choices=THRESHOLD_CHOICES)
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'threshold'], name='unique_budget_alert'),
+        ]
+    
+    def __str__(self):
+        return f"{self.budget} reached {self.threshold}%"
+
+
+class ExchangeRate(models.Model):
+    """Daily value of one unit of a currency in settings.FX_QUOTE_CURRENCY."""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    
+    class Meta:
+        ordering = ['-date', 'currency']
+        constraints = [
+            # Also the index behind "latest rate on or before a date" lookups
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
+    
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of an API write, replayed when a client retries with the same key."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'created_at'], name='idempotency_key_age_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.owner_id} {self.key}: {self.status_code}"
+
+
+class TransactionChange(models.Model):
+    """
+    Outbox entry for a transaction write, stored in the same database
+    transaction. The id is the change's sequence number on its shard.
+    """
+    OPERATION_CHOICES = [
+        ('CREATE', 'Create'),
+        ('UPDATE', 'Update'),
+        ('DELETE', 'Delete'),
+    ]
+    
+    # Not foreign keys: a change outlives the transaction it describes.
+    transaction_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    # JSON snapshot of the row after the write (before it, for a delete)
+    data = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"#{self.pk} {self.operation} {self.transaction_id}"
+
+
+class ChangeFeedConsumer(models.Model):
+    """A change-feed reader's position: the last change it has consumed on this shard."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} at {self.position}"
@@ -0,0 +1,139 @@
+"""
+Transaction outbox and change feed.
+
+Every write to a transaction adds a TransactionChange row in the same
+database transaction, so the outbox holds exactly the committed writes, in
+commit order: SQLite allocates ids under the write lock, and each shard
+numbers its changes independently.
+
+Readers page through the feed with a cursor of per-shard sequence numbers,
+"after which change on each shard". A named consumer stores the position
+it has acknowledged, and compact_changes() deletes every change that all
+consumers are past. Without any consumer nothing is compacted.
+"""
+import heapq
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from fintech_health.sharding import current_shard, each_shard, fan_out, shard_for_pk
+
+from .models import ChangeFeedConsumer, TransactionChange
+
+SNAPSHOT_FIELDS = [
+    'id', 'owner_id', 'type', 'category_id', 'amount', 'currency', 'date',
+    'note', 'recurring_rule_id', 'created_at', 'updated_at',
+]
+
+
+class CursorError(ValueError):
+    """A change-feed cursor that cannot be parsed."""
+
+
+def snapshot(txn):
+    return json.dumps(
+        {name: getattr(txn, name) for name in SNAPSHOT_FIELDS},
+        cls=DjangoJSONEncoder, separators=(',', ':'),
+    )
+
+
+def record_changes(transactions, operation):
+    """Add outbox entries for transactions written on the current shard."""
+    TransactionChange.objects.bulk_create(
+        [
+            TransactionChange(
+                transaction_id=txn.pk,
+                owner_id=txn.owner_id,
+                operation=operation,
+                data=snapshot(txn),
+            )
+            for txn in transactions
+        ],
+        batch_size=500,
+    )
+
+
+def parse_cursor(cursor):
+    """Per-shard positions from a cursor: comma-separated sequence numbers."""
+    positions = {}
+    for part in filter(None, (cursor or '').split(',')):
+        try:
+            position = int(part)
+        except ValueError:
+            raise CursorError('Invalid cursor.')
+        if position < 0:
+            raise CursorError('Invalid cursor.')
+        alias = shard_for_pk(position)
+        positions[alias] = max(position, positions.get(alias, 0))
+    return positions
+
+
+def format_cursor(positions):
+    return ','.join(str(positions[alias]) for alias in settings.SHARD_DATABASES if positions.get(alias))
+
+
+def _changes_after(positions, limit):
+    return list(
+        TransactionChange.objects.filter(pk__gt=positions.get(current_shard(), 0)).order_by('pk')[:limit]
+    )
+
+
+def read_changes(positions, limit):
+    """
+    Up to limit changes after positions, oldest first, and the positions
+    after them. Each shard's changes stay in sequence order, so the new
+    positions never pass a change that was not returned.
+    """
+    batches = fan_out(_changes_after, positions, limit)
+    changes = list(islice(heapq.merge(*batches, key=lambda change: change.created_at), limit))
+    positions = dict(positions)
+    for change in changes:
+        positions[shard_for_pk(change.pk)] = change.pk
+    return changes, positions
+
+
+def change_as_dict(change):
+    return {
+        'seq': change.pk,
+        'operation': change.operation,
+        'transaction': change.transaction_id,
+        'owner': change.owner_id,
+        'at': change.created_at,
+        'data': json.loads(change.data),
+    }
+
+
+def _consumer_position(name):
+    return ChangeFeedConsumer.objects.filter(name=name).values_list('position', flat=True).first() or 0
+
+
+def consumer_positions(name):
+    return {
+        alias: position
+        for alias, position in zip(settings.SHARD_DATABASES, fan_out(_consumer_position, name))
+        if position
+    }
+
+
+def acknowledge(name, positions):
+    """Record that consumer name has processed every change up to positions."""
+    for alias in each_shard():
+        with transaction.atomic(using=alias):
+            consumer, _ = ChangeFeedConsumer.objects.get_or_create(name=name)
+            # Never moves back: compaction may already have deleted older changes.
+            if positions.get(alias, 0) > consumer.position:
+                consumer.position = positions[alias]
+                consumer.save(update_fields=['position', 'updated_at'])
+
+
+def compact_changes():
+    """Delete the changes every consumer has acknowledged. Returns how many went."""
+    deleted = 0
+    for _ in each_shard():
+        floor = ChangeFeedConsumer.objects.aggregate(floor=Min('position'))['floor']
+        if floor:
+            deleted += TransactionChange.objects.filter(pk__lte=floor).delete()[0]
+    return deleted
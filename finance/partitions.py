@@ -0,0 +1,80 @@
+"""
+Year partitions of a user's transaction history.
+
+Transactions stay in one table, clustered for reads by the
+(owner, -date, -id) index. A partition is one calendar year of a user's
+rows, and DailyRollup is the partition catalog: it gives the number of
+transactions per year matching the type, category and date filters without
+reading any transactions.
+
+YearPartitionPaginator uses the catalog to count pages and to find the
+years holding a page, then reads just those years with an indexed date
+range, merging the slices when a page crosses a year boundary. A deep page
+costs an offset into one year instead of a scan past every newer row.
+"""
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from django.utils.functional import cached_property
+
+from .models import DailyRollup
+
+
+def year_counts(user, transaction_type=None, category_id=None, date_from=None, date_to=None):
+    """[(year, matching transactions)] for a user, newest year first, from the rollups."""
+    rollups = DailyRollup.objects.filter(owner=user, count__gt=0)
+    if transaction_type:
+        rollups = rollups.filter(type=transaction_type)
+    if category_id:
+        rollups = rollups.filter(category_id=category_id)
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+    # Both ends and every year are ranges on the (owner, date, ...) unique
+    # index, so the catalog never reads more rollups than the filters match.
+    first = rollups.order_by('date').values_list('date', flat=True).first()
+    if first is None:
+        return []
+    last = rollups.order_by('-date').values_list('date', flat=True).first()
+    counts = []
+    for year in range(last.year, first.year - 1, -1):
+        count = rollups.filter(date__year=year).aggregate(total=Sum('count'))['total']
+        if count:
+            counts.append((year, count))
+    return counts
+
+
+class YearPartitionPaginator(Paginator):
+    """
+    Paginator over transactions, newest first, that reads each page from
+    the year partitions holding it. object_list must already carry the
+    filters the counts were taken with.
+    """
+
+    def __init__(self, object_list, per_page, partitions, **kwargs):
+        super().__init__(object_list.order_by('-date', '-id'), per_page, **kwargs)
+        self.partitions = partitions
+
+    @cached_property
+    def count(self):
+        return sum(count for _, count in self.partitions)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(self._slice(bottom, top), number, self)
+
+    def _slice(self, bottom, top):
+        rows = []
+        offset = 0
+        for year, count in self.partitions:
+            if offset >= top:
+                break
+            if offset + count > bottom:
+                start = max(bottom - offset, 0)
+                rows.extend(self.object_list.filter(date__year=year)[start:min(top - offset, count)])
+            offset += count
+        return rows
@@ -0,0 +1,145 @@
+"""
+Materialization of recurring transaction rules.
+
+Each active rule stores the date of its next unmaterialized occurrence, so
+finding due work is an index range scan on (is_active, next_date). Due rules
+are processed in primary-key chunks: every occurrence up to today is built in
+memory, inserted with bulk_create and folded into the derived tables, and the
+rules' next_date is moved past them. A run after downtime catches up on all
+missed occurrences, up to max_per_rule per rule per run.
+
+Transactions carry a (recurring_rule, date) unique constraint, and each chunk
+moves the rules forward before reading which occurrences already exist, so the
+existence check always happens under the write lock and overlapping runs
+cannot materialize the same occurrence twice.
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from fintech_health.sharding import current_shard, each_shard
+
+from .models import RecurringRule, Transaction
+from .signals import apply_transaction_changes, transactions_bulk_created
+
+STEP_DAYS = {'DAILY': 1, 'WEEKLY': 7}
+
+
+def add_months(day, months, anchor_day):
+    """Move day by whole months, keeping anchor_day where the month allows."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(rule, day):
+    """The occurrence after day."""
+    if rule.frequency == 'MONTHLY':
+        # Anchored on the start date so the 31st comes back after February.
+        return add_months(day, 1, rule.start_date.day)
+    if rule.frequency == 'CUSTOM':
+        return day + timedelta(days=rule.interval_days)
+    return day + timedelta(days=STEP_DAYS[rule.frequency])
+
+
+def due_dates(rule, today, limit):
+    """Unmaterialized occurrence dates up to today (at most limit), and the next date after them."""
+    dates = []
+    day = rule.next_date
+    last_day = min(today, rule.end_date) if rule.end_date else today
+    while day <= last_day and len(dates) < limit:
+        dates.append(day)
+        day = next_occurrence(rule, day)
+    return dates, day
+
+
+def build_transaction(rule, day):
+    return Transaction(
+        owner_id=rule.owner_id,
+        category_id=rule.category_id,
+        amount=rule.amount,
+        currency=rule.currency,
+        type=rule.type,
+        date=day,
+        note=rule.note,
+        recurring_rule_id=rule.pk,
+    )
+
+
+def _materialize_chunk(rule_ids, today, max_per_rule):
+    with transaction.atomic(using=current_shard()):
+        rules = list(
+            RecurringRule.objects.select_for_update().filter(
+                pk__in=rule_ids, is_active=True, next_date__lte=today
+            )
+        )
+        pending = []
+        advanced = defaultdict(list)
+        for rule in rules:
+            dates, next_date = due_dates(rule, today, max_per_rule)
+            is_active = not (rule.end_date and next_date > rule.end_date)
+            advanced[(next_date, is_active)].append(rule.pk)
+            pending.extend(build_transaction(rule, day) for day in dates)
+
+        # Rules due together usually move to the same next date, so one UPDATE
+        # per distinct date is far cheaper than bulk_update's per-row CASE.
+        # Writing first also takes the database write lock, so the existence
+        # check below cannot race with another run.
+        for (next_date, is_active), pks in advanced.items():
+            RecurringRule.objects.filter(pk__in=pks).update(next_date=next_date, is_active=is_active)
+
+        if not pending:
+            return len(rules), 0
+        existing = set(
+            Transaction.objects.filter(
+                recurring_rule_id__in=[rule.pk for rule in rules],
+                date__gte=min(txn.date for txn in pending),
+            ).values_list('recurring_rule_id', 'date')
+        )
+        new = [txn for txn in pending if (txn.recurring_rule_id, txn.date) not in existing]
+        Transaction.objects.bulk_create(new, batch_size=500)
+        apply_transaction_changes(new)
+        transactions_bulk_created.send(sender=Transaction, transactions=new)
+    return len(rules), len(new)
+
+
+def materialize_due(today=None, rules=None, chunk_size=1000, max_per_rule=366):
+    """
+    Materialize every due occurrence up to today. Returns a
+    (rules processed, transactions created) pair. Memory is bounded by
+    chunk_size * max_per_rule transactions; rules with a longer backlog
+    are finished by the following runs.
+    """
+    today = today or timezone.now().date()
+    if rules is None:
+        processed = created = 0
+        for _ in each_shard():
+            shard_processed, shard_created = _materialize_due(
+                today, RecurringRule.objects.all(), chunk_size, max_per_rule
+            )
+            processed += shard_processed
+            created += shard_created
+        return processed, created
+    return _materialize_due(today, rules, chunk_size, max_per_rule)
+
+
+def _materialize_due(today, rules, chunk_size, max_per_rule):
+    due = rules.filter(
+        is_active=True, next_date__lte=today
+    )
+
+    processed = created = 0
+    last_id = 0
+    while True:
+        rule_ids = list(
+            due.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not rule_ids:
+            break
+        last_id = rule_ids[-1]
+        chunk_rules, chunk_created = _materialize_chunk(rule_ids, today, max_per_rule)
+        processed += chunk_rules
+        created += chunk_created
+    return processed, created
@@ -0,0 +1,101 @@
+"""
+Maintenance of the DailyRollup table.
+
+Every Transaction write is folded into the rollup row for its
+(owner, date, category, type), so per-day and per-category totals can be
+read without scanning transactions.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from fintech_health.sharding import current_shard, each_shard, shard_for_user, use_shard
+
+from .currency import base_amounts, converted_amount
+from .models import DailyRollup, Transaction
+
+
+def _apply_delta(owner_id, date, category_id, type, total, count):
+    lookup = {'owner_id': owner_id, 'date': date, 'category_id': category_id, 'type': type}
+    updated = DailyRollup.objects.filter(**lookup).update(
+        total=F('total') + total,
+        count=F('count') + count,
+    )
+    if not updated:
+        try:
+            with transaction.atomic(using=current_shard()):
+                DailyRollup.objects.create(total=total, count=count, **lookup)
+        except IntegrityError:
+            # Another writer created the row first.
+            DailyRollup.objects.filter(**lookup).update(
+                total=F('total') + total,
+                count=F('count') + count,
+            )
+
+
+def record_transactions(transactions, sign=1):
+    """Add (sign=1) or remove (sign=-1) transactions from the rollups, in base currency."""
+    deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+    for txn, amount in zip(transactions, base_amounts(transactions)):
+        key = (txn.owner_id, txn.date, txn.category_id, txn.type)
+        deltas[key][0] += sign * Decimal(amount)
+        deltas[key][1] += sign
+
+    with transaction.atomic(using=current_shard()):
+        for (owner_id, date, category_id, type), (total, count) in deltas.items():
+            _apply_delta(owner_id, date, category_id, type, total, count)
+
+
+def move_category_rollups(from_category_id, to_category_id=None, within=None):
+    """
+    Fold one category's rollup rows into another (or into uncategorized).
+    With a Q object `within`, only the matching rows move, and they are
+    returned.
+    """
+    with transaction.atomic(using=current_shard()):
+        rows = DailyRollup.objects.filter(category_id=from_category_id)
+        if within is None:
+            for row in rows.iterator():
+                _apply_delta(row.owner_id, row.date, to_category_id, row.type, row.total, row.count)
+            rows.delete()
+            return None
+        moved = list(rows.filter(within))
+        for row in moved:
+            _apply_delta(row.owner_id, row.date, to_category_id, row.type, row.total, row.count)
+        DailyRollup.objects.filter(pk__in=[row.pk for row in moved]).delete()
+    return moved
+
+
+def rebuild_rollups(user_id=None, batch_size=1000):
+    """Recompute rollups from transactions, for one user or everyone."""
+    if user_id is not None:
+        with use_shard(shard_for_user(user_id)):
+            return _rebuild_rollups(user_id, batch_size)
+    return sum(_rebuild_rollups(None, batch_size) for _ in each_shard())
+
+
+def _rebuild_rollups(user_id, batch_size):
+    transactions = Transaction.objects.all()
+    rollups = DailyRollup.objects.all()
+    if user_id is not None:
+        transactions = transactions.filter(owner_id=user_id)
+        rollups = rollups.filter(owner_id=user_id)
+
+    grouped = transactions.order_by().values(
+        'owner_id', 'date', 'category_id', 'type'
+    ).annotate(total=Sum(converted_amount()), count=Count('id'))
+
+    with transaction.atomic(using=current_shard()):
+        rollups.delete()
+        batch = []
+        created = 0
+        for row in grouped.iterator():
+            batch.append(DailyRollup(**row))
+            if len(batch) >= batch_size:
+                DailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        DailyRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -0,0 +1,153 @@
+from accounts.models import Profile
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import Signal, receiver
+from fintech_health.routers import pin_to_primary
+from fintech_health.sharding import copy_to_shards, current_shard, each_shard, sharding_enabled, use_shard
+from .models import Category, Transaction
+from .budgets import record_budget_spend
+from .categories import invalidate_categories
+from .outbox import record_changes
+from .rollups import move_category_rollups, record_transactions
+from .utils import bump_all_data_versions, bump_data_version
+
+# Sent with sender=Transaction and transactions=[...] by write paths that
+# insert with bulk_create, since post_save does not fire for them.
+transactions_bulk_created = Signal()
+# Sent with user_id after a user's derived tables are recomputed in a new base currency.
+base_currency_changed = Signal()
+# Sent with source_id and target_id (None: uncategorized) by merge_category
+# once the source's transactions have moved, before it is deleted.
+category_merged = Signal()
+
+
+def apply_transaction_changes(transactions, sign=1):
+    """
+    Fold saved (sign=1) or deleted (sign=-1) transactions into the derived
+    tables. Called from the model signals, and directly by bulk write paths
+    that bypass them.
+    """
+    with transaction.atomic(using=current_shard()):
+        record_transactions(transactions, sign)
+        record_budget_spend(transactions, sign)
+    mark_changed({txn.owner_id for txn in transactions})
+
+
+def mark_changed(owner_ids):
+    """Invalidate the owners' cached dashboards and pin their reads to the primary."""
+    for owner_id in owner_ids:
+        bump_data_version(owner_id)
+        pin_to_primary(owner_id)
+
+
+def _deleting_user(origin):
+    """True when a delete cascaded from a User, whose rollups go with them."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, User)
+
+
+@receiver(pre_save, sender=Transaction)
+def transaction_pre_save(sender, instance, using, **kwargs):
+    # Remember the stored row so an update can be taken back out of the rollups.
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Transaction.objects.using(using).filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, using, **kwargs):
+    # The derived rows live on the same shard as the transaction.
+    with use_shard(using), transaction.atomic(using=using):
+        if getattr(instance, '_previous', None) is not None:
+            apply_transaction_changes([instance._previous], sign=-1)
+        apply_transaction_changes([instance])
+        record_changes([instance], 'CREATE' if kwargs.get('created') else 'UPDATE')
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, using, origin=None, **kwargs):
+    with use_shard(using):
+        # A user's deletion still reaches change-feed readers.
+        record_changes([instance], 'DELETE')
+        if not _deleting_user(origin):
+            apply_transaction_changes([instance], sign=-1)
+
+
+@receiver(transactions_bulk_created, sender=Transaction)
+def transactions_created(sender, transactions, **kwargs):
+    # Sent inside the bulk write's database transaction.
+    record_changes(transactions, 'CREATE')
+
+
+@receiver(pre_delete, sender=Category)
+def category_pre_delete(sender, instance, using, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    # Its transactions become uncategorized (SET_NULL) without signals; move
+    # the rollups too and tell change-feed readers.
+    with use_shard(using):
+        move_category_rollups(instance.pk, None)
+        uncategorized = list(Transaction.objects.filter(category_id=instance.pk))
+        for txn in uncategorized:
+            txn.category_id = None
+        record_changes(uncategorized, 'UPDATE')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # Rows on the other shards reference the user and join its username.
+    if sharding_enabled() and using == 'default' and not raw and update_fields != frozenset({'last_login'}):
+        copy_to_shards(User, [instance])
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # Conversions into each owner's base currency join the profile. The
+    # copies are not kept up to date with data_version, which is only read
+    # on 'default'.
+    if sharding_enabled() and using == 'default' and not raw and (
+        update_fields is None or 'base_currency' in update_fields
+    ):
+        # The profile is created before the user's own post_save copies it.
+        copy_to_shards(User, [instance.user])
+        copy_to_shards(Profile, [instance])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    if sharding_enabled() and using == 'default':
+        for alias in each_shard():
+            if alias != 'default':
+                User.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Category)
+def global_category_saved(sender, instance, using, raw=False, **kwargs):
+    if sharding_enabled() and instance.owner_id is None and using == 'default' and not raw:
+        copy_to_shards(Category, [instance])
+
+
+@receiver(post_delete, sender=Category)
+def global_category_deleted(sender, instance, using, origin=None, **kwargs):
+    if sharding_enabled() and instance.owner_id is None and using == 'default':
+        for alias in each_shard():
+            if alias != 'default':
+                Category.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, using, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    if instance.owner_id is None and using != 'default':
+        # A copy of a global category; handled where the original changed.
+        return
+    invalidate_categories(instance.owner_id)
+    # Category names appear in cached dashboard fragments.
+    if instance.owner_id:
+        bump_data_version(instance.owner_id)
+    else:
+        bump_all_data_versions()
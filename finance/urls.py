@@ -1,10 +1,13 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'finance'
 
 urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/async/', views.dashboard_async_view, name='dashboard_async'),
+    path('dashboard/live/', views.live_view, name='live'),
+    path('analytics/categories/', views.category_analytics_view, name='category_analytics'),
     path('transactions/', views.transaction_list_view, name='transaction_list'),
     path('transactions/new/', views.transaction_create_view, name='transaction_create'),
     path('transactions/<int:pk>/delete/', views.transaction_delete_view, name='transaction_delete'),
@@ -12,6 +15,17 @@ urlpatterns = [
     path('categories/new/', views.category_create_view, name='category_create'),
     path('categories/<int:pk>/edit/', views.category_edit_view, name='category_edit'),
     path('categories/<int:pk>/delete/', views.category_delete_view, name='category_delete'),
+    path('budgets/', views.budget_list_view, name='budget_list'),
+    path('budgets/new/', views.budget_create_view, name='budget_create'),
+    path('budgets/<int:pk>/delete/', views.budget_delete_view, name='budget_delete'),
+    path('budgets/alerts/<int:pk>/dismiss/', views.budget_alert_dismiss_view, name='budget_alert_dismiss'),
+    path('recurring/', views.recurring_list_view, name='recurring_list'),
+    path('recurring/new/', views.recurring_create_view, name='recurring_create'),
+    path('recurring/<int:pk>/delete/', views.recurring_delete_view, name='recurring_delete'),
+    path('api/transactions/', api.transactions_view, name='api_transactions'),
+    path('api/transactions/bulk/', api.transactions_bulk_view, name='api_transactions_bulk'),
+    path('api/transactions/<int:pk>/', api.transaction_detail_view, name='api_transaction_detail'),
+    path('api/changes/', api.changes_view, name='api_changes'),
 ]
 
 
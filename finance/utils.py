@@ -1,21 +1,59 @@
-from django.db.models import Sum, Q
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import F, Sum, Q
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+import asyncio
+import json
+from accounts.models import Profile
+from .currency import converted_cents, from_cents, user_base_currency
 from .models import Transaction
 
 
+def bump_data_version(user_id):
+    """Invalidate cached dashboard fragments for a user."""
+    Profile.objects.filter(user_id=user_id).update(data_version=F('data_version') + 1)
+
+
+def bump_all_data_versions():
+    """Invalidate cached dashboard fragments for every user."""
+    Profile.objects.update(data_version=F('data_version') + 1)
+
+
+class LazyValue:
+    """
+    Callable that computes its value on first use and remembers it.
+    Templates call it when resolving a variable, so work behind a cached
+    fragment is skipped entirely on a cache hit.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.evaluated = False
+        self.value = None
+
+    def __call__(self):
+        if not self.evaluated:
+            self.value = self.func(*self.args)
+            self.evaluated = True
+        return self.value
+
+
+def totals_in_cents(transactions, base_currency):
+    """(income, expense) of a Transaction queryset in base_currency, as integer cents."""
+    totals = transactions.aggregate(
+        income=Sum(converted_cents(base_currency), filter=Q(type='INCOME')),
+        expense=Sum(converted_cents(base_currency), filter=Q(type='EXPENSE')),
+    )
+    return totals['income'] or 0, totals['expense'] or 0
+
+
 def calculate_balance(user):
     """Calculate current balance (total income - total expense)."""
-    income = Transaction.objects.filter(owner=user, type='INCOME').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    expense = Transaction.objects.filter(owner=user, type='EXPENSE').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    return income - expense
+    income, expense = totals_in_cents(Transaction.objects.filter(owner=user), user_base_currency(user))
+    return from_cents(income - expense)
 
 
 def calculate_health_score(user):
@@ -27,6 +65,7 @@ def calculate_health_score(user):
     - + up to 20 points if expense_30 <= 80% of income_30
     - Clamp 0..100
     """
+    base_currency = user_base_currency(user)
     now = timezone.now().date()
     thirty_days_ago = now - timedelta(days=30)
     
@@ -36,14 +75,13 @@ def calculate_health_score(user):
         date__lte=now
     )
     
-    income_30 = transactions_30.filter(type='INCOME').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    expense_30 = transactions_30.filter(type='EXPENSE').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
+    income_30, expense_30 = totals_in_cents(transactions_30, base_currency)
     
+    return score_from_totals(from_cents(income_30), from_cents(expense_30))
+
+
+def score_from_totals(income_30, expense_30):
+    """Health score for 30 days of income and expense (see calculate_health_score)."""
     net_30 = income_30 - expense_30
     
     # Start at 50
@@ -94,120 +132,67 @@ def get_health_status(score):
         return 'Unhealthy', 'danger'
 
 
+def _daily_totals(user, start_date, end_date):
+    """
+    (date, type, cents) rows for a user's date window, grouped on the raw
+    date: the (owner, date) index covers the range, and bucketing into
+    periods happens in Python instead of calling a truncation function per row.
+    """
+    return Transaction.objects.filter(
+        owner=user,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values('date', 'type').annotate(
+        total=Sum(converted_cents(user_base_currency(user)))
+    ).order_by().values_list('date', 'type', 'total')
+
+
 def get_chart_data(user, period='monthly'):
     """
     Get aggregated chart data for user.
     period: 'weekly', 'monthly', 'yearly'
     """
-    from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
-    from django.db.models import Sum
-    
     now = timezone.now().date()
     
     if period == 'weekly':
         # Last 7 days, daily aggregation
         start_date = now - timedelta(days=6)
-        transactions = Transaction.objects.filter(
-            owner=user,
-            date__gte=start_date,
-            date__lte=now
-        ).annotate(
-            period=TruncDay('date')
-        ).values('period', 'type').annotate(
-            total=Sum('amount')
-        ).order_by('period')
-        
-        labels = []
-        income_data = []
-        expense_data = []
-        
-        for day_offset in range(7):
-            day = start_date + timedelta(days=day_offset)
-            labels.append(day.strftime('%m/%d'))
-            income_data.append(0)
-            expense_data.append(0)
-        
-        for item in transactions:
-            day_str = item['period'].strftime('%m/%d')
-            if day_str in labels:
-                idx = labels.index(day_str)
-                if item['type'] == 'INCOME':
-                    income_data[idx] = float(item['total'])
-                else:
-                    expense_data[idx] = float(item['total'])
+        labels = [(start_date + timedelta(days=day_offset)).strftime('%m/%d') for day_offset in range(7)]
+        label_of = lambda day: day.strftime('%m/%d')
     
     elif period == 'monthly':
         # Last 12 months
         start_date = now - timedelta(days=365)
-        transactions = Transaction.objects.filter(
-            owner=user,
-            date__gte=start_date,
-            date__lte=now
-        ).annotate(
-            period=TruncMonth('date')
-        ).values('period', 'type').annotate(
-            total=Sum('amount')
-        ).order_by('period')
-        
         labels = []
-        income_data = []
-        expense_data = []
-        
-        # Generate last 12 months
         for month_offset in range(12):
             month_date = now - timedelta(days=30 * month_offset)
-            month_str = month_date.strftime('%Y-%m')
             labels.insert(0, month_date.strftime('%b %Y'))
-            income_data.insert(0, 0)
-            expense_data.insert(0, 0)
-        
-        for item in transactions:
-            month_str = item['period'].strftime('%Y-%m')
-            # Find matching month in labels
-            for idx, label in enumerate(labels):
-                if month_str in label:
-                    if item['type'] == 'INCOME':
-                        income_data[idx] = float(item['total'])
-                    else:
-                        expense_data[idx] = float(item['total'])
-                    break
+        label_of = lambda day: day.strftime('%b %Y')
     
     else:  # yearly
         # Last 5 years
         start_date = now - timedelta(days=1825)
-        transactions = Transaction.objects.filter(
-            owner=user,
-            date__gte=start_date,
-            date__lte=now
-        ).annotate(
-            period=TruncYear('date')
-        ).values('period', 'type').annotate(
-            total=Sum('amount')
-        ).order_by('period')
-        
-        labels = []
-        income_data = []
-        expense_data = []
-        
-        # Generate last 5 years
-        current_year = now.year
-        for year_offset in range(5):
-            year = current_year - year_offset
-            labels.insert(0, str(year))
-            income_data.insert(0, 0)
-            expense_data.insert(0, 0)
-        
-        for item in transactions:
-            year_str = str(item['period'].year)
-            if year_str in labels:
-                idx = labels.index(year_str)
-                if item['type'] == 'INCOME':
-                    income_data[idx] = float(item['total'])
-                else:
-                    expense_data[idx] = float(item['total'])
+        labels = [str(now.year - year_offset) for year_offset in range(4, -1, -1)]
+        label_of = lambda day: str(day.year)
+    
+    # Sums in cents, divided down once at the end.
+    index = {label: idx for idx, label in enumerate(labels)}
+    income_cents = [0] * len(labels)
+    expense_cents = [0] * len(labels)
+    for day, transaction_type, total in _daily_totals(user, start_date, now):
+        idx = index.get(label_of(day))
+        if idx is None:
+            continue
+        if transaction_type == 'INCOME':
+            income_cents[idx] += total or 0
+        else:
+            expense_cents[idx] += total or 0
+    
+    income_data = [cents / 100 for cents in income_cents]
+    expense_data = [cents / 100 for cents in expense_cents]
     
     # Calculate net
-    net_data = [income_data[i] - expense_data[i] for i in range(len(labels))]
+    net_data = [(income_cents[i] - expense_cents[i]) / 100 for i in range(len(labels))]
     
     return {
         'labels': labels,
@@ -216,3 +201,92 @@ def get_chart_data(user, period='monthly'):
         'net': net_data,
     }
 
+
+def get_period_totals(user, start_date):
+    """Income, expense and net for a user since start_date."""
+    income, expense = totals_in_cents(
+        Transaction.objects.filter(owner=user, date__gte=start_date), user_base_currency(user)
+    )
+    return {
+        'income': from_cents(income),
+        'expense': from_cents(expense),
+        'net': from_cents(income - expense),
+    }
+
+
+def get_dashboard_summary(user):
+    """Balance, health score and weekly/monthly/yearly totals for the dashboard."""
+    now = timezone.now().date()
+    health_score = calculate_health_score(user)
+    health_status, health_class = get_health_status(health_score)
+    
+    return {
+        'balance': calculate_balance(user),
+        'health_score': health_score,
+        'health_status': health_status,
+        'health_class': health_class,
+        'today': get_period_totals(user, now),
+        'weekly': get_period_totals(user, now - timedelta(days=6)),
+        'monthly': get_period_totals(user, now - timedelta(days=29)),
+        'yearly': get_period_totals(user, now - timedelta(days=364)),
+    }
+
+
+def get_dashboard_charts(user):
+    """JSON-encoded chart data for the dashboard's weekly/monthly/yearly tabs."""
+    return {
+        period: json.dumps(get_chart_data(user, period))
+        for period in ('weekly', 'monthly', 'yearly')
+    }
+
+
+def _call_in_worker_thread(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # Worker threads are reused by the executor; apply the usual
+        # end-of-request connection handling (CONN_MAX_AGE) to them.
+        close_old_connections()
+
+
+async def run_concurrently(*calls):
+    """
+    Run independent ORM calls, given as (func, *args) tuples, in parallel.
+    Each call runs in its own worker thread with its own connection, so the
+    queries overlap instead of queueing on the single thread-sensitive
+    executor used by the async ORM methods.
+    """
+    worker = sync_to_async(_call_in_worker_thread, thread_sensitive=False)
+    return await asyncio.gather(*(worker(*call) for call in calls))
+
+
+async def aget_dashboard_summary(user):
+    """Async get_dashboard_summary() with all aggregates run concurrently."""
+    now = timezone.now().date()
+    balance, health_score, today, weekly, monthly, yearly = await run_concurrently(
+        (calculate_balance, user),
+        (calculate_health_score, user),
+        (get_period_totals, user, now),
+        (get_period_totals, user, now - timedelta(days=6)),
+        (get_period_totals, user, now - timedelta(days=29)),
+        (get_period_totals, user, now - timedelta(days=364)),
+    )
+    health_status, health_class = get_health_status(health_score)
+    
+    return {
+        'balance': balance,
+        'health_score': health_score,
+        'health_status': health_status,
+        'health_class': health_class,
+        'today': today,
+        'weekly': weekly,
+        'monthly': monthly,
+        'yearly': yearly,
+    }
+
+
+async def aget_dashboard_charts(user):
+    """Async get_dashboard_charts() with the three periods queried concurrently."""
+    periods = ('weekly', 'monthly', 'yearly')
+    results = await run_concurrently(*((get_chart_data, user, period) for period in periods))
+    return {period: json.dumps(data) for period, data in zip(periods, results)}
@@ -1,95 +1,152 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction as db_transaction
+from django.http import JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
 from django.utils import timezone
-from django.utils.safestring import mark_safe
-import json
-from datetime import timedelta
-from decimal import Decimal
-from .models import Transaction, Category
-from .forms import TransactionForm, CategoryForm
-from .utils import calculate_balance, calculate_health_score, get_health_status, get_chart_data
+from django.utils.http import url_has_allowed_host_and_scheme
+from fintech_health.routers import read_from_replica
+from fintech_health.sharding import current_shard
+from .models import Budget, BudgetAlert, RecurringRule, Transaction, Category
+from .forms import BudgetForm, CategoryDeleteForm, RecurringRuleForm, TransactionForm, CategoryForm
+from .analytics import category_breakdown, month_start, parse_month
+from .budgets import budget_status, start_budget, unread_alerts
+from .categories import categories_for
+from .currency import user_base_currency
+from .duplicates import find_duplicate
+from .forecast import get_forecast
+from .live import live_response
+from .merge import merge_category
+from .partitions import YearPartitionPaginator, year_counts
+from .recurring import materialize_due
+from accounts.decorators import async_login_required
+from accounts.models import Profile
+from .utils import (
+    LazyValue, bump_data_version, get_dashboard_summary, get_dashboard_charts,
+    aget_dashboard_summary, aget_dashboard_charts, run_concurrently,
+)
+
+
+# Dashboard sections: context name -> ({% cache %} fragment, function of the user).
+DASHBOARD_SECTIONS = {
+    'summary': ('dashboard_summary', get_dashboard_summary),
+    'charts': ('dashboard_charts', get_dashboard_charts),
+    'forecast': ('dashboard_forecast', get_forecast),
+    'categories': ('dashboard_categories', category_breakdown),
+    'budgets': ('dashboard_budgets', budget_status),
+}
+
+# Sections with an async version that runs its own queries concurrently.
+ASYNC_DASHBOARD_SECTIONS = {
+    'summary': aget_dashboard_summary,
+    'charts': aget_dashboard_charts,
+}
 
 
 @login_required
+@read_from_replica
 def dashboard_view(request):
     """User dashboard with balance, health score, and charts."""
     user = request.user
     
-    # Calculate balance
-    balance = calculate_balance(user)
-    
-    # Calculate health score
-    health_score = calculate_health_score(user)
-    health_status, health_class = get_health_status(health_score)
-    
-    # Get totals for different periods
-    now = timezone.now().date()
-    
-    # Weekly (last 7 days)
-    week_start = now - timedelta(days=6)
-    weekly_income = Transaction.objects.filter(
-        owner=user, type='INCOME', date__gte=week_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    weekly_expense = Transaction.objects.filter(
-        owner=user, type='EXPENSE', date__gte=week_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    weekly_net = weekly_income - weekly_expense
-    
-    # Monthly (last 30 days)
-    month_start = now - timedelta(days=29)
-    monthly_income = Transaction.objects.filter(
-        owner=user, type='INCOME', date__gte=month_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    monthly_expense = Transaction.objects.filter(
-        owner=user, type='EXPENSE', date__gte=month_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    monthly_net = monthly_income - monthly_expense
-    
-    # Yearly (last 365 days)
-    year_start = now - timedelta(days=364)
-    yearly_income = Transaction.objects.filter(
-        owner=user, type='INCOME', date__gte=year_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    yearly_expense = Transaction.objects.filter(
-        owner=user, type='EXPENSE', date__gte=year_start
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    yearly_net = yearly_income - yearly_expense
-    
-    # Get chart data
-    chart_data_weekly = get_chart_data(user, 'weekly')
-    chart_data_monthly = get_chart_data(user, 'monthly')
-    chart_data_yearly = get_chart_data(user, 'yearly')
+    # Sections are rendered inside {% cache %} fragments keyed on the user's
+    # data version, so the aggregates only run when a fragment is missing.
+    context = {name: LazyValue(func, user) for name, (_, func) in DASHBOARD_SECTIONS.items()}
+    context.update({
+        # Not cached: the dismiss forms carry a CSRF token.
+        'budget_alerts': LazyValue(unread_alerts, user),
+        'currency': user_base_currency(user),
+        'today': timezone.now().date(),
+        'fragment_timeout': settings.DASHBOARD_FRAGMENT_TIMEOUT,
+    })
     
-    context = {
-        'balance': balance,
-        'health_score': health_score,
-        'health_status': health_status,
-        'health_class': health_class,
-        'weekly_income': weekly_income,
-        'weekly_expense': weekly_expense,
-        'weekly_net': weekly_net,
-        'monthly_income': monthly_income,
-        'monthly_expense': monthly_expense,
-        'monthly_net': monthly_net,
-        'yearly_income': yearly_income,
-        'yearly_expense': yearly_expense,
-        'yearly_net': yearly_net,
-        'chart_data_weekly': mark_safe(json.dumps(chart_data_weekly)),
-        'chart_data_monthly': mark_safe(json.dumps(chart_data_monthly)),
-        'chart_data_yearly': mark_safe(json.dumps(chart_data_yearly)),
+    return render(request, 'finance/dashboard.html', context)
+
+
+@async_login_required
+@read_from_replica
+async def dashboard_async_view(request):
+    """Async dashboard for ASGI deployments; runs the missing aggregates concurrently."""
+    user = request.user
+    today = timezone.now().date()
+    
+    # Look up the template's fragments first and only compute the sections
+    # that missed. Setting the profile on the user makes the template key its
+    # fragments on the same data version.
+    user.profile = await Profile.objects.aget(user_id=user.pk)
+    vary_on = [user.pk, user.profile.data_version, today]
+    keys = {
+        name: make_template_fragment_key(fragment, vary_on)
+        for name, (fragment, _) in DASHBOARD_SECTIONS.items()
     }
+    cached = await cache.aget_many(keys.values())
+    missing = [name for name, key in keys.items() if key not in cached]
+    missing_async = [name for name in missing if name in ASYNC_DASHBOARD_SECTIONS]
+    missing_sync = [name for name in missing if name not in ASYNC_DASHBOARD_SECTIONS]
     
-    return render(request, 'finance/dashboard.html', context)
+    *async_results, (currency, budget_alerts, *sync_results) = await asyncio.gather(
+        *(ASYNC_DASHBOARD_SECTIONS[name](user) for name in missing_async),
+        run_concurrently(
+            (user_base_currency, user),
+            (unread_alerts, user),
+            *((DASHBOARD_SECTIONS[name][1], user) for name in missing_sync),
+        ),
+    )
+    
+    # Cached sections stay lazy in case their fragment expires before rendering.
+    context = {name: LazyValue(func, user) for name, (_, func) in DASHBOARD_SECTIONS.items()}
+    context.update(zip(missing_async + missing_sync, async_results + sync_results))
+    context.update({
+        'budget_alerts': budget_alerts,
+        'currency': currency,
+        'today': today,
+        'fragment_timeout': settings.DASHBOARD_FRAGMENT_TIMEOUT,
+    })
+    
+    # Rendering touches the session, messages and user profile.
+    return await sync_to_async(render)(request, 'finance/dashboard.html', context)
+
+
+@async_login_required
+async def live_view(request):
+    """Server-Sent Events with the user's balance and today's totals as they change."""
+    return live_response(request, request.user.id)
+
+
+@login_required
+@read_from_replica
+def category_analytics_view(request):
+    """JSON per-category totals for a month: ?month=YYYY-MM&type=EXPENSE&top=5."""
+    month = None
+    if request.GET.get('month'):
+        month = parse_month(request.GET['month'])
+        if month is None:
+            return JsonResponse({'error': 'month must be in YYYY-MM format.'}, status=400)
+    
+    transaction_type = request.GET.get('type', 'EXPENSE')
+    if transaction_type not in ('INCOME', 'EXPENSE'):
+        return JsonResponse({'error': 'type must be INCOME or EXPENSE.'}, status=400)
+    
+    try:
+        top_n = min(max(int(request.GET.get('top', 5)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'top must be an integer.'}, status=400)
+    
+    return JsonResponse(category_breakdown(request.user, month, transaction_type, top_n))
 
 
 @login_required
 def transaction_list_view(request):
     """Transaction history with filtering and pagination."""
     user = request.user
-    transactions = Transaction.objects.filter(owner=user)
+    transactions = Transaction.objects.filter(owner=user).select_related('category')
     
     # Filtering
     transaction_type = request.GET.get('type', '')
@@ -114,12 +171,15 @@ def transaction_list_view(request):
         transactions = transactions.filter(date__lte=date_to)
     
     # Get categories for filter dropdown
-    categories = Category.objects.filter(
-        Q(owner=user) | Q(owner__isnull=True)
-    ).order_by('name')
+    categories = categories_for(user)
     
-    # Pagination
-    paginator = Paginator(transactions, 20)
+    # Pagination. Without a note search, the rollups count the matching rows
+    # per year and each page is read from the years that hold it.
+    if search_query:
+        paginator = Paginator(transactions.order_by('-date', '-id'), 20)
+    else:
+        partitions = year_counts(user, transaction_type, category_id, date_from, date_to)
+        paginator = YearPartitionPaginator(transactions, 20, partitions)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -141,20 +201,31 @@ def transaction_list_view(request):
 @login_required
 def transaction_create_view(request):
     """Create a new transaction."""
+    duplicate = None
     if request.method == 'POST':
         form = TransactionForm(request.POST, user=request.user)
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.owner = request.user
-            transaction.save()
-            messages.success(request, 'Transaction created successfully!')
-            return redirect('finance:transaction_list')
+            # With the production profile's transaction_mode = IMMEDIATE the
+            # block takes the write lock first, so a double submit waits for
+            # the first request's row and then finds it. Deferred blocks
+            # (development) can fail with "database is locked" instead.
+            with db_transaction.atomic(using=current_shard()):
+                if not request.POST.get('allow_duplicate'):
+                    duplicate = find_duplicate(transaction)
+                if duplicate is None:
+                    transaction.save()
+            if duplicate is None:
+                messages.success(request, 'Transaction created successfully!')
+                return redirect('finance:transaction_list')
     else:
         form = TransactionForm(user=request.user)
     
     return render(request, 'finance/transaction_form.html', {
         'form': form,
-        'title': 'Add Transaction'
+        'title': 'Add Transaction',
+        'duplicate': duplicate,
     })
 
 
@@ -216,12 +287,18 @@ def category_delete_view(request, pk):
     category = get_object_or_404(Category, pk=pk, owner=request.user)
     
     if request.method == 'POST':
-        category.delete()
-        messages.success(request, 'Category deleted successfully!')
-        return redirect('finance:category_list')
+        form = CategoryDeleteForm(request.POST, category=category, user=request.user)
+        if form.is_valid():
+            merge_category(category, form.cleaned_data['target'])
+            messages.success(request, 'Category deleted successfully!')
+            return redirect('finance:category_list')
+    else:
+        form = CategoryDeleteForm(category=category, user=request.user)
     
     return render(request, 'finance/category_confirm_delete.html', {
-        'category': category
+        'category': category,
+        'form': form,
+        'transaction_count': Transaction.objects.filter(category=category).count(),
     })
 
 
@@ -239,3 +316,113 @@ def transaction_delete_view(request, pk):
     messages.info(request, 'Transaction deletion requires POST request.')
     return redirect('finance:transaction_list')
 
+
+@login_required
+def budget_list_view(request):
+    """Budgets for a month with spend progress, plus unread alerts."""
+    month = parse_month(request.GET.get('month', '')) or month_start(timezone.now().date())
+    
+    return render(request, 'finance/budget_list.html', {
+        'month': month,
+        'currency': user_base_currency(request.user),
+        'budgets': budget_status(request.user, month)['budgets'],
+        'alerts': unread_alerts(request.user),
+    })
+
+
+@login_required
+def budget_create_view(request):
+    """Create a monthly budget for a category."""
+    if request.method == 'POST':
+        form = BudgetForm(request.POST, user=request.user)
+        if form.is_valid():
+            budget = form.save(commit=False)
+            budget.owner = request.user
+            start_budget(budget)
+            bump_data_version(request.user.id)
+            messages.success(request, 'Budget created successfully!')
+            return redirect(f"{reverse('finance:budget_list')}?month={budget.month:%Y-%m}")
+    else:
+        form = BudgetForm(user=request.user)
+    
+    return render(request, 'finance/budget_form.html', {
+        'form': form,
+        'title': 'Create Budget'
+    })
+
+
+@login_required
+def budget_delete_view(request, pk):
+    """Delete a budget."""
+    budget = get_object_or_404(Budget, pk=pk, owner=request.user)
+    
+    if request.method == 'POST':
+        budget.delete()
+        bump_data_version(request.user.id)
+        messages.success(request, 'Budget deleted successfully!')
+    else:
+        messages.info(request, 'Budget deletion requires POST request.')
+    return redirect('finance:budget_list')
+
+
+@login_required
+def budget_alert_dismiss_view(request, pk):
+    """Mark a budget alert as read."""
+    if request.method == 'POST':
+        BudgetAlert.objects.filter(pk=pk, budget__owner=request.user).update(is_read=True)
+    
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('finance:budget_list')
+
+
+@login_required
+def recurring_list_view(request):
+    """List recurring transaction rules."""
+    rules = RecurringRule.objects.filter(owner=request.user).select_related('category')
+    
+    return render(request, 'finance/recurring_list.html', {
+        'rules': rules
+    })
+
+
+@login_required
+def recurring_create_view(request):
+    """Create a recurring rule and materialize any occurrences already due."""
+    if request.method == 'POST':
+        form = RecurringRuleForm(request.POST, user=request.user)
+        if form.is_valid():
+            rule = form.save(commit=False)
+            rule.owner = request.user
+            rule.next_date = rule.start_date
+            rule.save()
+            _, created = materialize_due(rules=RecurringRule.objects.filter(pk=rule.pk))
+            # The forecast projects the user's rules.
+            bump_data_version(request.user.id)
+            if created:
+                messages.success(request, f'Recurring rule created and {created} past transactions added!')
+            else:
+                messages.success(request, 'Recurring rule created successfully!')
+            return redirect('finance:recurring_list')
+    else:
+        form = RecurringRuleForm(user=request.user)
+    
+    return render(request, 'finance/recurring_form.html', {
+        'form': form,
+        'title': 'Create Recurring Transaction'
+    })
+
+
+@login_required
+def recurring_delete_view(request, pk):
+    """Delete a recurring rule. Transactions it already created are kept."""
+    rule = get_object_or_404(RecurringRule, pk=pk, owner=request.user)
+    
+    if request.method == 'POST':
+        rule.delete()
+        bump_data_version(request.user.id)
+        messages.success(request, 'Recurring rule deleted successfully!')
+    else:
+        messages.info(request, 'Recurring rule deletion requires POST request.')
+    return redirect('finance:recurring_list')
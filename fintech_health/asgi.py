@@ -2,6 +2,8 @@
 ASGI config for fintech_health project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the async dashboards, it serves the live-update event streams
+(finance.live), which answer 204 under WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -0,0 +1,78 @@
+"""
+Database routing for the optional read replica.
+
+Reads are sent to the replica only inside views decorated with
+``read_from_replica`` (analytics and backoffice reporting pages); everything
+else, including all writes, goes to ``default``. After a user writes, they are
+pinned to the primary for ``REPLICA_PIN_SECONDS`` so they always see their own
+changes.
+"""
+import asyncio
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return settings.REPLICA_DATABASE in connections.databases
+
+
+def pin_to_primary(user_id):
+    """Route the user's analytics reads to the primary for a short while."""
+    if user_id and replica_configured():
+        cache.set(f'replica-pin:{user_id}', True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return bool(user_id) and cache.get(f'replica-pin:{user_id}', False)
+
+
+def read_from_replica(view_func):
+    """Decorator to serve a read-only view's queries from the replica."""
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async_view(request, *args, **kwargs):
+            if not replica_configured() or (
+                request.user.id and await cache.aget(f'replica-pin:{request.user.id}', False)
+            ):
+                return await view_func(request, *args, **kwargs)
+            token = _use_replica.set(True)
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return _wrapped_async_view
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not replica_configured() or is_pinned_to_primary(request.user.id):
+            return view_func(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return _wrapped_view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema along with the data it copies.
+        return db != settings.REPLICA_DATABASE
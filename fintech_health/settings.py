@@ -5,6 +5,8 @@ Django settings for fintech_health project.
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -12,13 +14,18 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
+# Deployment profile, selected with the DJANGO_ENV environment variable:
+# 'development' (default) or 'production'.
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-demo-key-change-in-production-12345')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', '0' if PRODUCTION else '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -41,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fintech_health.sharding.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,6 +71,16 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Compile each template once per process instead of on every render.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'fintech_health.wsgi.application'
 
 
@@ -71,11 +89,151 @@ WSGI_APPLICATION = 'fintech_health.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'fintech_health.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
 
+if PRODUCTION:
+    DATABASES['default'].update({
+        # Reuse connections across requests, checking them before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds sqlite3 waits for a lock before raising "database is locked".
+            'timeout': 20,
+            # Take the write lock when an atomic block starts, so a block that
+            # reads before writing waits for other writers instead of failing.
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64000,  # 64 MB
+                'temp_store': 'MEMORY',
+            },
+        },
+    })
+
+# Optional read replica for analytics and backoffice reporting reads. Set
+# DATABASE_REPLICA_NAME to the replica's SQLite file; `manage.py sync_replica`
+# refreshes it from the primary for local testing.
+REPLICA_DATABASE = 'replica'
+
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES[REPLICA_DATABASE] = dict(
+        DATABASES['default'],
+        NAME=os.environ['DATABASE_REPLICA_NAME'],
+        TEST={'MIRROR': 'default'},
+    )
+
+# Optional per-user sharding. DATABASE_SHARDS=N keeps each user's finance and
+# backoffice rows on one of N SQLite files: 'default' is shard 0 and the rest
+# are shard1..shardN-1 next to it. `manage.py sync_shards` creates them.
+SHARD_DATABASES = ['default']
+
+for index in range(1, int(os.environ.get('DATABASE_SHARDS', '1'))):
+    alias = f'shard{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        NAME=Path(DATABASES['default']['NAME']).with_name(f'db-shard{index}.sqlite3'),
+    )
+    SHARD_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['fintech_health.sharding.ShardRouter', 'fintech_health.routers.ReplicaRouter']
+
+# Seconds a user's analytics reads stay on the primary after they write, so
+# they never see a replica that hasn't caught up with their own changes.
+REPLICA_PIN_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if PRODUCTION:
+    # Shared between worker processes so fragment caches stay consistent.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fintech-health',
+        }
+    }
+
+# Sessions get their own cache so culling fragments and lookups never logs anyone out.
+CACHES['sessions'] = {
+    **CACHES['default'],
+    'LOCATION': (
+        os.environ.get('SESSION_CACHE_DIR', str(BASE_DIR / '.cache' / 'sessions'))
+        if PRODUCTION else 'fintech-health-sessions'
+    ),
+    'TIMEOUT': None,
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
+
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+
+# Where sessions are stored, selected with the SESSION_MODE environment variable:
+# 'db' reads and writes django_session on every request that uses the session,
+# 'cached_db' reads from the cache and writes through to the database, and
+# 'cache' never touches the database (sessions are lost if the cache is cleared).
+SESSION_MODE = os.environ.get('SESSION_MODE', 'cached_db' if PRODUCTION else 'db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+if SESSION_MODE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f"SESSION_MODE must be one of {', '.join(SESSION_ENGINES)}.")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Flash messages travel in a signed cookie; only messages too large for it
+# fall back to the session.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+
+# Lifetime (seconds) of cached dashboard fragments. Fragments are keyed on the
+# user's data version, so writes invalidate them before this expires.
+DASHBOARD_FRAGMENT_TIMEOUT = 3600
+
+# Live dashboard updates (Server-Sent Events, ASGI only): seconds between
+# outbox polls, changes read per poll, seconds between full recounts of the
+# monitoring counters, events buffered per client, seconds a stream stays
+# open before the browser reconnects, seconds between keep-alives, and the
+# browser's reconnect delay in milliseconds.
+LIVE_POLL_INTERVAL = 1.0
+LIVE_BATCH_SIZE = 1000
+LIVE_COUNTER_REFRESH = 300
+LIVE_QUEUE_SIZE = 100
+LIVE_STREAM_TIMEOUT = 300
+LIVE_KEEPALIVE = 15
+LIVE_RETRY_MS = 2000
+
+# Background jobs (`manage.py runworker`): worker processes, seconds between
+# polls for due jobs, attempts per job, seconds before the first retry
+# (doubling after each further failure), seconds between heartbeats of a
+# running job, and seconds without one after which its worker is presumed
+# dead and the job retried.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 30
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_STALE_AFTER = 300
+
+# Directory of the memory-mapped columnar transaction snapshot written by
+# `manage.py export_columnar` (needs NumPy).
+COLUMNAR_DIR = os.environ.get('COLUMNAR_DIR', str(BASE_DIR / '.columnar'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -108,6 +266,38 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Currencies
+# Exchange rates are loaded with `manage.py load_rates` and stored as the
+# value of one unit of each currency in FX_QUOTE_CURRENCY.
+
+CURRENCIES = ['USD', 'EUR', 'GBP', 'JPY', 'CHF', 'CAD', 'AUD', 'RUB', 'KZT', 'UZS']
+
+DEFAULT_CURRENCY = 'USD'
+
+FX_QUOTE_CURRENCY = 'USD'
+
+# Seconds a looked-up exchange rate is reused on write paths before it is
+# read from the rate table again.
+FX_RATE_CACHE_SECONDS = 3600
+
+# Global categories with more transactions than this are deleted from the
+# backoffice by a background merge_category job (see `manage.py runworker`)
+# instead of in the request.
+CATEGORY_INLINE_MERGE_LIMIT = 20000
+
+# JSON API: default and maximum page size, maximum rows per bulk create, and
+# seconds an Idempotency-Key's stored response is replayed.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_BULK_MAX_ROWS = 5000
+API_IDEMPOTENCY_TTL = 60 * 60 * 24
+
+# Lifetime (seconds) of signed API access tokens, and how often each process
+# reloads the token revocation list.
+API_TOKEN_TTL = 60 * 60 * 12
+API_TOKEN_REVOCATION_REFRESH = 30
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -0,0 +1,207 @@
+"""
+Optional per-user sharding of the finance and backoffice tables.
+
+With DATABASE_SHARDS=N, each user's transactions, categories, rollups,
+budgets, recurring rules, idempotency keys, spending statistics and
+anomalies live on one of N SQLite databases, chosen by owner id. 'default'
+is shard 0 and keeps everything else: users, profiles, sessions, tokens,
+the audit log and background jobs. Each shard has its own writer lock, so
+users on different shards write in parallel.
+
+Queries on sharded models go to the current shard: the requesting user's
+(ShardMiddleware), the one selected with use_shard(), or the shard of the
+instance or user they are reached from. Outside of any of these they go to
+'default'. Pages that span every user read each shard with fan_out() or
+AcrossShards.
+
+Rows that sharded tables reference or join are copied to every shard:
+users and profiles, exchange rates and global categories. Shard i
+allocates ids from i << SHARD_ID_BITS, so ids are unique across shards and
+shard_for_pk() can find a row from its id alone.
+"""
+import copy
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+
+SHARDED_APPS = {'finance', 'backoffice'}
+UNSHARDED_MODELS = {'backoffice.auditlog', 'backoffice.job'}
+SHARD_ID_BITS = 40
+
+# A shard alias, or the request whose user picks it.
+_shard = ContextVar('shard', default=None)
+
+
+def sharding_enabled():
+    return len(settings.SHARD_DATABASES) > 1
+
+
+def is_sharded(model):
+    return model._meta.app_label in SHARDED_APPS and model._meta.label_lower not in UNSHARDED_MODELS
+
+
+def shard_for_user(user_id):
+    if not user_id:
+        return 'default'
+    return settings.SHARD_DATABASES[user_id % len(settings.SHARD_DATABASES)]
+
+
+def shard_for_pk(pk):
+    """The shard that allocated a sharded row's id."""
+    index = int(pk) >> SHARD_ID_BITS
+    if index >= len(settings.SHARD_DATABASES):
+        return 'default'
+    return settings.SHARD_DATABASES[index]
+
+
+def current_shard():
+    value = _shard.get()
+    if value is None:
+        return 'default'
+    if isinstance(value, str):
+        return value
+    return shard_for_user(value.user.id)
+
+
+@contextmanager
+def use_shard(alias):
+    """Route sharded queries in the block to alias."""
+    token = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def each_shard():
+    """Iterate over the shard aliases, routing the loop body's queries to each in turn."""
+    for alias in settings.SHARD_DATABASES:
+        with use_shard(alias):
+            yield alias
+
+
+def _on_shard(alias, func, args):
+    try:
+        with use_shard(alias):
+            return func(*args)
+    finally:
+        connections.close_all()
+
+
+def fan_out(func, *args):
+    """
+    func(*args) on every shard, each in its own thread and connection.
+    Returns the results in SHARD_DATABASES order.
+    """
+    if not sharding_enabled():
+        return [func(*args)]
+    with ThreadPoolExecutor(max_workers=len(settings.SHARD_DATABASES)) as executor:
+        futures = [
+            executor.submit(_on_shard, alias, func, args)
+            for alias in settings.SHARD_DATABASES
+        ]
+        return [future.result() for future in futures]
+
+
+def copy_to_shards(model, objs):
+    """Insert or update rows saved on 'default' on every other shard, without signals."""
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    for alias in settings.SHARD_DATABASES[1:]:
+        model._base_manager.using(alias).bulk_create(
+            [copy.copy(obj) for obj in objs],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=fields,
+        )
+
+
+class AcrossShards:
+    """
+    One ordered queryset read from every shard, for Paginator and slicing.
+    key gives each row's sort key in the queryset's order (reverse for a
+    descending order). A slice reads up to its end from each shard and
+    merges, so it suits the first pages of a listing.
+    """
+
+    def __init__(self, queryset, key, reverse=False):
+        self.queryset = queryset
+        self.key = key
+        self.reverse = reverse
+
+    def count(self):
+        return sum(fan_out(self.queryset.count))
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        stop = index.stop
+        if not sharding_enabled():
+            return list(self.queryset[index])
+        rows = fan_out(lambda: list(self.queryset[:stop]))
+        merged = heapq.merge(*rows, key=self.key, reverse=self.reverse)
+        return list(islice(merged, index.start, stop))
+
+
+class ShardMiddleware:
+    """Route the request's sharded queries to the shard of request.user."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sharding_enabled():
+            return self.get_response(request)
+        # Resolved on first use, so token-authenticated API requests, which
+        # replace request.user in the view, never load the session user.
+        token = _shard.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _shard.reset(token)
+
+
+class ShardRouter:
+    def _db(self, model, hints):
+        if not sharding_enabled():
+            return None
+        instance = hints.get('instance')
+        if not is_sharded(model):
+            # Users and profiles reached from a row on a shard are read
+            # from and saved to 'default'.
+            if instance is not None and instance._state.db not in (None, 'default'):
+                return 'default'
+            return None
+        if instance is None:
+            return current_shard()
+        if isinstance(instance, User):
+            return shard_for_user(instance.pk)
+        if instance._state.db and is_sharded(type(instance)):
+            return instance._state.db
+        if isinstance(instance, model) and hasattr(instance, 'owner_id'):
+            # New rows go to their owner's shard; global categories are
+            # created on 'default' and copied to the other shards.
+            return shard_for_user(instance.owner_id)
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True if sharding_enabled() else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema: sharded tables reference auth_user.
+        return None
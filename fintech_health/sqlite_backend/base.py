@@ -0,0 +1,34 @@
+"""
+SQLite backend that applies connection-level PRAGMAs.
+
+PRAGMAs are read from OPTIONS['pragmas'] in the DATABASES entry and run on
+every new connection, e.g.:
+
+    'OPTIONS': {'pragmas': {'journal_mode': 'WAL', 'busy_timeout': 5000}}
+
+OPTIONS['transaction_mode'] = 'IMMEDIATE' starts atomic blocks with
+BEGIN IMMEDIATE, taking the write lock up front. A deferred transaction that
+reads before it writes cannot wait for the lock when another connection has
+committed in between; it fails with "database is locked" at once.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not sqlite3.connect() arguments; applied below.
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')